@@ -1,11 +1,15 @@
 import sys
+import os
 import aqt
 import anki.template
 import anki.sound
+import anki.utils
 import logging
+import random
 import sentry_sdk
 import aqt.qt
 from . import constants    
+from . import errors
 
     
 class AnkiUtils():
@@ -28,6 +32,11 @@ class AnkiUtils():
             return constants.GREEN_STYLESHEET_NIGHTMODE
         return constants.GREEN_STYLESHEET
 
+    def get_green_color(self):
+        if self.night_mode_enabled():
+            return constants.GREEN_COLOR_NIGHTMODE
+        return constants.GREEN_COLOR
+
     def get_red_stylesheet(self):
         night_mode = self.night_mode_enabled()
         if night_mode:
@@ -51,22 +60,41 @@ class AnkiUtils():
     def get_deckid_modelid_pairs(self):
         return aqt.mw.col.db.all("select did, mid from notes inner join cards on notes.id = cards.nid group by mid, did")
 
-    def get_noteids_for_deck_note_type(self, deck_id, model_id, sample_size):
-        sql_query = f'SELECT notes.id FROM notes INNER JOIN cards ON notes.id = cards.nid WHERE notes.mid={model_id} AND cards.did={deck_id} ORDER BY RANDOM() LIMIT {sample_size}'
+    def get_deckid_modelid_note_counts(self):
+        """returns {(deck_id, model_id): number of notes}, for all the deck / note type pairs in a single query"""
+        rows = aqt.mw.col.db.all("select did, mid, count(distinct notes.id) from notes inner join cards on notes.id = cards.nid group by mid, did")
+        return {(deck_id, model_id): note_count for deck_id, model_id, note_count in rows}
+
+    def get_field_sample_values(self, deck_id, model_id, field_name, sample_size):
+        """random sample of the raw values of one field, across the notes of this model which have cards in this deck.
+        the note ids get sampled in python, which is much cheaper than an ORDER BY RANDOM() sorting the whole table,
+        then the fields of the sampled notes are read in a single query"""
+        field_names = [field['name'] for field in self.get_model(model_id)['flds']]
+        if field_name not in field_names:
+            # field was removed
+            raise errors.AnkiItemNotFoundError(f'field {field_name} not found')
+        field_index = field_names.index(field_name)
 
-        note_id_result = aqt.mw.col.db.all(sql_query)
-        note_ids = []
-        query_strings = []
-        for entry in note_id_result:
-            note_id = entry[0]
-            note_ids.append(note_id)
+        note_ids = aqt.mw.col.db.list(f'SELECT DISTINCT notes.id FROM notes INNER JOIN cards ON notes.id = cards.nid WHERE notes.mid={model_id} AND cards.did={deck_id}')
+        if len(note_ids) > sample_size:
+            note_ids = random.sample(note_ids, sample_size)
 
-        return note_ids
+        sql_query = f'SELECT flds FROM notes WHERE id IN {anki.utils.ids2str(note_ids)}'
+        return [anki.utils.split_fields(flds)[field_index] for flds in aqt.mw.col.db.list(sql_query)]
 
     def get_note_by_id(self, note_id):
         note = aqt.mw.col.getNote(note_id)
         return note
 
+    def get_notes_field_values(self, model_id, note_ids):
+        """returns {note_id: {field_name: value}}, reading all the notes in a single query"""
+        field_names = [field['name'] for field in self.get_model(model_id)['flds']]
+        sql_query = f'SELECT id, flds FROM notes WHERE id IN {anki.utils.ids2str(note_ids)}'
+        result = {}
+        for note_id, flds in aqt.mw.col.db.all(sql_query):
+            result[note_id] = dict(zip(field_names, anki.utils.split_fields(flds)))
+        return result
+
     def get_model(self, model_id):
         return aqt.mw.col.models.get(model_id)
 
@@ -83,6 +111,13 @@ class AnkiUtils():
         full_filename = aqt.mw.col.media.addFile(filename)
         return full_filename
 
+    def get_media_file_path(self, filename):
+        """full path of the file if it exists in the collection media folder, None otherwise"""
+        full_path = os.path.join(aqt.mw.col.media.dir(), filename)
+        if os.path.isfile(full_path):
+            return full_path
+        return None
+
     def run_in_background(self, task_fn, task_done_fn):
         aqt.mw.taskman.run_in_background(task_fn, task_done_fn)
 
@@ -158,6 +193,18 @@ class AnkiUtils():
     def update_note(self, note):
         aqt.mw.col.update_note(note)
 
+    def update_notes_fields(self, note_field_updates):
+        """note_field_updates: {note_id: {field_name: value}}, saved with one collection update per chunk"""
+        note_ids = list(note_field_updates.keys())
+        for i in range(0, len(note_ids), constants.NOTE_UPDATE_CHUNK_SIZE):
+            notes = []
+            for note_id in note_ids[i:i + constants.NOTE_UPDATE_CHUNK_SIZE]:
+                note = aqt.mw.col.get_note(note_id)
+                for field_name, value in note_field_updates[note_id].items():
+                    note[field_name] = value
+                notes.append(note)
+            aqt.mw.col.update_notes(notes)
+
     def display_dialog(self, dialog):
         return dialog.exec()
 
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import concurrent.futures
+
+
+class EventLoopThread():
+    """runs an asyncio event loop on a dedicated daemon thread, coroutines can be submitted from any thread"""
+
+    def __init__(self, name):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop == None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self.thread.start()
+            return self.loop
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_loop())
+
+
+class AsyncCloudLanguageTools():
+    """asyncio interface on top of a CloudLanguageTools client.
+    all requests share one event loop thread, the number of requests in flight is capped by a semaphore,
+    the blocking http calls run on an executor of the same size.
+    submit() and run() are the sync adapter, for callers which aren't coroutines."""
+
+    def __init__(self, cloud_language_tools, max_concurrency):
+        self.cloud_language_tools = cloud_language_tools
+        self.max_concurrency = max_concurrency
+        self.loop_thread = EventLoopThread('languagetools-async')
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='languagetools-request')
+        self.semaphore = None
+
+    async def call(self, fn, *args):
+        # the semaphore belongs to the event loop, create it from within
+        if self.semaphore == None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # sync adapter
+    # ============
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        return self.loop_thread.submit(coroutine)
+
+    def run(self, coroutine):
+        return self.submit(coroutine).result()
+
+    # requests
+    # ========
+
+    async def get_translation(self, source_text, translation_option):
+        return await self.call(self.cloud_language_tools.get_translation, source_text, translation_option)
+
+    async def get_translation_batch(self, source_text_list, translation_option):
+        return await self.call(self.cloud_language_tools.get_translation_batch, source_text_list, translation_option)
+
+    async def get_transliteration(self, source_text, transliteration_option):
+        return await self.call(self.cloud_language_tools.get_transliteration, source_text, transliteration_option)
+
+    async def get_breakdown(self, source_text, tokenization_option, translation_option, transliteration_option):
+        return await self.call(self.cloud_language_tools.get_breakdown, source_text, tokenization_option, translation_option, transliteration_option)
+
+    async def get_tts_audio(self, source_text, service, language_code, voice_key, options):
+        return await self.call(self.cloud_language_tools.get_tts_audio, source_text, service, language_code, voice_key, options)
+
+    async def language_detection(self, field_sample):
+        return await self.call(self.cloud_language_tools.language_detection, field_sample)
+
+    async def language_detection_batch(self, field_sample_list):
+        return await self.call(self.cloud_language_tools.language_detection_batch, field_sample_list)
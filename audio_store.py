@@ -0,0 +1,150 @@
+import os
+import glob
+import json
+import time
+import tempfile
+import threading
+import logging
+
+
+class AudioStore():
+    """content-addressed store for generated audio files.
+    files are named after the request hash, an index file keeps track of their size and last access time,
+    so that the least recently used files can be evicted once the store grows beyond max_bytes.
+    the index is kept in memory, along with its total size, and only written out by flush().
+    on load, it gets reconciled with the files actually in the directory."""
+
+    INDEX_FILENAME = 'audio_index.json'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = None
+        self.index_dirty = False
+        self.index_bytes = 0
+
+    def get_filename(self, hash_str):
+        return f'languagetools-{hash_str}.mp3'
+
+    def get_index_path(self):
+        return os.path.join(self.directory, self.INDEX_FILENAME)
+
+    def load_index_locked(self):
+        if self.index != None:
+            return
+        try:
+            with open(self.get_index_path(), 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            # first run
+            self.index = {}
+        except (ValueError, OSError):
+            logging.exception('could not load audio index, rebuilding it from the directory')
+            self.index = {}
+        self.reconcile_index_locked()
+        self.index_bytes = sum([entry['size'] for entry in self.index.values()])
+        self.evict_locked()
+
+    def reconcile_index_locked(self):
+        # the index only gets written out on flush, if anki didn't shut down cleanly it misses the files written since.
+        # pick those up, along with files written before the index existed, and drop the entries of files which are gone
+        filenames = {}
+        for full_path in glob.glob(os.path.join(self.directory, 'languagetools-*.mp3')):
+            filename = os.path.basename(full_path)
+            filenames[filename[len('languagetools-'):-len('.mp3')]] = full_path
+        for hash_str in [hash_str for hash_str in self.index.keys() if hash_str not in filenames]:
+            del self.index[hash_str]
+            self.index_dirty = True
+        for hash_str, full_path in filenames.items():
+            if hash_str not in self.index:
+                self.index[hash_str] = {
+                    'filename': os.path.basename(full_path),
+                    'size': os.path.getsize(full_path),
+                    'last_access': os.path.getmtime(full_path)
+                }
+                self.index_dirty = True
+
+    def save_index_locked(self):
+        if not self.index_dirty:
+            return
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False, encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(f.name, self.get_index_path())
+        self.index_dirty = False
+
+    def get(self, hash_str):
+        """returns the full path of the stored file, or None"""
+        with self.lock:
+            self.load_index_locked()
+            entry = self.index.get(hash_str, None)
+            if entry == None:
+                return None
+            full_path = os.path.join(self.directory, entry['filename'])
+            if not os.path.isfile(full_path):
+                # removed behind our back
+                self.index_bytes -= entry['size']
+                del self.index[hash_str]
+                self.index_dirty = True
+                return None
+            # access times only get written out along with the next change
+            entry['last_access'] = time.time()
+            self.index_dirty = True
+            return full_path
+
+    def put(self, hash_str, content):
+        """store the audio content, returns the full path"""
+        filename = self.get_filename(hash_str)
+        full_path = os.path.join(self.directory, filename)
+        # write to a temporary file first, so that concurrent requests for the same audio never see a partial file
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            f.write(content)
+        os.replace(f.name, full_path)
+        with self.lock:
+            self.load_index_locked()
+            if hash_str in self.index:
+                self.index_bytes -= self.index[hash_str]['size']
+            self.index[hash_str] = {
+                'filename': filename,
+                'size': len(content),
+                'last_access': time.time()
+            }
+            self.index_bytes += len(content)
+            self.index_dirty = True
+            self.evict_locked(keep=hash_str)
+        return full_path
+
+    def evict_locked(self, keep=None):
+        if self.index_bytes <= self.max_bytes:
+            return
+        for hash_str, entry in sorted(self.index.items(), key=lambda item: item[1]['last_access']):
+            if self.index_bytes <= self.max_bytes:
+                break
+            if hash_str == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, entry['filename']))
+            except FileNotFoundError:
+                pass
+            del self.index[hash_str]
+            self.index_bytes -= entry['size']
+            self.index_dirty = True
+
+    def total_bytes(self):
+        with self.lock:
+            self.load_index_locked()
+            return self.index_bytes
+
+    def flush(self):
+        with self.lock:
+            if self.index != None:
+                self.save_index_locked()
+
+    def clear(self):
+        with self.lock:
+            for full_path in glob.glob(os.path.join(self.directory, 'languagetools-*.mp3')):
+                os.remove(full_path)
+            self.index = {}
+            self.index_bytes = 0
+            self.index_dirty = True
+            self.save_index_locked()
@@ -0,0 +1,58 @@
+import concurrent.futures
+
+
+def run_concurrently(task_fn, items, max_workers):
+    """run task_fn(item) for every item on a bounded thread pool.
+    yields (index, result, exception) tuples on the calling thread, in completion order.
+    if the caller stops iterating, tasks which haven't started yet are cancelled."""
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        future_to_index = {executor.submit(task_fn, item): index for index, item in enumerate(items)}
+        for future in concurrent.futures.as_completed(future_to_index):
+            index = future_to_index[future]
+            exception = future.exception()
+            if exception != None:
+                yield index, None, exception
+            else:
+                yield index, future.result(), None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def chunk_items(items, max_count, max_bytes, size_fn):
+    """split items into chunks of at most max_count items, and at most max_bytes according to size_fn.
+    an item larger than max_bytes goes into a chunk of its own."""
+    chunks = []
+    current_chunk = []
+    current_bytes = 0
+    for item in items:
+        item_bytes = size_fn(item)
+        if len(current_chunk) > 0 and (len(current_chunk) >= max_count or current_bytes + item_bytes > max_bytes):
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_bytes = 0
+        current_chunk.append(item)
+        current_bytes += item_bytes
+    if len(current_chunk) > 0:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def run_concurrently_async(coroutine_fn, items, async_client):
+    """same as run_concurrently, but coroutine_fn(item) runs on the event loop of async_client,
+    concurrency is bounded by the client instead of a thread per task."""
+
+    futures = [async_client.submit(coroutine_fn(item)) for item in items]
+    future_to_index = {future: index for index, future in enumerate(futures)}
+    try:
+        for future in concurrent.futures.as_completed(future_to_index):
+            index = future_to_index[future]
+            exception = future.exception()
+            if exception != None:
+                yield index, None, exception
+            else:
+                yield index, future.result(), None
+    finally:
+        for future in futures:
+            future.cancel()
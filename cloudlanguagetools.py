@@ -1,18 +1,23 @@
 import os
 import sys
 import requests
+import requests.adapters
 import json
 import logging
+import threading
+import time
 import sentry_sdk
 
 if hasattr(sys, '_pytest_mode'):
     import constants
     import errors
     import version
+    import rate_limiter
 else:
     from . import constants
     from . import errors
     from . import version
+    from . import rate_limiter
 
 class CloudLanguageTools():
     def __init__(self):
@@ -20,10 +25,65 @@ class CloudLanguageTools():
         self.vocab_api_base_url = os.environ.get(constants.ENV_VAR_ANKI_LANGUAGE_TOOLS_VOCABAI_BASE_URL, constants.VOCABAI_API_BASE_URL)
         self.initialization_done = False
         self.api_key = None
+        # set to False once the server tells us it doesn't have the batch endpoint
+        self.translation_batch_supported = True
+        self.language_detection_batch_supported = True
+
+        # pooled keep-alive http session, shared by all requests
+        self.max_connections = constants.DEFAULT_BATCH_MAX_WORKERS
+        self.session = None
+        self.session_lock = threading.Lock()
+
+        # shared by all batch operations and the editor
+        self.rate_limiter = rate_limiter.RateLimiter(constants.RATE_LIMIT_REQUESTS_PER_SECOND, self.max_connections)
+        self.max_retries = constants.HTTP_MAX_RETRIES
+        self.retry_base_delay = constants.HTTP_RETRY_BASE_DELAY
+        self.retry_max_delay = constants.HTTP_RETRY_MAX_DELAY
+        self.sleep_fn = time.sleep
 
     def api_key_set(self):
         return self.api_key != None
 
+    # http session management
+    # =======================
+
+    def build_session(self):
+        session = requests.Session()
+        # one connection pool per host, each pool holds up to max_connections keep-alive connections.
+        # pool_block makes extra threads wait for a free connection instead of opening throwaway ones
+        adapter = requests.adapters.HTTPAdapter(pool_connections=constants.HTTP_POOL_HOST_COUNT,
+            pool_maxsize=self.max_connections,
+            pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_session(self):
+        with self.session_lock:
+            if self.session == None:
+                self.session = self.build_session()
+            return self.session
+
+    def reset_session(self):
+        with self.session_lock:
+            if self.session != None:
+                self.session.close()
+            self.session = None
+
+    def set_max_connections(self, max_connections):
+        # size the per-host connection pool to the number of concurrent workers
+        if max_connections != self.max_connections:
+            logging.info(f'setting max connections to {max_connections}')
+            self.max_connections = max_connections
+            self.rate_limiter.set_max_concurrency(max_connections)
+            self.reset_session()
+
+    def set_api_key(self, api_key):
+        if api_key != self.api_key:
+            # don't keep connections opened on behalf of a different account
+            self.reset_session()
+        self.api_key = api_key
+
     def get_base_url(self):
         if self.use_vocabai_api:
             return self.vocab_api_base_url
@@ -63,38 +123,82 @@ class CloudLanguageTools():
                 endpoint = clt_endpoint_overrides[endpoint]
         return self.get_base_url() + '/' + endpoint
 
+    def send_request(self, service, method, url, **kwargs):
+        """send a request through the rate limiter of this service.
+        throttling responses, server errors and connection errors get retried with backoff"""
+        service_limiter = self.rate_limiter.get_service_limiter(service)
+        attempt = 0
+        while True:
+            service_limiter.acquire()
+            try:
+                response = self.get_session().request(method, url, **kwargs)
+            except Exception as e:
+                service_limiter.release(False)
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = rate_limiter.get_backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                logging.warning(f'{service}: {e}, retrying in {delay:.1f}s')
+            else:
+                if response.status_code not in constants.HTTP_RETRY_STATUS_CODES:
+                    service_limiter.release(False)
+                    return response
+                throttled = response.status_code in constants.HTTP_THROTTLE_STATUS_CODES
+                retry_after = rate_limiter.parse_retry_after(response.headers.get('Retry-After', None))
+                service_limiter.release(throttled, retry_after)
+                if attempt >= self.max_retries:
+                    return response
+                delay = rate_limiter.get_backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                if retry_after != None:
+                    delay = max(delay, retry_after)
+                logging.warning(f'{service}: status code {response.status_code}, retrying in {delay:.1f}s')
+            self.sleep_fn(delay)
+            attempt += 1
+
     def authenticated_get_request(self, endpoint):
         url = self.get_url(endpoint)
-        response = requests.get(url, headers=self.get_headers())
+        response = self.send_request(endpoint, 'GET', url, headers=self.get_headers())
         response.raise_for_status()
         return response.json()
 
     def authenticated_post_request(self, endpoint, data):
         url = self.get_url(endpoint)
-        response = requests.post(url, json=data, headers=self.get_headers())
+        response = self.send_request(data.get('service', endpoint), 'POST', url, json=data, headers=self.get_headers())
         response.raise_for_status()
         return response.json()
 
     def authenticated_post_request_response(self, endpoint, data):
         # just return the response without any processing
         url = self.get_url(endpoint)
-        response = requests.post(url, json=data, headers=self.get_headers())
+        response = self.send_request(data.get('service', endpoint), 'POST', url, json=data, headers=self.get_headers())
         return response
 
     def get_language_data(self):
         with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='get_language_data'):
             return self.authenticated_get_request('language_data')
 
+    def get_language_data_conditional(self, etag):
+        """returns None if the server's language data hasn't changed since etag, otherwise (language_data, etag)"""
+        with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='get_language_data_conditional'):
+            headers = self.get_headers()
+            if etag != None:
+                headers['If-None-Match'] = etag
+            response = self.send_request('language_data', 'GET', self.get_url('language_data'), headers=headers)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            return response.json(), response.headers.get('ETag', None)
+
     def api_key_validate_query(self, api_key):
         with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='verify_api_key'):
             # first, try to validate api key using the account endpoint on vocabai
 
             # try to get account data on vocabai first
-            response = requests.get(self.vocab_api_base_url + '/account', headers=self.get_headers_vocabai_api(api_key))
+            response = self.get_session().get(self.vocab_api_base_url + '/account', headers=self.get_headers_vocabai_api(api_key))
             if response.status_code == 200:
                 # API key is valid on vocab API
                 self.use_vocabai_api = True
-                self.api_key = api_key
+                self.set_api_key(api_key)
                 return {
                     'key_valid': True,
                     'msg': f'api key: {api_key}'
@@ -102,7 +206,7 @@ class CloudLanguageTools():
 
             # now try to get account data on CLT API
             url = self.clt_api_base_url + '/account'
-            response = requests.get(url, headers=self.get_headers_clt_api(api_key))
+            response = self.get_session().get(url, headers=self.get_headers_clt_api(api_key))
             if response.status_code == 200:
                 self.use_vocabai_api = False
                 # API key is valid on CLT API
@@ -114,7 +218,7 @@ class CloudLanguageTools():
                     }                    
 
                 # otherwise, it's considered valid
-                self.api_key = api_key
+                self.set_api_key(api_key)
                 return {
                     'key_valid': True,
                     'msg': f'api key: {api_key}'
@@ -139,6 +243,23 @@ class CloudLanguageTools():
             detected_language = response_data['detected_language']
             return detected_language
 
+    def language_detection_batch(self, field_sample_list):
+        # one sample (list of texts) per field, returns the list of detected languages in the same order.
+        # raises BatchEndpointNotSupportedError if the endpoint doesn't exist
+        with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='language_detection_batch'):
+            response = self.authenticated_post_request_response('detect_batch', {
+                'text_list_list': field_sample_list
+            })
+            if response.status_code == 404:
+                logging.warning('detect_batch endpoint not available, falling back to single language detection requests')
+                self.language_detection_batch_supported = False
+                raise errors.BatchEndpointNotSupportedError('detect_batch')
+            response.raise_for_status()
+            detected_language_list = response.json()['detected_language_list']
+            if len(detected_language_list) != len(field_sample_list):
+                raise errors.LanguageToolsRequestError(f'Could not detect language: expected {len(field_sample_list)} results, got {len(detected_language_list)}')
+            return detected_language_list
+
     def get_tts_audio_request(self, source_text, service, language_code, voice_key, options):
         url = self.get_url('audio')
         data = {
@@ -151,7 +272,7 @@ class CloudLanguageTools():
             'options': options
         }
         headers = self.get_headers()
-        return requests.post(url, json=data, headers=headers)
+        return self.send_request(service, 'POST', url, json=data, headers=headers)
 
     def get_tts_audio(self, source_text, service, language_code, voice_key, options):
         with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name=f'Audio_{service}'):
@@ -176,6 +297,21 @@ class CloudLanguageTools():
                 'to_language_key': translation_option['target_language_id']
             })
 
+    def get_translation_batch(self, source_text_list, translation_option):
+        # returns the response from requests directly, raises BatchEndpointNotSupportedError if the endpoint doesn't exist
+        with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='TranslationBatch_'+translation_option['service']):
+            response = self.authenticated_post_request_response('translate_batch', {
+                'text_list': source_text_list,
+                'service': translation_option['service'],
+                'from_language_key': translation_option['source_language_id'],
+                'to_language_key': translation_option['target_language_id']
+            })
+            if response.status_code == 404:
+                logging.warning('translate_batch endpoint not available, falling back to single translation requests')
+                self.translation_batch_supported = False
+                raise errors.BatchEndpointNotSupportedError('translate_batch')
+            return response
+
     def get_transliteration(self, source_text, transliteration_option):
         # returns the response from requests directly
         with sentry_sdk.start_transaction(op=constants.SENTRY_OPERATION, name='Transliteration_'+transliteration_option['service']):
@@ -0,0 +1,105 @@
+import sys
+import collections
+
+if hasattr(sys, '_pytest_mode'):
+    import constants
+else:
+    from . import constants
+
+
+class FieldRules():
+    """the rules which depend on one source field"""
+    def __init__(self):
+        # list of (to_field, translation_option)
+        self.translation = []
+        # list of (to_field, transliteration_option)
+        self.transliteration = []
+        # list of to_field
+        self.audio = []
+
+    def is_empty(self):
+        return len(self.translation) == 0 and len(self.transliteration) == 0 and len(self.audio) == 0
+
+
+EMPTY_FIELD_RULES = FieldRules()
+
+# a field of a note type within a deck, identified by names, the way the config refers to it
+FieldKey = collections.namedtuple('FieldKey', ['model_name', 'deck_name', 'field_name'])
+
+
+class ConfigIndex():
+    """typed view of the per-field settings in the config, with the lookups we need as plain dict accesses:
+    field -> language, language -> fields, and (model name, deck name, from field) -> translation / transliteration / audio rules.
+    the config dict stays the source of truth and keeps its json layout. changes to it must be applied to the index
+    through set_language / add_rule / remove_rule, or the index rebuilt.
+    lists held by the index are replaced rather than modified, background threads may be iterating over them."""
+
+    def __init__(self, config):
+        self.config = config
+        self.field_languages = {}
+        self.fields_by_language = {}
+        self.field_rules = {}
+
+        for model_name, model_data in config.get(constants.CONFIG_DECK_LANGUAGES, {}).items():
+            for deck_name, deck_data in model_data.items():
+                for field_name, language in deck_data.items():
+                    field_key = FieldKey(model_name, deck_name, field_name)
+                    self.field_languages[field_key] = language
+                    self.fields_by_language.setdefault(language, []).append(field_key)
+
+        for model_name, model_data in config.get(constants.CONFIG_BATCH_TRANSLATION, {}).items():
+            for deck_name, deck_data in model_data.items():
+                for to_field, setting in deck_data.items():
+                    self.get_or_create(model_name, deck_name, setting['from_field']).translation.append((to_field, setting['translation_option']))
+
+        for model_name, model_data in config.get(constants.CONFIG_BATCH_TRANSLITERATION, {}).items():
+            for deck_name, deck_data in model_data.items():
+                for to_field, setting in deck_data.items():
+                    self.get_or_create(model_name, deck_name, setting['from_field']).transliteration.append((to_field, setting['transliteration_option']))
+
+        for model_name, model_data in config.get(constants.CONFIG_BATCH_AUDIO, {}).items():
+            for deck_name, deck_data in model_data.items():
+                for to_field, from_field in deck_data.items():
+                    self.get_or_create(model_name, deck_name, from_field).audio.append(to_field)
+
+    def get_or_create(self, model_name, deck_name, from_field):
+        key = FieldKey(model_name, deck_name, from_field)
+        if key not in self.field_rules:
+            self.field_rules[key] = FieldRules()
+        return self.field_rules[key]
+
+    def set_language(self, field_key: FieldKey, language):
+        if field_key in self.field_languages:
+            previous_language = self.field_languages[field_key]
+            self.fields_by_language[previous_language] = [x for x in self.fields_by_language.get(previous_language, []) if x != field_key]
+        self.field_languages[field_key] = language
+        self.fields_by_language[language] = self.fields_by_language.get(language, []) + [field_key]
+
+    def add_rule(self, rule_type, from_field_key: FieldKey, rule):
+        """rule_type is translation, transliteration or audio, rule has the same format as the entries of FieldRules"""
+        field_rules = self.get_or_create(*from_field_key)
+        setattr(field_rules, rule_type, getattr(field_rules, rule_type) + [rule])
+
+    def remove_rule(self, rule_type, from_field_key: FieldKey, to_field):
+        field_rules = self.field_rules.get(from_field_key, None)
+        if field_rules == None:
+            return
+        setattr(field_rules, rule_type, [rule for rule in getattr(field_rules, rule_type) if get_rule_to_field(rule) != to_field])
+        if field_rules.is_empty():
+            del self.field_rules[from_field_key]
+
+    def get_field_rules(self, field_key: FieldKey) -> FieldRules:
+        return self.field_rules.get(field_key, EMPTY_FIELD_RULES)
+
+    def get_language(self, field_key: FieldKey):
+        return self.field_languages.get(field_key, None)
+
+    def get_fields_for_language(self, language):
+        return self.fields_by_language.get(language, [])
+
+
+def get_rule_to_field(rule):
+    # audio rules are just the target field
+    if isinstance(rule, str):
+        return rule
+    return rule[0]
@@ -6,6 +6,51 @@ ENV_VAR_ANKI_LANGUAGE_TOOLS_VOCABAI_BASE_URL = 'ANKI_LANGUAGE_TOOLS_VOCABAI_BASE
 CLT_API_BASE_URL = 'https://cloudlanguagetools-api.vocab.ai'
 VOCABAI_API_BASE_URL = 'https://app.vocab.ai/languagetools-api/v2'
 
+# http connection pooling
+HTTP_POOL_HOST_COUNT = 4 # number of distinct hosts we keep a connection pool for
+DEFAULT_BATCH_MAX_WORKERS = 8 # concurrent requests during batch operations, also the per-host connection limit
+
+# rate limiting and retries, per service
+RATE_LIMIT_REQUESTS_PER_SECOND = 20
+HTTP_MAX_RETRIES = 4
+HTTP_RETRY_BASE_DELAY = 0.5 # seconds, doubles with each attempt
+HTTP_RETRY_MAX_DELAY = 30
+HTTP_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+HTTP_THROTTLE_STATUS_CODES = [429, 503] # these also reduce the number of concurrent requests
+
+# config changes get written out once no other change happened for this long
+CONFIG_WRITE_DELAY_MS = 2000
+
+# results of text processing kept in memory
+TEXT_PROCESSING_CACHE_SIZE = 10000
+
+LANGUAGE_DETECTION_SAMPLE_SIZE = 100 # max supported by azure
+# fields per language detection batch request, and max size of their samples
+LANGUAGE_DETECTION_BATCH_SIZE = 50
+LANGUAGE_DETECTION_BATCH_MAX_BYTES = 262144
+# incremental detection: fields whose note count and content drifted less than this since the last detection are skipped
+LANGUAGE_DETECTION_MAX_DRIFT = 0.2
+# same, for the character bigram frequencies, which vary more between two random samples of the same field
+LANGUAGE_DETECTION_MAX_NGRAM_DRIFT = 0.5
+
+# number of notes saved per collection update during batch operations
+NOTE_UPDATE_CHUNK_SIZE = 500
+
+# batch translation requests
+DEFAULT_TRANSLATION_BATCH_SIZE = 50 # max number of texts per request
+DEFAULT_TRANSLATION_BATCH_MAX_BYTES = 32768 # max utf-8 size of the texts in one request
+
+# translation / transliteration result cache
+TRANSLATION_CACHE_FILENAME = 'translation_cache.sqlite3'
+DEFAULT_TRANSLATION_CACHE_MAX_ENTRIES = 200000
+DEFAULT_TRANSLATION_CACHE_MAX_AGE_DAYS = 180
+
+# language data from the server, kept in user_files
+LANGUAGE_DATA_CACHE_FILENAME = 'language_data.json'
+
+# generated audio files kept in user_files
+DEFAULT_AUDIO_STORE_MAX_MB = 200
+
 CONFIG_DECK_LANGUAGES = 'deck_languages'
 CONFIG_WANTED_LANGUAGES = 'wanted_languages'
 CONFIG_BATCH_TRANSLATION = 'batch_translations'
@@ -15,15 +60,25 @@ CONFIG_VOICE_SELECTION = 'voice_selection'
 CONFIG_APPLY_UPDATES_AUTOMATICALLY = 'apply_updates_automatically'
 CONFIG_LIVE_UPDATE_DELAY = 'live_update_delay'
 CONFIG_TEXT_PROCESSING = 'text_processing'
+CONFIG_BATCH_MAX_WORKERS = 'batch_max_workers'
+CONFIG_TRANSLATION_CACHE_ENABLED = 'translation_cache_enabled'
+CONFIG_TRANSLATION_CACHE_MAX_ENTRIES = 'translation_cache_max_entries'
+CONFIG_TRANSLATION_CACHE_MAX_AGE_DAYS = 'translation_cache_max_age_days'
+CONFIG_TRANSLATION_BATCH_SIZE = 'translation_batch_size'
+CONFIG_TRANSLATION_BATCH_MAX_BYTES = 'translation_batch_max_bytes'
+CONFIG_AUDIO_STORE_MAX_MB = 'audio_store_max_mb'
 ADDON_NAME = 'Language Tools'
 MENU_PREFIX = ADDON_NAME + ':'
 DEFAULT_LANGUAGE = 'en' # always add this language, even if the user didn't add it themselves
 EDITOR_WEB_FIELD_ID_TRANSLATION = 'translation'
 
-GREEN_STYLESHEET = 'background-color: #69F0AE;'
+GREEN_COLOR = '#69F0AE'
+GREEN_COLOR_NIGHTMODE = '#2E7D32'
+
+GREEN_STYLESHEET = f'background-color: {GREEN_COLOR};'
 RED_STYLESHEET = 'background-color: #FFCDD2;'
 
-GREEN_STYLESHEET_NIGHTMODE = 'background-color: #2E7D32;'
+GREEN_STYLESHEET_NIGHTMODE = f'background-color: {GREEN_COLOR_NIGHTMODE};'
 RED_STYLESHEET_NIGHTMODE = 'background-color: #B71C1C;'
 
 DOCUMENTATION_PERFORM_LANGUAGE_MAPPING = 'Please setup Language Mappings, from the Anki main screen: <b>Tools -> Language Tools: Language Mapping</b>'
@@ -1,4 +1,7 @@
 import sys
+import threading
+import logging
+from typing import List
 if hasattr(sys, '_pytest_mode'):
     import errors
 else:
@@ -62,6 +65,74 @@ class Deck():
 class DeckUtils():
     def __init__(self, anki_utils):
         self.anki_utils = anki_utils
+        # DNT / DNTF objects get interned, so that the editor doesn't hit the collection on every keystroke.
+        # invalidate_cache() must be called whenever decks or note types change.
+        self.cache_lock = threading.Lock()
+        self.deck_note_type_cache = {}
+        self.deck_note_type_field_cache = {}
+        self.model_fields_cache = {}
+        # (deck_id, model_id) pairs which have notes, built from a full scan of the collection on first use,
+        # then kept up to date by add_populated_deck_note_type, or rebuilt after invalidate_populated_index()
+        self.populated_index = None
+        # the scan runs outside of the lock. pairs added while it runs get merged into its result,
+        # and the generation tells whether the index got invalidated meanwhile, in which case the scan result is stale
+        self.populated_index_generation = 0
+        self.populated_index_additions = {}
+
+    def invalidate_cache(self):
+        with self.cache_lock:
+            self.deck_note_type_cache = {}
+            self.deck_note_type_field_cache = {}
+            self.model_fields_cache = {}
+            self.invalidate_populated_index_locked()
+
+    def invalidate_populated_index(self):
+        with self.cache_lock:
+            self.invalidate_populated_index_locked()
+
+    def invalidate_populated_index_locked(self):
+        self.populated_index = None
+        self.populated_index_generation += 1
+        self.populated_index_additions = {}
+
+    def add_populated_deck_note_type(self, deck_id, model_id):
+        with self.cache_lock:
+            # dicts used as ordered sets
+            if self.populated_index != None:
+                self.populated_index[(deck_id, model_id)] = True
+            else:
+                # a scan may be running, which doesn't see this note yet
+                self.populated_index_additions[(deck_id, model_id)] = True
+
+    def note_added(self, deck_id, model_id):
+        model = self.anki_utils.get_model(model_id)
+        if any([template.get('did', None) for template in model.get('tmpls', [])]):
+            # deck override, some of the cards go to another deck
+            self.invalidate_populated_index()
+            return
+        self.add_populated_deck_note_type(deck_id, model_id)
+
+    def notes_removed(self):
+        # some decks / note types may not have any notes left
+        self.invalidate_populated_index()
+
+    def get_populated_deck_note_types(self) -> List[DeckNoteType]:
+        while True:
+            with self.cache_lock:
+                if self.populated_index != None:
+                    key_list = list(self.populated_index.keys())
+                    break
+                generation = self.populated_index_generation
+            # scan outside of the lock, the editor shouldn't have to wait for it
+            populated_index = {(deck_id, model_id): True for deck_id, model_id in self.anki_utils.get_deckid_modelid_pairs()}
+            logging.info(f'built populated deck / note type index, {len(populated_index)} entries')
+            with self.cache_lock:
+                if self.populated_index == None and self.populated_index_generation == generation:
+                    populated_index.update(self.populated_index_additions)
+                    self.populated_index_additions = {}
+                    self.populated_index = populated_index
+                # otherwise another scan got installed first, or the index got invalidated during the scan, go around again
+        return [self.build_deck_note_type(deck_id, model_id) for deck_id, model_id in key_list]
 
     # just build a new Deck object
     def new_deck(self):
@@ -69,7 +140,15 @@ class DeckUtils():
 
     # from a DNT + field name, return DNTF
     def build_dntf_from_dnt(self, deck_note_type, field_name):
-        return DeckNoteTypeField(deck_note_type, field_name)
+        key = (deck_note_type.deck_id, deck_note_type.model_id)
+        with self.cache_lock:
+            if self.deck_note_type_cache.get(key, None) is not deck_note_type:
+                # not one of ours, don't intern
+                return DeckNoteTypeField(deck_note_type, field_name)
+            dntf_key = key + (field_name,)
+            if dntf_key not in self.deck_note_type_field_cache:
+                self.deck_note_type_field_cache[dntf_key] = DeckNoteTypeField(deck_note_type, field_name)
+            return self.deck_note_type_field_cache[dntf_key]
 
     # given a note and the card, build DNT (used within note editor)
     # note: anki.notes.Note
@@ -111,6 +190,12 @@ class DeckUtils():
 
     # given deck id, model id, build DNT
     def build_deck_note_type(self, deck_id, model_id) -> DeckNoteType:
+        key = (deck_id, model_id)
+        with self.cache_lock:
+            deck_note_type = self.deck_note_type_cache.get(key, None)
+        if deck_note_type != None:
+            return deck_note_type
+
         model = self.anki_utils.get_model(model_id)
         if model == None:
             raise errors.AnkiItemNotFoundError(f'Note Type id {model_id} not found')
@@ -119,13 +204,14 @@ class DeckUtils():
         if deck == None:
             raise errors.AnkiItemNotFoundError(f'Deck id {deck_id} not found')
         deck_name = deck['name']
-        deck_note_type = DeckNoteType(deck_id, deck_name, model_id, model_name)
-        return deck_note_type
+        with self.cache_lock:
+            # another thread may have got there first
+            return self.deck_note_type_cache.setdefault(key, DeckNoteType(deck_id, deck_name, model_id, model_name))
 
     # given a deck id, model id and field name, build DNTF
     def build_deck_note_type_field(self, deck_id, model_id, field_name) -> DeckNoteTypeField:
         deck_note_type = self.build_deck_note_type(deck_id, model_id)
-        return DeckNoteTypeField(deck_note_type, field_name)
+        return self.build_dntf_from_dnt(deck_note_type, field_name)
 
     # given a deck name, model name and field name, build the DNTF
     def build_deck_note_type_field_from_names(self, deck_name, model_name, field_name) -> DeckNoteTypeField:
@@ -141,27 +227,36 @@ class DeckUtils():
             raise errors.AnkiItemNotFoundError(f'Deck {deck_name} not found')
 
         deck_note_type = self.build_deck_note_type(deck_id, model_id)
-        return DeckNoteTypeField(deck_note_type, field_name)    
+        return self.build_dntf_from_dnt(deck_note_type, field_name)
+
+    # given a model id, return the field names and a field name -> index map
+    def get_model_fields(self, model_id):
+        with self.cache_lock:
+            model_fields = self.model_fields_cache.get(model_id, None)
+        if model_fields != None:
+            return model_fields
+
+        model = self.anki_utils.get_model(model_id)
+        if model == None:
+            raise errors.AnkiItemNotFoundError(f'Note Type id {model_id} not found')
+        field_names = [x['name'] for x in model['flds']]
+        field_index_map = {field_name: index for index, field_name in enumerate(field_names)}
+        with self.cache_lock:
+            return self.model_fields_cache.setdefault(model_id, (field_names, field_index_map))
 
     # given a DNT, get field names
     def get_field_names(self, deck_note_type):
-        model = self.anki_utils.get_model(deck_note_type.model_id)
-        fields = model['flds']
-        field_names = [x['name'] for x in fields]
-        return field_names        
+        field_names, field_index_map = self.get_model_fields(deck_note_type.model_id)
+        return list(field_names)
 
     # given a DNT and field index, return DNTF
     def get_dntf_from_fieldindex(self, deck_note_type: DeckNoteType, field_index) -> DeckNoteTypeField:
-        model = self.anki_utils.get_model(deck_note_type.model_id)
-        fields = model['flds']
-        field_name = fields[field_index]['name']
-        return self.build_dntf_from_dnt(deck_note_type, field_name)        
+        field_names, field_index_map = self.get_model_fields(deck_note_type.model_id)
+        field_name = field_names[field_index]
+        return self.build_dntf_from_dnt(deck_note_type, field_name)
 
     def get_field_id(self, deck_note_type_field: DeckNoteTypeField):
-        model = self.anki_utils.get_model(deck_note_type_field.deck_note_type.model_id)
-        fields = model['flds']
-        field_names = [x['name'] for x in fields]
-        if deck_note_type_field.field_name not in field_names:
+        field_names, field_index_map = self.get_model_fields(deck_note_type_field.deck_note_type.model_id)
+        if deck_note_type_field.field_name not in field_index_map:
             raise errors.FieldNotFoundError(deck_note_type_field)
-        field_index = field_names.index(deck_note_type_field.field_name)
-        return field_index    
\ No newline at end of file
+        return field_index_map[deck_note_type_field.field_name]
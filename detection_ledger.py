@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import logging
+
+if hasattr(sys, '_pytest_mode'):
+    import language_classifier
+else:
+    from . import language_classifier
+
+# number of character bigrams kept in the fingerprint
+FINGERPRINT_NGRAM_COUNT = 64
+
+
+class DetectionLedger():
+    """remembers, for each field, what its content looked like when its language was last detected:
+    the number of notes, and a fingerprint of the sampled content (the share of letters in each script,
+    and the frequencies of the most common character bigrams, which tell apart languages sharing a script).
+    lets language detection skip the fields which haven't changed much since."""
+
+    LEDGER_FILENAME = 'language_detection_ledger.json'
+
+    def __init__(self, directory, max_drift, max_ngram_drift):
+        self.directory = directory
+        self.max_drift = max_drift
+        self.max_ngram_drift = max_ngram_drift
+        self.lock = threading.Lock()
+        self.ledger = None
+        self.ledger_dirty = False
+
+    def get_ledger_path(self):
+        return os.path.join(self.directory, self.LEDGER_FILENAME)
+
+    def load_ledger_locked(self):
+        if self.ledger != None:
+            return
+        try:
+            with open(self.get_ledger_path(), 'r', encoding='utf-8') as f:
+                self.ledger = json.load(f)
+        except FileNotFoundError:
+            self.ledger = {}
+        except (ValueError, OSError):
+            logging.exception('could not load language detection ledger, starting with an empty one')
+            self.ledger = {}
+
+    def save_ledger_locked(self):
+        if not self.ledger_dirty:
+            return
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False, encoding='utf-8') as f:
+            json.dump(self.ledger, f)
+        os.replace(f.name, self.get_ledger_path())
+        self.ledger_dirty = False
+
+    def get_entry(self, field_key):
+        with self.lock:
+            self.load_ledger_locked()
+            return self.ledger.get(field_key.model_name, {}).get(field_key.deck_name, {}).get(field_key.field_name, None)
+
+    def record(self, field_key, note_count, fingerprint, language):
+        with self.lock:
+            self.load_ledger_locked()
+            deck_entries = self.ledger.setdefault(field_key.model_name, {}).setdefault(field_key.deck_name, {})
+            deck_entries[field_key.field_name] = {
+                'note_count': note_count,
+                'fingerprint': fingerprint,
+                'language': language
+            }
+            self.ledger_dirty = True
+
+    def get_drift(self, entry, note_count, fingerprint):
+        """returns (drift, ngram_drift). drift is the largest of the note count drift, relative to the note count
+        at detection time, and the script drift. ngram drift is noisier, samples are random, so it gets its own threshold"""
+        note_count_drift = abs(note_count - entry['note_count']) / max(entry['note_count'], 1)
+        previous_fingerprint = entry['fingerprint']
+        if 'scripts' not in previous_fingerprint or 'ngrams' not in previous_fingerprint:
+            # recorded before bigrams were part of the fingerprint
+            return note_count_drift, 1.0
+        script_drift = get_distance(previous_fingerprint['scripts'], fingerprint['scripts'])
+        ngram_drift = get_distance(previous_fingerprint['ngrams'], fingerprint['ngrams'])
+        return max(note_count_drift, script_drift), ngram_drift
+
+    def is_current(self, entry, note_count, fingerprint):
+        drift, ngram_drift = self.get_drift(entry, note_count, fingerprint)
+        return drift <= self.max_drift and ngram_drift <= self.max_ngram_drift
+
+    def flush(self):
+        with self.lock:
+            if self.ledger != None:
+                self.save_ledger_locked()
+
+    def clear(self):
+        with self.lock:
+            self.ledger = {}
+            self.ledger_dirty = True
+            self.save_ledger_locked()
+
+
+def get_distance(shares_1, shares_2):
+    # total variation distance between two distributions, between 0 and 1
+    keys = set(shares_1.keys()) | set(shares_2.keys())
+    return sum([abs(shares_1.get(key, 0) - shares_2.get(key, 0)) for key in keys]) / 2
+
+def get_shares(counts):
+    # rounded so that the ledger stays small
+    total = sum(counts.values())
+    if total == 0:
+        return {}
+    return {key: round(count / total, 3) for key, count in counts.items()}
+
+def get_ngram_counts(field_sample):
+    """counts of the character bigrams of each word, words padded with a space so that their first and last letters count.
+    only the most common ones are kept"""
+    counts = {}
+    for text in field_sample:
+        for word in text.lower().split():
+            word = f' {word} '
+            for i in range(len(word) - 1):
+                ngram = word[i:i+2]
+                counts[ngram] = counts.get(ngram, 0) + 1
+    return dict(sorted(counts.items(), key=lambda x: x[1], reverse=True)[:FINGERPRINT_NGRAM_COUNT])
+
+def get_fingerprint(field_sample):
+    return {
+        'scripts': get_shares(language_classifier.get_script_histogram(field_sample)),
+        'ngrams': get_shares(get_ngram_counts(field_sample))
+    }
@@ -135,6 +135,7 @@ class ApiKeyDialog(aqt.qt.QDialog):
         # store api key into config
         api_key_text = self.api_text_input.text()
         self.languagetools.set_config_api_key(api_key_text)
+        self.languagetools.flush_config()
         self.close()
 
 def prepare_api_key_dialog(languagetools):
@@ -1,6 +1,6 @@
 import sys
 import logging
-from typing import List, Dict
+from typing import List
 import aqt.qt
 
 if hasattr(sys, '_pytest_mode'):
@@ -8,12 +8,14 @@ if hasattr(sys, '_pytest_mode'):
     import deck_utils
     import gui_utils
     import errors
+    import batch_utils
     from languagetools import LanguageTools
 else:
     from . import constants
     from . import deck_utils
     from . import gui_utils
     from . import errors
+    from . import batch_utils
     from .languagetools import LanguageTools
 
 class NoteTableModel(aqt.qt.QAbstractTableModel):
@@ -452,26 +454,36 @@ class BatchConversionDialog(aqt.qt.QDialog):
                     self.noteTableModel.setToFieldData(i, translation_result)
                 return set_to_field
 
+            def get_set_progress_lambda(progress):
+                def set_progress():
+                    self.progress_bar.setValue(progress)
+                return set_progress
+
         except Exception as e:
             self.load_errors.append(e)
             return
 
+        def transform_field_data(field_data):
+            return self.languagetools.get_transliteration(field_data, self.transliteration_option)
 
-        i = 0
-        for field_data in self.from_field_data:
-            try:
-                if self.transformation_type == constants.TransformationType.Translation:
-                    translation_result = self.languagetools.get_translation(field_data, self.translation_option)
-                elif self.transformation_type == constants.TransformationType.Transliteration:
-                    translation_result = self.languagetools.get_transliteration(field_data, self.transliteration_option)
+        # requests run in parallel, results come back here as they complete,
+        # the row index keeps them aligned with the notes
+        if self.transformation_type == constants.TransformationType.Translation:
+            # texts get packed into batch requests
+            results = self.languagetools.get_translation_batch(self.from_field_data, self.translation_option)
+        elif self.transformation_type == constants.TransformationType.Transliteration:
+            results = batch_utils.run_concurrently(transform_field_data, self.from_field_data, self.languagetools.get_batch_max_workers())
+        progress = 0
+        for i, translation_result, exception in results:
+            if exception == None:
                 self.languagetools.anki_utils.run_on_main(get_set_to_field_lambda(i, translation_result))
-            except errors.LanguageToolsError as e:
-                self.load_errors.append(e)
-            except Exception as e:
-                logging.exception(e)
-                self.load_errors.append(e)
-            i += 1
-            self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setValue(i))
+            elif isinstance(exception, errors.LanguageToolsError):
+                self.load_errors.append(exception)
+            else:
+                logging.exception(exception)
+                self.load_errors.append(exception)
+            progress += 1
+            self.languagetools.anki_utils.run_on_main(get_set_progress_lambda(progress))
 
         self.languagetools.anki_utils.run_on_main(lambda: self.applyButton.setDisabled(False))
         self.languagetools.anki_utils.run_on_main(lambda: self.applyButton.setStyleSheet(self.languagetools.anki_utils.get_green_stylesheet()))
@@ -515,11 +527,10 @@ class BatchConversionDialog(aqt.qt.QDialog):
             self.languagetools.store_batch_translation_setting(deck_note_type_field, self.from_field, self.translation_option)
         elif self.transformation_type == constants.TransformationType.Transliteration:
             self.languagetools.store_batch_transliteration_setting(deck_note_type_field, self.from_field, self.transliteration_option)
+        self.languagetools.flush_config()
 
 
 def prepare_batch_transformation_dialogue(languagetools, deck_note_type, note_id_list, transformation_type):
-    deck_map: Dict[str, Deck] = languagetools.get_populated_decks()
-
     dialog = BatchConversionDialog(languagetools, deck_note_type, note_id_list, transformation_type)
     dialog.setupUi()
     return dialog
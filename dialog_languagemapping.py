@@ -16,17 +16,216 @@ else:
     from . import errors
     from .languagetools import LanguageTools
 
-class LanguageMappingDeckWidgets(object):
-    def __init__(self):
-        pass
-
-class LanguageMappingNoteTypeWidgets(object):
-    def __init__(self):
-        pass
+COL_INDEX_NAME = 0
+COL_INDEX_LANGUAGE = 1
+COL_INDEX_SAMPLES = 2
+
+class LanguageMappingNode():
+    # one row of the tree: a deck, a note type within a deck, or a field (which has a DeckNoteTypeField)
+    def __init__(self, name, parent, row, deck_note_type_field=None):
+        self.name = name
+        self.parent = parent
+        self.row = row
+        self.deck_note_type_field = deck_note_type_field
+        self.children = []
+
+    def add_child(self, name, deck_note_type_field=None):
+        child = LanguageMappingNode(name, self, len(self.children), deck_note_type_field)
+        self.children.append(child)
+        return child
+
+    def is_field(self):
+        return self.deck_note_type_field != None
+
+
+class LanguageMappingTreeModel(aqt.qt.QAbstractItemModel):
+    """decks -> note types -> fields. the view only asks for the rows it displays, languages are looked up
+    as rows get displayed, and filtering swaps the list of top level deck rows."""
+
+    def __init__(self, languagetools: LanguageTools, deck_map: Dict[str, deck_utils.Deck], language_name_list, language_code_list):
+        aqt.qt.QAbstractItemModel.__init__(self, None)
+        self.languagetools = languagetools
+        self.language_name_list = language_name_list
+        self.language_code_list = language_code_list
+        self.language_mapping_changes = {}
 
-class LanguageMappingFieldWidgets(object):
-    def __init__(self):
-        pass
+        self.deck_nodes = []
+        self.field_node_map = {}
+        for deck_name, deck in deck_map.items():
+            deck_node = LanguageMappingNode(deck_name, None, len(self.deck_nodes))
+            self.deck_nodes.append(deck_node)
+            for note_type_name, dntf_list in deck.note_type_map.items():
+                note_type_node = deck_node.add_child(note_type_name)
+                for deck_note_type_field in dntf_list:
+                    self.field_node_map[deck_note_type_field] = note_type_node.add_child(deck_note_type_field.field_name, deck_note_type_field)
+        # deck rows currently shown, and lowercase deck names for filtering
+        self.visible_deck_nodes = list(self.deck_nodes)
+        self.deck_filter_index = [(deck_node.name.lower(), deck_node) for deck_node in self.deck_nodes]
+
+        self.header_text = ['Field', 'Language', 'Samples']
+
+        self.bold_font = aqt.qt.QFont()
+        self.bold_font.setBold(True)
+        self.changed_color = aqt.qt.QColor(self.languagetools.anki_utils.get_green_color())
+
+    def set_filter(self, filter_text):
+        self.beginResetModel()
+        if filter_text == None or len(filter_text) == 0:
+            self.visible_deck_nodes = list(self.deck_nodes)
+        else:
+            filter_text = filter_text.lower()
+            self.visible_deck_nodes = [deck_node for deck_name, deck_node in self.deck_filter_index if filter_text in deck_name]
+        for row, deck_node in enumerate(self.visible_deck_nodes):
+            deck_node.row = row
+        self.endResetModel()
+
+    def get_visible_dntf_list(self) -> List[deck_utils.DeckNoteTypeField]:
+        return [field_node.deck_note_type_field for deck_node in self.visible_deck_nodes
+            for note_type_node in deck_node.children for field_node in note_type_node.children]
+
+    def get_dntf_index(self, deck_note_type_field: deck_utils.DeckNoteTypeField, column):
+        field_node = self.field_node_map[deck_note_type_field]
+        deck_node = field_node.parent.parent
+        if deck_node.row >= len(self.visible_deck_nodes) or self.visible_deck_nodes[deck_node.row] is not deck_node:
+            # filtered out
+            return aqt.qt.QModelIndex()
+        return self.createIndex(field_node.row, column, field_node)
+
+    def get_language(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
+        if deck_note_type_field in self.language_mapping_changes:
+            return self.language_mapping_changes[deck_note_type_field]
+        return self.languagetools.get_language(deck_note_type_field)
+
+    def get_language_row(self, language):
+        if language == None:
+            # not set
+            return len(self.language_name_list) - 1
+        return self.language_code_list.index(language)
+
+    def set_language(self, deck_note_type_field: deck_utils.DeckNoteTypeField, language):
+        """returns True if the language changed"""
+        if self.get_language(deck_note_type_field) == language:
+            return False
+        self.language_mapping_changes[deck_note_type_field] = language
+        index = self.get_dntf_index(deck_note_type_field, COL_INDEX_LANGUAGE)
+        if index.isValid():
+            self.dataChanged.emit(index.siblingAtColumn(COL_INDEX_NAME), index.siblingAtColumn(COL_INDEX_SAMPLES))
+        return True
+
+    # QAbstractItemModel
+    # ==================
+
+    def index(self, row, column, parent=aqt.qt.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return aqt.qt.QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, self.visible_deck_nodes[row])
+        parent_node = parent.internalPointer()
+        return self.createIndex(row, column, parent_node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return aqt.qt.QModelIndex()
+        node = index.internalPointer()
+        if node.parent == None:
+            return aqt.qt.QModelIndex()
+        return self.createIndex(node.parent.row, 0, node.parent)
+
+    def rowCount(self, parent=aqt.qt.QModelIndex()):
+        if not parent.isValid():
+            return len(self.visible_deck_nodes)
+        if parent.column() > 0:
+            return 0
+        return len(parent.internalPointer().children)
+
+    def columnCount(self, parent=aqt.qt.QModelIndex()):
+        return len(self.header_text)
+
+    def flags(self, index):
+        if not index.isValid():
+            return aqt.qt.Qt.ItemFlag.NoItemFlags
+        node = index.internalPointer()
+        if node.is_field() and index.column() == COL_INDEX_LANGUAGE:
+            return aqt.qt.Qt.ItemFlag.ItemIsEditable | aqt.qt.Qt.ItemFlag.ItemIsSelectable | aqt.qt.Qt.ItemFlag.ItemIsEnabled
+        return aqt.qt.Qt.ItemFlag.ItemIsSelectable | aqt.qt.Qt.ItemFlag.ItemIsEnabled
+
+    def data(self, index, role):
+        if not index.isValid():
+            return aqt.qt.QVariant()
+
+        node = index.internalPointer()
+        column = index.column()
+
+        if not node.is_field():
+            # deck and note type rows only have a name
+            if column != COL_INDEX_NAME:
+                return aqt.qt.QVariant()
+            if role == aqt.qt.Qt.ItemDataRole.DisplayRole:
+                if node.parent == None:
+                    return aqt.qt.QVariant(f'Deck: {node.name}')
+                return aqt.qt.QVariant(f'Note Type: {node.name}')
+            if role == aqt.qt.Qt.ItemDataRole.FontRole:
+                return self.bold_font
+            return aqt.qt.QVariant()
+
+        deck_note_type_field = node.deck_note_type_field
+        if role == aqt.qt.Qt.ItemDataRole.DisplayRole:
+            if column == COL_INDEX_NAME:
+                return aqt.qt.QVariant(node.name)
+            if column == COL_INDEX_LANGUAGE:
+                return aqt.qt.QVariant(self.language_name_list[self.get_language_row(self.get_language(deck_note_type_field))])
+            if column == COL_INDEX_SAMPLES:
+                return aqt.qt.QVariant('Show Samples')
+        if role == aqt.qt.Qt.ItemDataRole.EditRole and column == COL_INDEX_LANGUAGE:
+            return aqt.qt.QVariant(self.get_language_row(self.get_language(deck_note_type_field)))
+        if role == aqt.qt.Qt.ItemDataRole.BackgroundRole and column == COL_INDEX_LANGUAGE:
+            if deck_note_type_field in self.language_mapping_changes:
+                return self.changed_color
+        return aqt.qt.QVariant()
+
+    def setData(self, index, value, role):
+        if not index.isValid() or role != aqt.qt.Qt.ItemDataRole.EditRole:
+            return False
+        node = index.internalPointer()
+        if not node.is_field() or index.column() != COL_INDEX_LANGUAGE:
+            return False
+        language = None
+        if value < len(self.language_code_list):
+            language = self.language_code_list[value]
+        self.set_language(node.deck_note_type_field, language)
+        return True
+
+    def headerData(self, col, orientation, role):
+        if orientation == aqt.qt.Qt.Orientation.Horizontal and role == aqt.qt.Qt.ItemDataRole.DisplayRole:
+            return aqt.qt.QVariant(self.header_text[col])
+        return aqt.qt.QVariant()
+
+
+class LanguageComboBoxDelegate(aqt.qt.QStyledItemDelegate):
+    # only the row being edited gets a combobox, all of them share the same language list model
+    def __init__(self, language_list_model, parent):
+        aqt.qt.QStyledItemDelegate.__init__(self, parent)
+        self.language_list_model = language_list_model
+
+    def createEditor(self, parent, option, index):
+        comboBox = aqt.qt.QComboBox(parent)
+        comboBox.setObjectName('field_language_editor')
+        comboBox.setModel(self.language_list_model)
+        comboBox.setMaxVisibleItems(15)
+        comboBox.setStyleSheet("combobox-popup: 0;")
+        def commit(current_index):
+            self.commitData.emit(comboBox)
+        comboBox.activated.connect(commit)
+        return comboBox
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(index.data(aqt.qt.Qt.ItemDataRole.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentIndex(), aqt.qt.Qt.ItemDataRole.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
 
 
 class LanguageMappingDialog_UI(object):
@@ -39,14 +238,7 @@ class LanguageMappingDialog_UI(object):
         self.language_name_list = data['language_name_list']
         self.language_code_list = data['language_code_list']
         self.language_name_list.append('Not Set')
-
-        self.language_mapping_changes = {}
-
-        self.deckWidgetMap = {}
-        self.deckNoteTypeWidgetMap = {}
-        self.fieldWidgetMap = {}
-
-        self.dntfComboxBoxMap = {}
+        self.language_list_model = aqt.qt.QStringListModel(self.language_name_list)
 
         self.autodetect_in_progress = False
         self.interrupt_autodetect = False
@@ -59,20 +251,6 @@ class LanguageMappingDialog_UI(object):
 
         self.topLevel = aqt.qt.QVBoxLayout(Dialog)
 
-        self.scrollArea = aqt.qt.QScrollArea()
-        
-        self.scrollArea.setVerticalScrollBarPolicy(aqt.qt.Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-        self.scrollArea.setHorizontalScrollBarPolicy(aqt.qt.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setObjectName("scrollArea")
-
-        self.layoutWidget = aqt.qt.QWidget()
-        self.layoutWidget.setObjectName("layoutWidget")
-
-        all_decks = aqt.qt.QVBoxLayout(self.layoutWidget)
-        all_decks.setContentsMargins(20, 20, 20, 20)
-        all_decks.setObjectName("all_decks")
-
         # add header
         self.topLevel.addWidget(gui_utils.get_header_label('Language Mapping'))
 
@@ -108,18 +286,25 @@ class LanguageMappingDialog_UI(object):
 
         self.topLevel.addLayout(hlayout_global)
 
-        self.deck_name_widget_map = {}
-        for deck_name, deck in deck_map.items():
-            deck_layout = self.layoutDecks(deck_name, deck)
-            frame = aqt.qt.QFrame()
-            frame.setObjectName(f'frame_{deck_name}')
-            frame.setLayout(deck_layout)
-            self.deck_name_widget_map[deck_name] = frame
-            all_decks.addWidget(frame)
-
-
-        self.scrollArea.setWidget(self.layoutWidget)
-        self.topLevel.addWidget(self.scrollArea)
+        self.model = LanguageMappingTreeModel(self.languagetools, deck_map, self.language_name_list, self.language_code_list)
+        self.model.dataChanged.connect(self.fieldLanguageChanged)
+
+        self.treeView = aqt.qt.QTreeView()
+        self.treeView.setObjectName('language_mapping_tree')
+        self.treeView.setModel(self.model)
+        self.treeView.setUniformRowHeights(True)
+        self.treeView.setSelectionMode(aqt.qt.QAbstractItemView.SelectionMode.NoSelection)
+        self.treeView.setEditTriggers(aqt.qt.QAbstractItemView.EditTrigger.CurrentChanged | aqt.qt.QAbstractItemView.EditTrigger.SelectedClicked)
+        self.language_delegate = LanguageComboBoxDelegate(self.language_list_model, self.treeView)
+        self.treeView.setItemDelegateForColumn(COL_INDEX_LANGUAGE, self.language_delegate)
+        self.treeView.clicked.connect(self.treeViewClicked)
+        header = self.treeView.header()
+        header.setSectionResizeMode(COL_INDEX_NAME, aqt.qt.QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(COL_INDEX_LANGUAGE, aqt.qt.QHeaderView.ResizeMode.Stretch)
+        header.setStretchLastSection(False)
+        self.model.modelReset.connect(self.expandTree)
+        self.expandTree()
+        self.topLevel.addWidget(self.treeView)
 
         self.buttonBox = aqt.qt.QDialogButtonBox()
         self.applyButton = self.buttonBox.addButton("Apply", aqt.qt.QDialogButtonBox.ButtonRole.AcceptRole)
@@ -132,163 +317,24 @@ class LanguageMappingDialog_UI(object):
         self.buttonBox.rejected.connect(self.reject)
         self.topLevel.addWidget(self.buttonBox)
 
+    def expandTree(self):
+        self.treeView.expandAll()
+        # deck and note type names span the whole row
+        for deck_row in range(self.model.rowCount()):
+            deck_index = self.model.index(deck_row, 0)
+            self.treeView.setFirstColumnSpanned(deck_row, aqt.qt.QModelIndex(), True)
+            for note_type_row in range(self.model.rowCount(deck_index)):
+                self.treeView.setFirstColumnSpanned(note_type_row, deck_index, True)
 
-    def layoutDecks(self, deck_name, deck: deck_utils.Deck):
-        layout = aqt.qt.QVBoxLayout()
-
-        deckWidgets = LanguageMappingDeckWidgets()
-        self.deckWidgetMap[deck_name] = deckWidgets
-        self.deckNoteTypeWidgetMap[deck_name] = {}
-        self.fieldWidgetMap[deck_name] = {}
+    def treeViewClicked(self, index):
+        node = index.internalPointer()
+        if node.is_field() and index.column() == COL_INDEX_SAMPLES:
+            self.showFieldSamples(node.deck_note_type_field)
 
-        deckWidgets.deck_info = aqt.qt.QHBoxLayout()
-        deckWidgets.deck_info.setObjectName("deck_info")
-        
-        fontSize = 14
+    def setFieldLanguage(self, deck_note_type_field: deck_utils.DeckNoteTypeField, language):
+        self.model.set_language(deck_note_type_field, language)
 
-        deckWidgets.deck_label = aqt.qt.QLabel(self.layoutWidget)
-        font1 = aqt.qt.QFont()
-        font1.setBold(True)
-        font1.setPointSize(fontSize)
-        deckWidgets.deck_label.setFont(font1)
-        deckWidgets.deck_label.setObjectName("deck_label")
-        deckWidgets.deck_label.setText('Deck:')
-        deckWidgets.deck_info.addWidget(deckWidgets.deck_label)
-
-        font2 = aqt.qt.QFont()
-        font2.setPointSize(fontSize)
-        deckWidgets.deck_name = aqt.qt.QLabel(self.layoutWidget)
-        deckWidgets.deck_name.setObjectName(f'deck_name_{deck_name}')
-        deckWidgets.deck_name.setText(deck_name)
-        deckWidgets.deck_name.setFont(font2)
-        deckWidgets.deck_info.addWidget(deckWidgets.deck_name)
-
-        deckWidgets.deck_info.addStretch(1)
-
-        layout.addLayout(deckWidgets.deck_info)
-        
-        # iterate over note types 
-        for note_type_name, dntf_list in deck.note_type_map.items():
-            self.layoutNoteTypes(layout, deck_name, note_type_name, dntf_list)
-
-        # add spacing at the end
-        layout.addSpacing(30)
-
-        layout.addStretch(1)
-
-        return layout
-                        
-
-    def layoutNoteTypes(self, layout, deck_name, note_type_name, dntf_list: List[deck_utils.DeckNoteTypeField]):
-        noteTypeWidgets = LanguageMappingNoteTypeWidgets()
-        self.deckNoteTypeWidgetMap[deck_name][note_type_name] = noteTypeWidgets
-        self.fieldWidgetMap[deck_name][note_type_name] = {}
-
-        noteTypeWidgets.note_type_info = aqt.qt.QHBoxLayout()
-        noteTypeWidgets.note_type_info.setObjectName("note_type_info")
-
-        fontSize = 12
-
-        font1 = aqt.qt.QFont()
-        font1.setBold(True)
-        font1.setPointSize(fontSize)
-
-        noteTypeWidgets.note_type_label = aqt.qt.QLabel(self.layoutWidget)
-        noteTypeWidgets.note_type_label.setObjectName("note_type_label")
-        noteTypeWidgets.note_type_label.setText('Note Type:')
-        noteTypeWidgets.note_type_label.setFont(font1)
-        noteTypeWidgets.note_type_info.addWidget(noteTypeWidgets.note_type_label)
-
-        font2 = aqt.qt.QFont()
-        font2.setPointSize(fontSize)
-        noteTypeWidgets.note_type_name = aqt.qt.QLabel(self.layoutWidget)
-        noteTypeWidgets.note_type_name.setObjectName(f"note_type_name_{deck_name}_{note_type_name}")
-        noteTypeWidgets.note_type_name.setText(note_type_name)
-        noteTypeWidgets.note_type_name.setFont(font2)
-        noteTypeWidgets.note_type_info.addWidget(noteTypeWidgets.note_type_name)
-
-        noteTypeWidgets.note_type_info.addStretch(1)
-
-        layout.addLayout(noteTypeWidgets.note_type_info)
-
-        noteTypeWidgets.field_info = aqt.qt.QGridLayout()
-        noteTypeWidgets.field_info.setContentsMargins(20, 0, 0, 0)
-        # set stretch factors
-        noteTypeWidgets.field_info.setColumnStretch(0, 50)
-        noteTypeWidgets.field_info.setColumnStretch(1, 50)
-        noteTypeWidgets.field_info.setColumnStretch(2, 0)
-        noteTypeWidgets.field_info.setObjectName("field_info")
-
-        row = 0
-        for deck_note_type_field in dntf_list:
-            self.layoutField(row, deck_note_type_field, noteTypeWidgets.field_info)
-            row += 1
-
-        layout.addLayout(noteTypeWidgets.field_info)
-
-
-    def layoutField(self, row:int, deck_note_type_field: deck_utils.DeckNoteTypeField, gridLayout: aqt.qt.QGridLayout):
-
-        fieldWidgets = LanguageMappingFieldWidgets()
-        self.fieldWidgetMap[deck_note_type_field.deck_note_type.deck_name][deck_note_type_field.deck_note_type.model_name][deck_note_type_field.field_name] = fieldWidgets
-
-        language_set = self.languagetools.get_language(deck_note_type_field)
-
-        fieldWidgets.field_label = aqt.qt.QLabel(self.layoutWidget)
-        field_label_obj_name = f'field_label_{str(deck_note_type_field)}'
-        fieldWidgets.field_label.setObjectName(field_label_obj_name)
-        fieldWidgets.field_label.setText(deck_note_type_field.field_name)
-        gridLayout.addWidget(fieldWidgets.field_label, row, 0, 1, 1)
-
-        fieldWidgets.field_language = aqt.qt.QComboBox(self.layoutWidget)
-        field_language_obj_name = f'field_language_{str(deck_note_type_field)}'
-        fieldWidgets.field_language.setObjectName(field_language_obj_name)
-        fieldWidgets.field_language.addItems(self.language_name_list)
-        fieldWidgets.field_language.setMaxVisibleItems(15)
-        fieldWidgets.field_language.setStyleSheet("combobox-popup: 0;")
-        self.setFieldLanguageIndex(fieldWidgets.field_language, language_set)
-
-        # listen to events
-        def get_currentIndexChangedLambda(comboBox, deck_note_type_field: deck_utils.DeckNoteTypeField):
-            def callback(currentIndex):
-                self.fieldLanguageIndexChanged(comboBox, deck_note_type_field, currentIndex)
-            return callback
-        fieldWidgets.field_language.currentIndexChanged.connect(get_currentIndexChangedLambda(fieldWidgets.field_language, deck_note_type_field)) 
-
-        self.dntfComboxBoxMap[deck_note_type_field] = fieldWidgets.field_language
-
-        gridLayout.addWidget(fieldWidgets.field_language, row, 1, 1, 1)
-
-        fieldWidgets.field_samples_button = aqt.qt.QPushButton(self.layoutWidget)
-        field_samples_button_obj_name = f'field_samples_{str(deck_note_type_field)}'
-        fieldWidgets.field_samples_button.setObjectName(field_samples_button_obj_name)
-        fieldWidgets.field_samples_button.setText('Show Samples')
-
-        def getShowFieldSamplesLambda(deck_note_type_field: deck_utils.DeckNoteTypeField):
-            def callback():
-                self.showFieldSamples(deck_note_type_field)
-            return callback
-        fieldWidgets.field_samples_button.pressed.connect(getShowFieldSamplesLambda(deck_note_type_field))
-
-        gridLayout.addWidget(fieldWidgets.field_samples_button, row, 2, 1, 1)
-
-    def setFieldLanguageIndex(self, comboBox, language):
-        if language != None:
-            # locate index of language
-            current_index = self.language_code_list.index(language)
-            comboBox.setCurrentIndex(current_index)
-        else:
-            # not set
-            comboBox.setCurrentIndex(len(self.language_name_list) - 1)
-
-    def fieldLanguageIndexChanged(self, comboBox, deck_note_type_field: deck_utils.DeckNoteTypeField, currentIndex):
-        # print(f'fieldLanguageIndexChanged: {deck_note_type_field}')
-        language_code = None
-        if currentIndex < len(self.language_code_list):
-            language_code = self.language_code_list[currentIndex]
-        self.language_mapping_changes[deck_note_type_field] = language_code
-        # change stylesheet of combobox
-        comboBox.setStyleSheet(self.languagetools.anki_utils.get_green_stylesheet() + "combobox-popup: 0;")
+    def fieldLanguageChanged(self, top_left, bottom_right):
         # enable apply button
         if not self.autodetect_in_progress:
             self.enableApplyButton()
@@ -310,32 +356,15 @@ class LanguageMappingDialog_UI(object):
         self.interrupt_autodetect = True
         self.Dialog.close()
 
-    def filterEmpty(self, filter_text):
-        if filter_text == None:
-            return True
-        if len(filter_text) == 0:
-            return True
-        return False
-
-    def matchFilter(self, filter_text, deck_name):
-        if self.filterEmpty(filter_text):
-            return True
-        return filter_text.lower() in deck_name.lower()
-
     def getFilterResultText(self, displayed_count, total_count):
         filter_result = f'{displayed_count} / {total_count} decks'
         return filter_result
 
     def filterTextChanged(self, new_filter_text):
         self.filter_text = new_filter_text
-        total_count = len(self.deck_name_widget_map)
-        displayed_count = 0
-        for deck_name, frame in self.deck_name_widget_map.items():
-            if self.matchFilter(new_filter_text, deck_name):
-                frame.setVisible(True)
-                displayed_count += 1
-            else:
-                frame.setVisible(False)
+        self.model.set_filter(new_filter_text)
+        total_count = len(self.model.deck_nodes)
+        displayed_count = len(self.model.visible_deck_nodes)
         filter_result = self.getFilterResultText(displayed_count, total_count)
         self.filter_result_label.setText(filter_result)
 
@@ -346,8 +375,9 @@ class LanguageMappingDialog_UI(object):
 
 
     def saveLanguageMappingChanges(self):
-        for key, value in self.language_mapping_changes.items():
+        for key, value in self.model.language_mapping_changes.items():
             self.languagetools.store_language_detection_result(key, value)
+        self.languagetools.flush_config()
 
     def runLanguageDetection(self):
         if self.languagetools.ensure_api_key_checked() == False:
@@ -361,38 +391,41 @@ class LanguageMappingDialog_UI(object):
             self.autodetect_button.setEnabled(False)
             self.disableApplyButton()
 
-            dtnf_list: List[deck_utils.DeckNoteTypeField] = self.languagetools.get_populated_dntf()
-            progress_max = 0
-            for dntf in dtnf_list:
-                deck_name = dntf.deck_note_type.deck_name
-                if self.matchFilter(self.filter_text, deck_name):
-                    progress_max += 1
+            # the decks currently shown
+            dtnf_list: List[deck_utils.DeckNoteTypeField] = self.model.get_visible_dntf_list()
+            progress_max = len(dtnf_list)
             self.setProgressBarMax(progress_max)
 
             progress = 0
-            for dntf in dtnf_list:
-                if self.interrupt_autodetect == True:
-                    return
-
-                deck_name = dntf.deck_note_type.deck_name
-                if self.matchFilter(self.filter_text, deck_name):
-                    language = self.languagetools.perform_language_detection_deck_note_type_field(dntf)
-                    #self.language_mapping_changes[deck_note_type_field] = language
-                    # need to set combo box correctly.
-                    comboBox = self.dntfComboxBoxMap[dntf]
-                    self.setFieldLanguageIndex(comboBox, language)
-
-                    # progress bar
-                    self.setProgressValue(progress)
-                    progress += 1
-            
+            detection_errors = []
+            interrupted_fn = lambda: self.interrupt_autodetect
+            # fields which haven't changed since they were last detected keep their language
+            for index, language, exception in self.languagetools.perform_language_detection_batch(dtnf_list, interrupted_fn, incremental=True):
+                if exception != None:
+                    logging.error(f'could not run language detection for {dtnf_list[index]}: {exception}')
+                    detection_errors.append(exception)
+                else:
+                    self.setDetectedLanguage(dtnf_list[index], language)
+
+                # progress bar
+                progress += 1
+                self.setProgressValue(progress)
+
+            if self.interrupt_autodetect == True:
+                return
+
             self.setProgressValue(progress_max)
+            if len(detection_errors) > 0:
+                self.displayErrorMessage(f'Could not run language detection on {len(detection_errors)} fields: {detection_errors[0]}')
         except:
             logging.exception('could not run language detection')
             error_message = str(sys.exc_info())
             self.displayErrorMessage(error_message)
 
 
+    def setDetectedLanguage(self, deck_note_type_field: deck_utils.DeckNoteTypeField, language):
+        self.languagetools.anki_utils.run_on_main(lambda: self.setFieldLanguage(deck_note_type_field, language))
+
     def setProgressBarMax(self, progress_max):
         self.languagetools.anki_utils.run_on_main(lambda: self.autodetect_progressbar.setMaximum(progress_max))
 
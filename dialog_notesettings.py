@@ -309,6 +309,7 @@ class NoteSettingsDialog(NoteSettingsDialogBase):
             self.languagetools.remove_transliteration_setting(dntf)
         for dntf in self.remove_audio_map.keys():
             self.languagetools.remove_audio_setting(dntf)
+        self.languagetools.flush_config()
         
         self.close()
 
@@ -379,6 +380,69 @@ class RunRulesDialog(NoteSettingsDialogBase):
 
 
 
+    def build_rule_plan(self, translation_settings, transliteration_settings, audio_settings):
+        """list of the enabled rules, in the order in which they get applied to each note"""
+        def get_translation_batch_fn(translation_option):
+            return lambda field_data_list: self.languagetools.get_translation_batch(field_data_list, translation_option)
+
+        def get_translation_fn(translation_option):
+            return lambda field_data: self.languagetools.get_translation(field_data, translation_option)
+
+        def get_transliteration_fn(transliteration_option):
+            return lambda field_data: self.languagetools.get_transliteration(field_data, transliteration_option)
+
+        def get_audio_fn(from_dntf):
+            # the voice is looked up the first time it's needed, errors get reported against each note
+            voice_holder = []
+            def generate_audio(field_data):
+                if len(voice_holder) == 0:
+                    voice_holder.append(self.languagetools.get_voice_for_field(from_dntf))
+                return self.languagetools.generate_audio_tag_collection(field_data, voice_holder[0])['sound_tag']
+            return generate_audio
+
+        def build_rule(transformation_name, from_field, to_field):
+            return {
+                'transformation_name': transformation_name,
+                'from_dntf': self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, from_field),
+                'to_dntf': self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, to_field)
+            }
+
+        rule_plan = []
+        for to_field, setting in translation_settings.items():
+            if self.target_field_checkbox_map[to_field].isChecked():
+                rule = build_rule('translation', setting['from_field'], to_field)
+                # translations of all the notes in a block get packed into batch requests
+                rule['batch_fn'] = get_translation_batch_fn(setting['translation_option'])
+                # notes which the batch didn't return a result for get translated one by one
+                rule['transform_fn'] = get_translation_fn(setting['translation_option'])
+                rule_plan.append(rule)
+        for to_field, setting in transliteration_settings.items():
+            if self.target_field_checkbox_map[to_field].isChecked():
+                rule = build_rule('transliteration', setting['from_field'], to_field)
+                rule['transform_fn'] = get_transliteration_fn(setting['transliteration_option'])
+                rule_plan.append(rule)
+        for to_field, from_field in audio_settings.items():
+            if self.target_field_checkbox_map[to_field].isChecked():
+                rule = build_rule('audio', from_field, to_field)
+                rule['transform_fn'] = get_audio_fn(rule['from_dntf'])
+                rule_plan.append(rule)
+
+        return rule_plan
+
+    def get_rule_batch_results(self, rule, note_ids, notes_field_values):
+        """for rules which support batching, returns {note_id: (result, exception)} for all notes which have the required fields"""
+        if 'batch_fn' not in rule:
+            return {}
+        from_field = rule['from_dntf'].field_name
+        to_field = rule['to_dntf'].field_name
+        batch_note_ids = [note_id for note_id in note_ids 
+            if from_field in notes_field_values.get(note_id, {}) and to_field in notes_field_values.get(note_id, {})]
+        field_data_list = [notes_field_values[note_id][from_field] for note_id in batch_note_ids]
+        batch_results = {}
+        for index, result, exception in rule['batch_fn'](field_data_list):
+            batch_results[batch_note_ids[index]] = (result, exception)
+        return batch_results
+
     def process_rules_task(self):
         self.batch_error_manager = self.languagetools.error_manager.get_batch_error_manager('processing rules')
 
@@ -386,11 +450,8 @@ class RunRulesDialog(NoteSettingsDialogBase):
         transliteration_settings = self.languagetools.get_batch_transliteration_settings(self.deck_note_type)
         audio_settings = self.languagetools.get_batch_audio_settings(self.deck_note_type)
 
-        num_rules = 0
-        for rule_list in [translation_settings, transliteration_settings, audio_settings]:
-            for to_field, setting in rule_list.items():
-                if self.target_field_checkbox_map[to_field].isChecked():
-                    num_rules += 1
+        rule_plan = self.build_rule_plan(translation_settings, transliteration_settings, audio_settings)
+        num_rules = len(rule_plan)
 
         logging.debug(f'num rules enabled: {num_rules}')
         self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setMaximum(len(self.note_id_list) * num_rules))
@@ -398,62 +459,39 @@ class RunRulesDialog(NoteSettingsDialogBase):
         action_str = 'Process Rules'
         self.undo_id = self.languagetools.anki_utils.undo_start(action_str)
 
+        # load the field values of all notes at once
+        notes_field_values = self.languagetools.anki_utils.get_notes_field_values(self.deck_note_type.model_id, self.note_id_list)
+
         progress_value = 0
         self.generate_errors = []
-        for note_id in self.note_id_list:
-            note = self.languagetools.anki_utils.get_note_by_id(note_id)
-            need_to_flush = False
-            for to_field, setting in translation_settings.items():
-                if self.target_field_checkbox_map[to_field].isChecked():
-                    with self.batch_error_manager.get_batch_action_context(f'adding translation to field {to_field}'):
-                        from_field = setting['from_field']
-                        from_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, from_field)
-                        to_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, to_field)
-                        self.verify_to_from_fields(note, from_dntf, to_dntf)
-                        logging.info(f'generating translation from {from_dntf} to {to_dntf}')
-
-                        field_data = note[from_field]
-                        translation_option = setting['translation_option']
-                        translation_result = self.languagetools.get_translation(field_data, translation_option)
-                        note[to_field] = translation_result
-                        need_to_flush = True
-                    progress_value += 1
-                    self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setValue(progress_value))
-            for to_field, setting in transliteration_settings.items():
-                if self.target_field_checkbox_map[to_field].isChecked():
-                    with self.batch_error_manager.get_batch_action_context(f'adding transliteration to field {to_field}'):
-                        from_field = setting['from_field']
-                        from_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, from_field)
-                        to_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, to_field)
-                        self.verify_to_from_fields(note, from_dntf, to_dntf)
-                        logging.info(f'generating transliteration from {from_dntf} to {to_dntf}')
-
-                        field_data = note[from_field]
-                        transliteration_option = setting['transliteration_option']
-                        transliteration_result = self.languagetools.get_transliteration(field_data, transliteration_option)
-                        note[to_field] = transliteration_result
-                        need_to_flush = True
-                    progress_value += 1
-                    self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setValue(progress_value))
-            for to_field, from_field in audio_settings.items():
-                if self.target_field_checkbox_map[to_field].isChecked():
-                    with self.batch_error_manager.get_batch_action_context(f'adding audio to field {to_field}'):
-                        from_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, from_field)
-                        to_dntf = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, to_field)
-                        self.verify_to_from_fields(note, from_dntf, to_dntf)
-                        logging.info(f'generating audio from {from_dntf} to {to_dntf}')
-
-                        field_data = note[from_field]
-                        voice = self.languagetools.get_voice_for_field(from_dntf)
-                        result = self.languagetools.generate_audio_tag_collection(field_data, voice)
-                        note[to_field] = result['sound_tag']
-                        need_to_flush = True
+        # notes are processed in blocks, all the rules get applied to a block before its notes get saved
+        for block_start in range(0, len(self.note_id_list), constants.NOTE_UPDATE_CHUNK_SIZE):
+            block_note_ids = self.note_id_list[block_start:block_start + constants.NOTE_UPDATE_CHUNK_SIZE]
+            pending_updates = {}
+            for rule in rule_plan:
+                from_dntf = rule['from_dntf']
+                to_dntf = rule['to_dntf']
+                batch_results = self.get_rule_batch_results(rule, block_note_ids, notes_field_values)
+                for note_id in block_note_ids:
+                    field_values = notes_field_values.get(note_id, {})
+                    with self.batch_error_manager.get_batch_action_context(f'adding {rule["transformation_name"]} to field {to_dntf.field_name}'):
+                        self.verify_to_from_fields(field_values, from_dntf, to_dntf)
+                        logging.info(f'generating {rule["transformation_name"]} from {from_dntf} to {to_dntf}')
+                        if note_id in batch_results:
+                            result, exception = batch_results[note_id]
+                            if exception != None:
+                                raise exception
+                        else:
+                            result = rule['transform_fn'](field_values[from_dntf.field_name])
+                        # later rules may use this field as their source
+                        field_values[to_dntf.field_name] = result
+                        pending_updates.setdefault(note_id, {})[to_dntf.field_name] = result
                     progress_value += 1
                     self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setValue(progress_value))
 
-            # write output to note
-            if need_to_flush:
-                self.languagetools.anki_utils.update_note(note)
+            # write output to notes
+            if len(pending_updates) > 0:
+                self.languagetools.anki_utils.update_notes_fields(pending_updates)
 
         self.languagetools.anki_utils.undo_end(self.undo_id)
 
@@ -169,7 +169,9 @@ class TextProcessingDialog(aqt.qt.QDialog):
     def __init__(self, languagetools: LanguageTools):
         super(aqt.qt.QDialog, self).__init__()
         self.languagetools = languagetools
-        self.textReplacementTableModel = TextReplacementsTableModel(self.update_transformed_text, languagetools.text_utils.replacements)
+        # edit a copy, the live replacements only change when the settings get saved
+        replacements = [text_utils.TextReplacement(replacement.to_dict()) for replacement in languagetools.text_utils.replacements]
+        self.textReplacementTableModel = TextReplacementsTableModel(self.update_transformed_text, replacements)
 
     def setupUi(self):
         self.setWindowTitle(constants.ADDON_NAME)
@@ -285,8 +287,10 @@ class TextProcessingDialog(aqt.qt.QDialog):
             self.textReplacementTableModel.delete_rows(rows_indices[0])
 
     def accept(self):
-        self.languagetools.store_text_processing_settings(self.get_text_processing_settings())
-        self.close()
+        with self.languagetools.error_manager.get_single_action_context('saving text processing settings'):
+            self.languagetools.store_text_processing_settings(self.get_text_processing_settings())
+            self.languagetools.flush_config()
+            self.close()
 
 def prepare_text_processing_dialog(languagetools):
     text_processing_dialog = TextProcessingDialog(languagetools)
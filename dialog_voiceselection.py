@@ -21,6 +21,12 @@ class VoiceSelectionDialog(aqt.qt.QDialog):
         
         # get list of languages
         self.voice_list = voice_list
+        # voices for each language, sorted for display
+        self.voices_by_language = {}
+        for voice in self.voice_list:
+            self.voices_by_language.setdefault(voice['language_code'], []).append(voice)
+        for language_voices in self.voices_by_language.values():
+            language_voices.sort(key=lambda x: x['voice_description'])
         wanted_language_arrays = languagetools.get_wanted_language_arrays()
         self.language_name_list = wanted_language_arrays['language_name_list']
         self.language_code_list = wanted_language_arrays['language_code_list']
@@ -142,8 +148,7 @@ class VoiceSelectionDialog(aqt.qt.QDialog):
         self.language_code = self.language_code_list[current_index]
         self.language_name = self.language_name_list[current_index]
         # filter voices that match this language
-        available_voices = [x for x in self.voice_list if x['language_code'] == self.language_code]
-        self.available_voices = sorted(available_voices, key=lambda x: x['voice_description'])
+        self.available_voices = self.voices_by_language.get(self.language_code, [])
         available_voice_mappings = self.available_voices
         available_voice_names = [x['voice_description'] for x in self.available_voices]
         self.voice_combobox.clear()
@@ -231,6 +236,7 @@ class VoiceSelectionDialog(aqt.qt.QDialog):
     def accept(self):
         for language_code, voice_mapping in self.voice_mapping_changes.items():
             self.languagetools.store_voice_selection(language_code, voice_mapping)
+        self.languagetools.flush_config()
         self.close()
 
 
@@ -12,6 +12,7 @@ if hasattr(sys, '_pytest_mode'):
     import deck_utils
     import gui_utils
     import errors
+    import batch_utils
     import dialog_languagemapping
     import dialog_voiceselection
     import dialog_apikey
@@ -23,6 +24,7 @@ else:
     from . import deck_utils
     from . import gui_utils
     from . import errors
+    from . import batch_utils
     from . import dialog_languagemapping
     from . import dialog_voiceselection
     from . import dialog_apikey
@@ -186,10 +188,10 @@ class AddAudioDialog(aqt.qt.QDialog):
         self.to_field = self.to_field_name_list[self.to_field_index]
 
     def accept(self):
+        notes_field_values = self.languagetools.anki_utils.get_notes_field_values(self.deck_note_type.model_id, self.note_id_list)
         to_fields_empty = True
-        for note_id in self.note_id_list:
-            note = aqt.mw.col.getNote(note_id)
-            if len(note[self.to_field]) > 0:
+        for field_values in notes_field_values.values():
+            if len(field_values.get(self.to_field, '')) > 0:
                 to_fields_empty = False
         if to_fields_empty == False:
             proceed = aqt.utils.askUser(f'Overwrite existing data in field {self.to_field} ?')
@@ -205,25 +207,61 @@ class AddAudioDialog(aqt.qt.QDialog):
 
         deck_note_type_field = self.languagetools.deck_utils.build_dntf_from_dnt(self.deck_note_type, self.to_field)
         self.languagetools.store_batch_audio_setting(deck_note_type_field, self.from_field)
+        self.languagetools.flush_config()
 
         self.success_count = 0
 
-        aqt.mw.taskman.run_in_background(self.add_audio_task, self.add_audio_task_done)
+        self.languagetools.anki_utils.run_in_background(self.add_audio_task, self.add_audio_task_done)
+
+    def set_progress_format(self, progress_format):
+        self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setFormat(progress_format))
 
     def add_audio_task(self):
         action_str = f'Add Audio to {self.to_field}'
-        undo_id = self.languagetools.anki_utils.undo_start(action_str)        
+        undo_id = self.languagetools.anki_utils.undo_start(action_str)
         self.generate_audio_errors = []
-        i = 0
+
+        # stage 1: load the source field of all the notes at once
+        self.set_progress_format('Loading notes...')
+        notes_field_values = self.languagetools.anki_utils.get_notes_field_values(self.deck_note_type.model_id, self.note_id_list)
+        audio_requests = []
         for note_id in self.note_id_list:
-            try:
-                result = self.languagetools.generate_audio_for_field(note_id, self.from_field, self.to_field, self.voice)
-                if result == True:
-                    self.success_count += 1
-            except errors.LanguageToolsRequestError as err:
-                self.generate_audio_errors.append(str(err))
-            i += 1
-            aqt.mw.taskman.run_on_main(lambda: self.progress_bar.setValue(i))
+            source_text = self.languagetools.text_utils.preprocess(notes_field_values.get(note_id, {}).get(self.from_field, ''))
+            if not source_text.empty:
+                audio_requests.append((note_id, source_text))
+        # notes with an empty source field are done already
+        progress_value = len(self.note_id_list) - len(audio_requests)
+
+        # stage 2: download the audio files concurrently
+        def download_audio(audio_request):
+            note_id, source_text = audio_request
+            return self.languagetools.get_tts_audio(source_text, self.voice['service'], self.voice['language_code'], self.voice['voice_key'], {})
+
+        # stage 3: this thread is the only writer, it adds the files to the collection
+        # as they come in, and saves the notes in chunks
+        self.set_progress_format('Generating audio: %v / %m')
+        pending_updates = {}
+        max_workers = self.languagetools.get_batch_max_workers()
+        for index, generated_filename, exception in batch_utils.run_concurrently(download_audio, audio_requests, max_workers):
+            if exception == None:
+                note_id = audio_requests[index][0]
+                result = self.languagetools.add_audio_file_to_collection(generated_filename)
+                pending_updates[note_id] = {self.to_field: result['sound_tag']}
+                self.success_count += 1
+            elif isinstance(exception, errors.LanguageToolsError):
+                self.generate_audio_errors.append(str(exception))
+            else:
+                logging.exception(exception)
+                self.generate_audio_errors.append(f'Unknown Error: {str(exception)}')
+            if len(pending_updates) >= constants.NOTE_UPDATE_CHUNK_SIZE:
+                self.languagetools.anki_utils.update_notes_fields(pending_updates)
+                pending_updates = {}
+            progress_value += 1
+            self.languagetools.anki_utils.run_on_main(lambda: self.progress_bar.setValue(progress_value))
+
+        self.set_progress_format('Saving notes...')
+        if len(pending_updates) > 0:
+            self.languagetools.anki_utils.update_notes_fields(pending_updates)
         self.languagetools.anki_utils.undo_end(undo_id)
 
     def add_audio_task_done(self, future_result):
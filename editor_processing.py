@@ -1,5 +1,6 @@
 import logging
 import sys
+import json
 
 if hasattr(sys, '_pytest_mode'):
     import constants
@@ -7,17 +8,16 @@ if hasattr(sys, '_pytest_mode'):
     import dialog_choosetranslation
     import dialog_breakdown
     import deck_utils
+    import text_utils
+    import gui_utils
 else:
     from . import constants
     from . import errors
     from . import dialog_choosetranslation
     from . import dialog_breakdown
     from . import deck_utils
-
-class FieldChangeTimer():
-    def __init__(self, delay_ms):
-        self.delay_ms = delay_ms
-        self.timer_obj = None
+    from . import text_utils
+    from . import gui_utils
 
 class FieldChange():
     def __init__(self, editor, deck_note_type, from_deck_note_type_field, note_id, field_value):
@@ -27,15 +27,31 @@ class FieldChange():
         self.note_id = note_id
         self.field_value = field_value
 
+# returned by background requests which got superseded before being sent
+REQUEST_SUPERSEDED = object()
+
+def is_request_superseded(future_result):
+    try:
+        return future_result.result() is REQUEST_SUPERSEDED
+    except Exception:
+        # the request failed, which gets reported when the result is applied
+        return False
+
 class EditorManager():
     def __init__(self, languagetools):
         self.languagetools = languagetools
         self.buffered_field_changes = {}
+        # (note_id, target dntf) -> generation of the latest request for that field.
+        # a request whose generation is no longer the latest is stale, it doesn't get sent, its result doesn't get applied
+        self.request_generations = {}
+        # request key -> list of (generation_key, generation, apply_fn) waiting on that request,
+        # identical requests from several fields share a single background task
+        self.pending_requests = {}
         self.apply_updates = languagetools.config.get(constants.CONFIG_APPLY_UPDATES_AUTOMATICALLY, True)
         self.update_field_change_timer(languagetools.get_live_update_delay())
 
     def update_field_change_timer(self, delay_ms):
-        self.field_change_timer = FieldChangeTimer(delay_ms)
+        self.field_change_timer = gui_utils.DelayTimer(delay_ms)
 
     def run_choose_translation(self, editor, field_name):
         with self.languagetools.error_manager.get_single_action_context(f'choosing translation'):
@@ -135,29 +151,28 @@ class EditorManager():
         editor = field_change.editor
         from_deck_note_type_field = field_change.from_deck_note_type_field
         note_id = field_change.note_id
-        field_value = field_change.field_value
 
-        # do we have translation rules for this deck_note_type
-        translation_settings = self.languagetools.get_batch_translation_settings(deck_note_type)
-        relevant_settings = {to_field:value for (to_field,value) in translation_settings.items() if value['from_field'] == from_deck_note_type_field.field_name}
-        for to_field, value in relevant_settings.items():
+        field_rules = self.languagetools.get_field_rules(from_deck_note_type_field)
+        if field_rules.is_empty():
+            return
+
+        # parsed once, shared by all the target fields
+        field_value = self.languagetools.text_utils.preprocess(field_change.field_value)
+
+        # translation rules with this field as source
+        for to_field, translation_option in field_rules.translation:
             with self.languagetools.error_manager.get_single_action_context(f'adding translation to field {to_field}'):
                 to_deck_note_type_field = self.languagetools.deck_utils.build_dntf_from_dnt(deck_note_type, to_field)
-                self.load_translation(editor, note_id, field_value, to_deck_note_type_field, value['translation_option'])
+                self.load_translation(editor, note_id, field_value, to_deck_note_type_field, translation_option)
 
-        # do we have transliteration rules for this deck_note_type
-        transliteration_settings = self.languagetools.get_batch_transliteration_settings(deck_note_type)
-        relevant_settings = {to_field:value for (to_field,value) in transliteration_settings.items() if value['from_field'] == from_deck_note_type_field.field_name}
-        for to_field, value in relevant_settings.items():
+        # transliteration rules with this field as source
+        for to_field, transliteration_option in field_rules.transliteration:
             with self.languagetools.error_manager.get_single_action_context(f'adding transliteration to field {to_field}'):
                 to_deck_note_type_field = self.languagetools.deck_utils.build_dntf_from_dnt(deck_note_type, to_field)
-                self.load_transliteration(editor, note_id, field_value, to_deck_note_type_field, value['transliteration_option'])
-
+                self.load_transliteration(editor, note_id, field_value, to_deck_note_type_field, transliteration_option)
 
-        # do we have any audio rules for this deck_note_type
-        audio_settings = self.languagetools.get_batch_audio_settings(deck_note_type)
-        relevant_settings = {to_field:from_field for (to_field,from_field) in audio_settings.items() if from_field == from_deck_note_type_field.field_name}
-        for to_field, from_field in relevant_settings.items():
+        # audio rules with this field as source
+        for to_field in field_rules.audio:
             with self.languagetools.error_manager.get_single_action_context(f'adding audio to field {to_field}'):
                 to_deck_note_type_field = self.languagetools.deck_utils.build_dntf_from_dnt(deck_note_type, to_field)
                 # get the from language
@@ -171,6 +186,17 @@ class EditorManager():
                         voice = voice_settings[from_language]
                         self.load_audio(editor, note_id, field_value, to_deck_note_type_field, voice)        
 
+    def next_request_generation(self, generation_key):
+        generation = self.request_generations.get(generation_key, 0) + 1
+        self.request_generations[generation_key] = generation
+        return generation
+
+    def is_request_current(self, generation_key, generation):
+        return self.request_generations.get(generation_key, None) == generation
+
+    def get_request_key(self, transformation_type, preprocessed_text, option):
+        return (transformation_type, preprocessed_text.get_hash(), json.dumps(option, sort_keys=True))
+
     def set_live_updates(self, enabled):
         self.apply_updates = enabled
         logging.info(f'live updates enabled: {self.apply_updates}')
@@ -267,12 +293,18 @@ class EditorManager():
 
 
     # generic function to load a transformation asynchronously (translation / transliteration / audio)
-    def load_transformation(self, editor, original_note_id, field_value: str, to_deck_note_type_field: deck_utils.DeckNoteTypeField, 
-        request_transformation_fn, interpret_response_fn, transformation_type):
+    def load_transformation(self, editor, original_note_id, preprocessed_text: text_utils.PreprocessedText, to_deck_note_type_field: deck_utils.DeckNoteTypeField, 
+        request_transformation_fn, interpret_response_fn, transformation_type, request_key):
         # field_index = self.languagetools.deck_utils.get_field_id(to_deck_note_type_field)
 
+        # any request still in flight for this field is now stale
+        generation_key = (original_note_id, to_deck_note_type_field)
+        generation = self.next_request_generation(generation_key)
+
         # is the source field empty ?
-        if self.languagetools.text_utils.is_empty(field_value):
+        if preprocessed_text.empty:
+            # a request still in flight for this field is now stale, and won't hide the loading indicator
+            self.languagetools.anki_utils.hide_loading_indicator_field(editor, to_deck_note_type_field.field_name)
             self.languagetools.anki_utils.editor_note_set_field_value(editor, to_deck_note_type_field.field_name, '')
             return
 
@@ -298,12 +330,40 @@ class EditorManager():
 
         # self.languagetools.anki_utils.show_loading_indicator(editor, field_index)
         self.languagetools.anki_utils.show_loading_indicator_field(editor, to_deck_note_type_field.field_name)
-        
-        self.languagetools.anki_utils.run_in_background(request_transformation_fn, 
-            get_apply_transformation_lambda(self.languagetools, editor, original_note_id, field_value, interpret_response_fn, transformation_type, to_deck_note_type_field))
-
 
-    def load_translation(self, editor, original_note_id, field_value: str, to_deck_note_type_field: deck_utils.DeckNoteTypeField, translation_option):
+        waiter = (generation_key, generation, get_apply_transformation_lambda(self.languagetools, editor, original_note_id, preprocessed_text, interpret_response_fn, transformation_type, to_deck_note_type_field))
+        if request_key in self.pending_requests:
+            # the same request is already in flight for another field, share its result
+            logging.debug(f'coalescing {transformation_type.name.lower()} request for field {to_deck_note_type_field}')
+            self.pending_requests[request_key].append(waiter)
+            return
+        self.pending_requests[request_key] = [waiter]
+
+        def request_if_current():
+            waiters = list(self.pending_requests.get(request_key, []))
+            if not any([self.is_request_current(x[0], x[1]) for x in waiters]):
+                logging.debug(f'dropping superseded {transformation_type.name.lower()} request')
+                return REQUEST_SUPERSEDED
+            return request_transformation_fn()
+
+        def request_done(future_result):
+            # waiters whose field got a newer request since are dropped, that request is on its way
+            current_waiters = [x for x in self.pending_requests.pop(request_key, []) if self.is_request_current(x[0], x[1])]
+            if len(current_waiters) == 0:
+                return
+            if is_request_superseded(future_result):
+                # the request got dropped, but a field asked for it again in the meantime. send it after all
+                self.pending_requests[request_key] = current_waiters
+                self.languagetools.anki_utils.run_in_background(request_if_current, request_done)
+                return
+            for waiter_generation_key, waiter_generation, apply_transformation in current_waiters:
+                apply_transformation(future_result)
+
+        self.languagetools.anki_utils.run_in_background(request_if_current, request_done)
+
+
+    def load_translation(self, editor, original_note_id, field_value, to_deck_note_type_field: deck_utils.DeckNoteTypeField, translation_option):
+        preprocessed_text = self.languagetools.text_utils.preprocess(field_value)
         def get_request_translation_lambda(languagetools, field_value, translation_option):
             def request_translation():
                 logging.info('request_translation')
@@ -313,13 +373,15 @@ class EditorManager():
 
         self.load_transformation(editor, 
                                  original_note_id, 
-                                 field_value, 
+                                 preprocessed_text, 
                                  to_deck_note_type_field, 
-                                 get_request_translation_lambda(self.languagetools, field_value, translation_option), interpret_response_fn,
-                                 constants.TransformationType.Translation)
+                                 get_request_translation_lambda(self.languagetools, preprocessed_text, translation_option), interpret_response_fn,
+                                 constants.TransformationType.Translation,
+                                 self.get_request_key(constants.TransformationType.Translation, preprocessed_text, translation_option))
 
 
-    def load_transliteration(self, editor, original_note_id, field_value: str, to_deck_note_type_field: deck_utils.DeckNoteTypeField, transliteration_option):
+    def load_transliteration(self, editor, original_note_id, field_value, to_deck_note_type_field: deck_utils.DeckNoteTypeField, transliteration_option):
+        preprocessed_text = self.languagetools.text_utils.preprocess(field_value)
         def get_request_transliteration_lambda(languagetools, field_value, transliteration_option):
             def request_transliteration():
                 return languagetools.get_transliteration_async(field_value, transliteration_option)
@@ -328,14 +390,16 @@ class EditorManager():
 
         self.load_transformation(editor, 
                                  original_note_id, 
-                                 field_value, 
+                                 preprocessed_text, 
                                  to_deck_note_type_field, 
-                                 get_request_transliteration_lambda(self.languagetools, field_value, transliteration_option), interpret_response_fn,
-                                 constants.TransformationType.Transliteration)
+                                 get_request_transliteration_lambda(self.languagetools, preprocessed_text, transliteration_option), interpret_response_fn,
+                                 constants.TransformationType.Transliteration,
+                                 self.get_request_key(constants.TransformationType.Transliteration, preprocessed_text, transliteration_option))
 
 
-    def load_audio(self, editor, original_note_id, field_value: str, to_deck_note_type_field: deck_utils.DeckNoteTypeField, voice):
+    def load_audio(self, editor, original_note_id, field_value, to_deck_note_type_field: deck_utils.DeckNoteTypeField, voice):
         logging.debug('load_audio')
+        preprocessed_text = self.languagetools.text_utils.preprocess(field_value)
         def get_request_audio_lambda(languagetools, field_value, voice):
             def request_audio():
                 try:
@@ -359,10 +423,11 @@ class EditorManager():
 
         self.load_transformation(editor, 
                                  original_note_id, 
-                                 field_value, 
+                                 preprocessed_text, 
                                  to_deck_note_type_field, 
-                                 get_request_audio_lambda(self.languagetools, field_value, voice), interpret_response_fn,
-                                 constants.TransformationType.Audio)
+                                 get_request_audio_lambda(self.languagetools, preprocessed_text, voice), interpret_response_fn,
+                                 constants.TransformationType.Audio,
+                                 self.get_request_key(constants.TransformationType.Audio, preprocessed_text, voice))
 
     def get_play_tag_audio_lambda(self, editor, field_name):
         def play_audio():
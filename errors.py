@@ -45,12 +45,23 @@ class NoVoiceSetError(LanguageToolsError):
         message = f'No voice set for {language_name}. {constants.DOCUMENTATION_VOICE_SELECTION}'
         super().__init__(message)
 
+class TextReplacementValidationError(LanguageToolsError):
+    def __init__(self, pattern, error):
+        message = f'Invalid text replacement <b>{pattern}</b>: {error}'
+        super().__init__(message)
+
 class LanguageToolsRequestError(LanguageToolsError):
     pass
 
 class AudioLanguageToolsRequestError(LanguageToolsRequestError):
     pass
 
+# the server doesn't provide a batch version of this endpoint, caller should fall back to single requests
+class BatchEndpointNotSupportedError(LanguageToolsRequestError):
+    def __init__(self, endpoint):
+        message = f'Batch endpoint not supported: {endpoint}'
+        super().__init__(message)
+
 class VoiceListRequestError(LanguageToolsRequestError):
     pass
 
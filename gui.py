@@ -5,6 +5,7 @@ import aqt.qt
 # anki imports
 import aqt.qt
 import aqt.editor
+import aqt.reviewer
 import aqt.gui_hooks
 import aqt.sound
 import anki.sound
@@ -129,6 +130,7 @@ def init(languagetools):
     # aqt.gui_hooks.editor_will_show_context_menu.append(on_context_menu)
 
     def collectionDidLoad(col: anki.collection.Collection):
+        languagetools.deck_utils.invalidate_cache()
         languagetools.setCollectionLoaded()
 
     def mainWindowInit():
@@ -137,10 +139,35 @@ def init(languagetools):
     def deckBrowserDidRender(deck_browser: aqt.deckbrowser.DeckBrowser):
         languagetools.setDeckBrowserRendered()
 
+    def profileWillClose():
+        languagetools.close_user_files()
+
+    def operationDidExecute(changes, handler):
+        # deck / note type renamed, added, removed, or fields changed
+        if changes.deck or changes.notetype:
+            languagetools.deck_utils.invalidate_cache()
+        # cards moved to another deck. added and removed notes are handled by their own hooks, reviews don't matter
+        elif changes.card and not changes.note_text and not isinstance(handler, aqt.reviewer.Reviewer):
+            languagetools.deck_utils.invalidate_populated_index()
+
+    def noteWillBeAdded(col: anki.collection.Collection, note: anki.notes.Note, deck_id):
+        languagetools.deck_utils.note_added(deck_id, note.mid)
+
+    def notesWillBeDeleted(col: anki.collection.Collection, note_ids):
+        languagetools.deck_utils.notes_removed()
+
+    def syncDidFinish():
+        languagetools.deck_utils.invalidate_cache()
+
     # run some stuff after anki has initialized
     aqt.gui_hooks.collection_did_load.append(collectionDidLoad)
     aqt.gui_hooks.main_window_did_init.append(mainWindowInit)
     aqt.gui_hooks.deck_browser_did_render.append(deckBrowserDidRender)
+    aqt.gui_hooks.profile_will_close.append(profileWillClose)
+    aqt.gui_hooks.operation_did_execute.append(operationDidExecute)
+    aqt.gui_hooks.sync_did_finish.append(syncDidFinish)
+    anki.hooks.note_will_be_added.append(noteWillBeAdded)
+    anki.hooks.notes_will_be_deleted.append(notesWillBeDeleted)
 
     def browerMenusInit(browser: aqt.browser.Browser):
         menu = aqt.qt.QMenu(constants.ADDON_NAME, browser.form.menubar)
@@ -1,5 +1,11 @@
 import aqt.qt
 
+class DelayTimer():
+    # holds the QTimer started by anki_utils.call_on_timer_expire, restarting it pushes back the task
+    def __init__(self, delay_ms):
+        self.delay_ms = delay_ms
+        self.timer_obj = None
+
 def get_header_label(text):
         header = aqt.qt.QLabel()
         header.setText(text)
@@ -0,0 +1,154 @@
+import bisect
+import unicodedata
+
+# local, dependency-free language classification of field samples.
+# fields written in a script used by a single language (Hangul, kana, Thai...) or which
+# contain no letters at all don't need a cloud detection request. anything ambiguous
+# (latin, han only, devanagari...) is left to the API.
+
+# (first codepoint, last codepoint, script)
+SCRIPT_RANGES = sorted([
+    (0x0041, 0x005A, 'latin'),
+    (0x0061, 0x007A, 'latin'),
+    (0x00C0, 0x024F, 'latin'),
+    (0x1E00, 0x1EFF, 'latin'),
+    (0x0370, 0x03FF, 'greek'),
+    (0x1F00, 0x1FFF, 'greek'),
+    (0x0400, 0x052F, 'cyrillic'),
+    (0x0530, 0x058F, 'armenian'),
+    (0x0590, 0x05FF, 'hebrew'),
+    (0x0600, 0x06FF, 'arabic'),
+    (0x0750, 0x077F, 'arabic'),
+    (0xFB50, 0xFDFF, 'arabic'),
+    (0xFE70, 0xFEFF, 'arabic'),
+    (0x0900, 0x097F, 'devanagari'),
+    (0x0E00, 0x0E7F, 'thai'),
+    (0x10A0, 0x10FF, 'georgian'),
+    (0x1100, 0x11FF, 'hangul'),
+    (0x3130, 0x318F, 'hangul'),
+    (0xAC00, 0xD7AF, 'hangul'),
+    (0x3040, 0x309F, 'hiragana'),
+    (0x30A0, 0x30FF, 'katakana'),
+    (0x31F0, 0x31FF, 'katakana'),
+    (0xFF66, 0xFF9D, 'katakana'),
+    (0x3400, 0x4DBF, 'han'),
+    (0x4E00, 0x9FFF, 'han'),
+    (0xF900, 0xFAFF, 'han'),
+])
+SCRIPT_RANGE_STARTS = [x[0] for x in SCRIPT_RANGES]
+
+# scripts written by a single language (as far as flashcards go)
+SINGLE_LANGUAGE_SCRIPTS = {
+    'hangul': 'ko',
+    'thai': 'th',
+    'greek': 'el',
+    'hebrew': 'he',
+    'georgian': 'ka',
+    'armenian': 'hy'
+}
+
+# letters and bigrams which identify one language among those sharing a script
+SCRIPT_NGRAM_MODELS = {
+    'cyrillic': {
+        'ru': ['ы', 'э', 'ё'],
+        'uk': ['і', 'ї', 'є', 'ґ'],
+        # џ, љ, њ and ј are macedonian letters too
+        'sr': ['ђ', 'ћ'],
+        'bg': ['ът', 'ъл', 'ъп', 'ък', 'ъд']
+    },
+    'arabic': {
+        'ar': ['ة', 'ى', 'ال'],
+        'fa': ['پ', 'چ', 'ژ', 'گ', 'ک', 'ی'],
+        'ur': ['ٹ', 'ڈ', 'ڑ', 'ں', 'ے']
+    }
+}
+
+# letters of other languages written in the same script, which share the markers above
+# (ы, э and ё occur in kyrgyz and mongolian, ی and پ in pashto...). any of them in the sample
+# means the language may not be in the model at all, and the sample goes to the API.
+SCRIPT_COUNTER_MARKERS = {
+    'cyrillic': [
+        # kazakh, kyrgyz, mongolian, tatar, bashkir, tajik, uzbek
+        'ң', 'ө', 'ү', 'қ', 'ғ', 'ұ', 'ә', 'һ', 'җ', 'ҡ', 'ҙ', 'ҫ', 'ӣ', 'ӯ', 'ҳ', 'ҷ', 'ў',
+        # macedonian. not ј, serbian uses it as well
+        'ѓ', 'ќ', 'ѕ'
+    ],
+    'arabic': [
+        # pashto
+        'ښ', 'ډ', 'ټ', 'ځ', 'څ', 'ږ', 'ګ', 'ڼ', 'ۍ',
+        # kurdish, uyghur
+        'ۆ', 'ێ', 'ڵ', 'ڕ', 'ۇ', 'ۈ', 'ۋ', 'ې'
+    ]
+}
+
+# share of the letters which must be in the dominant script
+MIN_SCRIPT_SHARE = 0.9
+# share of the letters which must be kana for japanese
+MIN_KANA_SHARE = 0.1
+# below this many letters, the sample doesn't tell us much
+MIN_LETTER_COUNT = 20
+# n-gram model: matches needed for the best language, and how far ahead of the second best it must be
+MIN_NGRAM_MATCHES = 3
+MIN_NGRAM_RATIO = 5
+
+
+def get_script(char):
+    codepoint = ord(char)
+    index = bisect.bisect_right(SCRIPT_RANGE_STARTS, codepoint) - 1
+    if index >= 0:
+        start, end, script = SCRIPT_RANGES[index]
+        if codepoint <= end:
+            return script
+    if unicodedata.category(char).startswith('L'):
+        return 'other'
+    # digits, punctuation, whitespace, symbols
+    return None
+
+def get_script_histogram(field_sample):
+    histogram = {}
+    for text in field_sample:
+        for char in text:
+            script = get_script(char)
+            if script != None:
+                histogram[script] = histogram.get(script, 0) + 1
+    return histogram
+
+def classify_ngrams(field_sample, model):
+    text = ' '.join(field_sample).lower()
+    scores = {language: sum([text.count(ngram) for ngram in ngrams]) for language, ngrams in model.items()}
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    best_language, best_score = ranked[0]
+    second_score = ranked[1][1] if len(ranked) > 1 else 0
+    if best_score >= MIN_NGRAM_MATCHES and best_score >= second_score * MIN_NGRAM_RATIO:
+        return best_language
+    return None
+
+def classify(field_sample):
+    """returns (confident, language). confident is False when the sample should go to the API.
+    a confident result with language None means the field contains no letters (numbers, punctuation)"""
+    histogram = get_script_histogram(field_sample)
+    letter_count = sum(histogram.values())
+    if letter_count == 0:
+        has_content = any([len(text.strip()) > 0 for text in field_sample])
+        return has_content, None
+    if letter_count < MIN_LETTER_COUNT:
+        return False, None
+
+    kana_count = histogram.get('hiragana', 0) + histogram.get('katakana', 0)
+    if kana_count >= letter_count * MIN_KANA_SHARE and kana_count + histogram.get('han', 0) >= letter_count * MIN_SCRIPT_SHARE:
+        return True, 'ja'
+
+    script, script_count = max(histogram.items(), key=lambda x: x[1])
+    if script_count < letter_count * MIN_SCRIPT_SHARE:
+        # mixed scripts
+        return False, None
+    if script in SINGLE_LANGUAGE_SCRIPTS:
+        return True, SINGLE_LANGUAGE_SCRIPTS[script]
+    if script in SCRIPT_NGRAM_MODELS:
+        text = ''.join(field_sample).lower()
+        if any([marker in text for marker in SCRIPT_COUNTER_MARKERS.get(script, [])]):
+            return False, None
+        language = classify_ngrams(field_sample, SCRIPT_NGRAM_MODELS[script])
+        if language != None:
+            return True, language
+    return False, None
@@ -1,7 +1,6 @@
 # python imports
 import sys
 import os
-import glob
 import re
 import random
 import requests
@@ -10,6 +9,7 @@ import tempfile
 import logging
 from typing import List, Dict
 import hashlib
+import concurrent.futures
 import anki.utils
 
 # anki imports
@@ -25,12 +25,31 @@ if hasattr(sys, '_pytest_mode'):
     import errors
     import deck_utils
     import text_utils
+    import translation_cache
+    import batch_utils
+    import audio_store
+    import async_client
+    import config_index
+    import language_classifier
+    import detection_ledger
+    import gui_utils
 else:
     from . import constants
     from . import version
     from . import errors
     from . import deck_utils
     from . import text_utils
+    from . import translation_cache
+    from . import batch_utils
+    from . import audio_store
+    from . import async_client
+    from . import config_index
+    from . import language_classifier
+    from . import detection_ledger
+    from . import gui_utils
+
+
+STRIP_IMAGES_RE = re.compile("(?i)<img[^>]+src=[\"']?([^\"'>]+)[\"']?[^>]*>")
 
 
 class LanguageTools():
@@ -41,8 +60,23 @@ class LanguageTools():
         self.cloud_language_tools = cloud_language_tools
         self.error_manager = errors.ErrorManager(self.anki_utils)
         self.config = self.anki_utils.get_config()
+        # config changes are written out in the background, see save_config
+        self.config_dirty = False
+        self.config_write_timer = gui_utils.DelayTimer(constants.CONFIG_WRITE_DELAY_MS)
         self.text_utils = text_utils.TextUtils(self.anki_utils, self.get_text_processing_settings())
         self.error_manager = errors.ErrorManager(self.anki_utils)
+        self.cloud_language_tools.set_max_connections(self.get_batch_max_workers())
+        self.async_cloud_language_tools = async_client.AsyncCloudLanguageTools(self.cloud_language_tools, self.get_batch_max_workers())
+        self.translation_cache = translation_cache.TranslationCache(
+            os.path.join(self.get_user_files_dir(), constants.TRANSLATION_CACHE_FILENAME),
+            self.config.get(constants.CONFIG_TRANSLATION_CACHE_MAX_ENTRIES, constants.DEFAULT_TRANSLATION_CACHE_MAX_ENTRIES),
+            self.config.get(constants.CONFIG_TRANSLATION_CACHE_MAX_AGE_DAYS, constants.DEFAULT_TRANSLATION_CACHE_MAX_AGE_DAYS))
+        self.audio_store = audio_store.AudioStore(self.get_user_files_dir(),
+            self.config.get(constants.CONFIG_AUDIO_STORE_MAX_MB, constants.DEFAULT_AUDIO_STORE_MAX_MB) * 1024 * 1024)
+        self.detection_ledger = detection_ledger.DetectionLedger(self.get_user_files_dir(),
+            constants.LANGUAGE_DETECTION_MAX_DRIFT, constants.LANGUAGE_DETECTION_MAX_NGRAM_DRIFT)
+
+        self.config_index = None
 
         self.initialization_error = False
         self.language_data = None
@@ -85,12 +119,24 @@ class LanguageTools():
         if self.initialization_error:
             self.anki_utils.critical_message('Could not verify API key or load language data from server, please try to restart Anki.', aqt.mw)
 
+    def save_config(self):
+        """mark the config as changed. it gets written once things have been quiet for a moment,
+        so that a burst of changes (language mapping for many fields for example) results in a single write.
+        call flush_config when the write needs to happen now"""
+        self.config_dirty = True
+        self.anki_utils.run_on_main(lambda: self.anki_utils.call_on_timer_expire(self.config_write_timer, self.flush_config))
+
+    def flush_config(self):
+        if self.config_dirty:
+            self.config_dirty = False
+            self.anki_utils.write_config(self.config)
+
     def get_config_api_key(self):
         return self.config['api_key']
 
     def set_config_api_key(self, api_key):
         self.config['api_key'] = api_key
-        self.anki_utils.write_config(self.config)
+        self.save_config()
 
     def verify_api_key(self, api_key):
         result = self.cloud_language_tools.api_key_validate_query(api_key)
@@ -112,13 +158,85 @@ class LanguageTools():
     def load_language_data(self):
         if self.language_data == None:
             if self.cloud_language_tools.api_key_set():
-                # get language data
-                self.language_data = self.cloud_language_tools.get_language_data()
-                self.language_list = self.language_data['language_list']
-                self.translation_language_list = self.language_data['translation_options']
-                self.transliteration_language_list = self.language_data['transliteration_options']
-                self.voice_list = self.language_data['voice_list']
-                self.tokenization_options = self.language_data['tokenization_options']
+                cached_entry = self.load_language_data_cache()
+                if cached_entry != None:
+                    # serve the copy from disk right away, check for a newer version in the background
+                    self.apply_language_data(cached_entry['language_data'])
+                    # (scheduled from the main thread, we may be running in the background already)
+                    self.anki_utils.run_on_main(lambda: self.anki_utils.run_in_background(
+                        lambda: self.revalidate_language_data(cached_entry['etag']), self.revalidate_language_data_done))
+                else:
+                    self.revalidate_language_data(None)
+
+    def apply_language_data(self, language_data):
+        self.language_list = language_data['language_list']
+        self.translation_language_list = language_data['translation_options']
+        self.transliteration_language_list = language_data['transliteration_options']
+        self.voice_list = language_data['voice_list']
+        self.tokenization_options = language_data['tokenization_options']
+        self.build_language_data_index()
+        self.language_data = language_data
+
+    def index_by_key(self, option_list, key_fn):
+        index = {}
+        for option in option_list:
+            index.setdefault(key_fn(option), []).append(option)
+        return index
+
+    def build_language_data_index(self):
+        # option lookups happen on every combobox change, index the lists once
+        self.translation_options_by_language = self.index_by_key(self.translation_language_list, lambda x: x['language_code'])
+        self.translation_options_by_service_language = self.index_by_key(self.translation_language_list, lambda x: (x['service'], x['language_code']))
+        self.transliteration_options_by_language = self.index_by_key(self.transliteration_language_list, lambda x: x['language_code'])
+        self.tokenization_options_by_language = self.index_by_key(self.tokenization_options, lambda x: x['language_code'])
+        # (source_language, target_language) -> translation options, filled in as pairs get requested
+        self.translation_options_by_language_pair = {}
+
+    def revalidate_language_data(self, etag):
+        result = self.cloud_language_tools.get_language_data_conditional(etag)
+        if result == None:
+            logging.info('language data not modified')
+            return
+        language_data, etag = result
+        self.apply_language_data(language_data)
+        self.save_language_data_cache(language_data, etag)
+
+    def revalidate_language_data_done(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            # keep using the cached copy
+            logging.warning(f'could not revalidate language data: {e}')
+
+    def get_language_data_cache_path(self):
+        return os.path.join(self.get_user_files_dir(), constants.LANGUAGE_DATA_CACHE_FILENAME)
+
+    def load_language_data_cache(self):
+        try:
+            with open(self.get_language_data_cache_path(), 'r', encoding='utf-8') as f:
+                cached_entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError):
+            logging.exception('could not load language data cache')
+            return None
+        # the two APIs don't return the same language data
+        if cached_entry.get('base_url', None) != self.cloud_language_tools.get_base_url():
+            return None
+        return cached_entry
+
+    def save_language_data_cache(self, language_data, etag):
+        cached_entry = {
+            'base_url': self.cloud_language_tools.get_base_url(),
+            'etag': etag,
+            'language_data': language_data
+        }
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=self.get_user_files_dir(), suffix='.tmp', delete=False, encoding='utf-8') as f:
+                json.dump(cached_entry, f)
+            os.replace(f.name, self.get_language_data_cache_path())
+        except OSError:
+            logging.exception('could not save language data cache')
 
     def language_detection_done(self):
         return len(self.config[constants.CONFIG_DECK_LANGUAGES]) > 0
@@ -186,18 +304,10 @@ class LanguageTools():
         }        
 
     def get_populated_dntf(self) -> List[deck_utils.DeckNoteTypeField]:
-        populated_set = self.anki_utils.get_deckid_modelid_pairs()
-        
         result: List[deck_utils.DeckNoteTypeField] = []
 
-        for entry in populated_set:
-            deck_id = entry[0]
-            model_id = entry[1]
-            deck_note_type = self.deck_utils.build_deck_note_type(deck_id, model_id)
-            model = self.anki_utils.get_model(model_id)
-            fields = model['flds']
-            for field in fields:
-                field_name = field['name']
+        for deck_note_type in self.deck_utils.get_populated_deck_note_types():
+            for field_name in self.deck_utils.get_field_names(deck_note_type):
                 deck_note_type_field = self.deck_utils.build_dntf_from_dnt(deck_note_type, field_name)
                 result.append(deck_note_type_field)
 
@@ -214,30 +324,19 @@ class LanguageTools():
             deck_map[deck_name].add_deck_note_type_field(deck_note_type_field)
         return deck_map
             
-    def get_noteids_for_deck_note_type(self, deck_note_type: deck_utils.DeckNoteType, sample_size):
-        deck_id = deck_note_type.deck_id
-        model_id = deck_note_type.model_id
-        return self.anki_utils.get_noteids_for_deck_note_type(deck_id, model_id, sample_size)
-
     def get_field_samples(self, deck_note_type_field: deck_utils.DeckNoteTypeField, sample_size: int) -> List[str]:
-        note_ids = self.get_noteids_for_deck_note_type(deck_note_type_field.deck_note_type, sample_size)
+        deck_note_type = deck_note_type_field.deck_note_type
+        field_values = self.anki_utils.get_field_sample_values(deck_note_type.deck_id, deck_note_type.model_id, deck_note_type_field.field_name, sample_size)
 
-        stripImagesRe = re.compile("(?i)<img[^>]+src=[\"']?([^\"'>]+)[\"']?[^>]*>")
-        
-        def process_field_value(note_id, field_name):
-            note = self.anki_utils.get_note_by_id(note_id)
-            if field_name not in note:
-                # field was removed
-                raise errors.AnkiItemNotFoundError(f'field {field_name} not found')
-            original_field_value = note[field_name]
-            field_value = stripImagesRe.sub('', original_field_value)
+        def process_field_value(original_field_value):
+            field_value = STRIP_IMAGES_RE.sub('', original_field_value)
             field_value = self.anki_utils.html_to_text_line(field_value)
             max_len = 200 # restrict to 200 characters
             if len(original_field_value) > max_len:
                 field_value = original_field_value[:max_len]
             return field_value
 
-        all_field_values = [process_field_value(x, deck_note_type_field.field_name) for x in note_ids]
+        all_field_values = [process_field_value(x) for x in field_values]
         non_empty_fields = [x for x in all_field_values if len(x) > 0]
 
         if len(non_empty_fields) < sample_size:
@@ -248,20 +347,14 @@ class LanguageTools():
         return field_sample
 
     def get_field_samples_for_language(self, language_code, sample_size):
-        # self.config[constants.CONFIG_DECK_LANGUAGES][model_name][deck_name][field_name] = language
-
         dntf_list = []
-        for model_name, model_data in self.config[constants.CONFIG_DECK_LANGUAGES].items():
-            for deck_name, deck_data in model_data.items():
-                for field_name, field_language_code in deck_data.items():
-                    if field_language_code == language_code:
-                        try:
-                            # found the language we need
-                            deck_note_type_field = self.deck_utils.build_deck_note_type_field_from_names(deck_name, model_name, field_name)
-                            dntf_list.append(deck_note_type_field)
-                        except errors.AnkiItemNotFoundError as error:
-                            # this deck probably got deleted
-                            pass
+        for field_key in self.get_config_index().get_fields_for_language(language_code):
+            try:
+                deck_note_type_field = self.deck_utils.build_deck_note_type_field_from_names(field_key.deck_name, field_key.model_name, field_key.field_name)
+                dntf_list.append(deck_note_type_field)
+            except errors.AnkiItemNotFoundError as error:
+                # this deck probably got deleted
+                pass
 
         all_field_samples = []
         for dntf in dntf_list:
@@ -282,14 +375,135 @@ class LanguageTools():
 
 
     def perform_language_detection_deck_note_type_field(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
-        # get a random sample of data within this field
-
-        sample_size = 100 # max supported by azure
-        field_sample = self.get_field_samples(deck_note_type_field, sample_size)
-        if len(field_sample) == 0:
-            return None
+        for index, language, exception in self.perform_language_detection_batch([deck_note_type_field], lambda: False):
+            if exception != None:
+                raise exception
+            return language
 
-        return self.cloud_language_tools.language_detection(field_sample)
+    def classify_field_sample_locally(self, field_sample):
+        """returns (confident, language), confident is True if the sample doesn't need to go to the API"""
+        if self.language_data == None:
+            # without the server's language list, there's no telling whether it knows the language, let it decide
+            return False, None
+        confident, language = language_classifier.classify(field_sample)
+        if confident and language != None and language not in self.language_list:
+            # not a language the server knows about, let it decide
+            return False, None
+        return confident, language
+
+    def perform_language_detection_batch(self, dntf_list: List[deck_utils.DeckNoteTypeField], interrupted_fn, incremental=False):
+        """detect the language of many fields. fields get sampled one after the other on this thread,
+        samples which language_classifier recognizes with confidence are done right away,
+        the others are packed into batch detection requests which run concurrently while sampling continues.
+        batches which fail, and all fields if the batch endpoint isn't available, fall back to one request per field.
+        yields (index, language, exception) tuples in completion order, language is None if the field has no data.
+        stops as soon as interrupted_fn() returns True.
+        incremental: fields whose language was detected before, and whose note count and content haven't drifted
+        since according to detection_ledger, keep their current language. fields always get sampled, notes can be edited in place."""
+        # future -> (list of (index, field_sample), whether this is a batch request)
+        future_to_chunk = {}
+        # index -> (field_key, note_count, fingerprint), to record in the ledger once detected
+        ledger_entries = {}
+        if incremental:
+            note_counts = self.anki_utils.get_deckid_modelid_note_counts()
+
+        def record_detection(index, language):
+            if index in ledger_entries:
+                field_key, note_count, fingerprint = ledger_entries.pop(index)
+                self.detection_ledger.record(field_key, note_count, fingerprint, language)
+
+        def submit_single(item):
+            future = self.async_cloud_language_tools.submit(self.async_cloud_language_tools.language_detection(item[1]))
+            future_to_chunk[future] = ([item], False)
+
+        def submit_chunk(chunk):
+            if len(chunk) > 1 and self.cloud_language_tools.language_detection_batch_supported:
+                future = self.async_cloud_language_tools.submit(self.async_cloud_language_tools.language_detection_batch([field_sample for index, field_sample in chunk]))
+                future_to_chunk[future] = (chunk, True)
+            else:
+                for item in chunk:
+                    submit_single(item)
+
+        def get_outcomes(future):
+            chunk, batched = future_to_chunk.pop(future)
+            exception = future.exception()
+            if exception == None:
+                language_list = future.result() if batched else [future.result()]
+                outcomes = [(index, language, None) for (index, field_sample), language in zip(chunk, language_list)]
+                for index, language, exception in outcomes:
+                    record_detection(index, language)
+                return outcomes
+            if batched:
+                if not isinstance(exception, errors.BatchEndpointNotSupportedError):
+                    logging.warning(f'batch language detection request failed, retrying fields one by one: {exception}')
+                for item in chunk:
+                    submit_single(item)
+                return []
+            return [(chunk[0][0], None, exception)]
+
+        def field_sample_size(field_sample):
+            return sum([len(text.encode('utf-8')) for text in field_sample])
+
+        chunk = []
+        chunk_bytes = 0
+        try:
+            for index, dntf in enumerate(dntf_list):
+                if interrupted_fn():
+                    return
+                if incremental:
+                    field_key = self.get_field_key(dntf)
+                    current_language = self.get_language(dntf)
+                    note_count = note_counts.get((dntf.deck_note_type.deck_id, dntf.deck_note_type.model_id), 0)
+                    ledger_entry = self.detection_ledger.get_entry(field_key)
+                    if ledger_entry != None and ledger_entry['language'] != current_language:
+                        # the language was changed, or the detection result never saved
+                        ledger_entry = None
+                try:
+                    field_sample = self.get_field_samples(dntf, constants.LANGUAGE_DETECTION_SAMPLE_SIZE)
+                except Exception as e:
+                    yield index, None, e
+                    continue
+                if incremental:
+                    fingerprint = detection_ledger.get_fingerprint(field_sample)
+                    if ledger_entry != None and self.detection_ledger.is_current(ledger_entry, note_count, fingerprint):
+                        yield index, current_language, None
+                        continue
+                    ledger_entries[index] = (field_key, note_count, fingerprint)
+                if len(field_sample) == 0:
+                    record_detection(index, None)
+                    yield index, None, None
+                    continue
+                confident, language = self.classify_field_sample_locally(field_sample)
+                if confident:
+                    record_detection(index, language)
+                    yield index, language, None
+                    continue
+                sample_bytes = field_sample_size(field_sample)
+                if len(chunk) > 0 and chunk_bytes + sample_bytes > constants.LANGUAGE_DETECTION_BATCH_MAX_BYTES:
+                    submit_chunk(chunk)
+                    chunk, chunk_bytes = [], 0
+                chunk.append((index, field_sample))
+                chunk_bytes += sample_bytes
+                if len(chunk) >= constants.LANGUAGE_DETECTION_BATCH_SIZE:
+                    submit_chunk(chunk)
+                    chunk, chunk_bytes = [], 0
+                # hand back the detections which completed while we were sampling
+                for done_future in [x for x in future_to_chunk.keys() if x.done()]:
+                    yield from get_outcomes(done_future)
+            if len(chunk) > 0:
+                submit_chunk(chunk)
+
+            while len(future_to_chunk) > 0:
+                done_futures, not_done_futures = concurrent.futures.wait(list(future_to_chunk.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+                for done_future in done_futures:
+                    if interrupted_fn():
+                        return
+                    yield from get_outcomes(done_future)
+        finally:
+            for future in future_to_chunk.keys():
+                future.cancel()
+            if incremental:
+                self.detection_ledger.flush()
 
 
     def guess_language(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
@@ -302,6 +516,7 @@ class LanguageTools():
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name
+        index = self.get_config_index()
 
         if constants.CONFIG_DECK_LANGUAGES not in self.config:
             self.config[constants.CONFIG_DECK_LANGUAGES] = {}
@@ -310,6 +525,7 @@ class LanguageTools():
         if deck_name not in self.config[constants.CONFIG_DECK_LANGUAGES][model_name]:
             self.config[constants.CONFIG_DECK_LANGUAGES][model_name][deck_name] = {}
         self.config[constants.CONFIG_DECK_LANGUAGES][model_name][deck_name][field_name] = language
+        index.set_language(self.get_field_key(deck_note_type_field), language)
 
         # store the languages we're interested in
         if self.language_available_for_translation(language):
@@ -317,12 +533,14 @@ class LanguageTools():
                 self.config[constants.CONFIG_WANTED_LANGUAGES] = {}
             self.config[constants.CONFIG_WANTED_LANGUAGES][language] = True
 
-        self.anki_utils.write_config(self.config)
+        self.save_config()
 
     def store_batch_translation_setting(self, deck_note_type_field: deck_utils.DeckNoteTypeField, source_field: str, translation_option):
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name
+        index = self.get_config_index()
+        previous_setting = self.get_batch_translation_setting_field(deck_note_type_field)
 
         if constants.CONFIG_BATCH_TRANSLATION not in self.config:
             self.config[constants.CONFIG_BATCH_TRANSLATION] = {}
@@ -334,19 +552,26 @@ class LanguageTools():
             'from_field': source_field,
             'translation_option': translation_option
         }
-        self.anki_utils.write_config(self.config)
+        if previous_setting != None:
+            index.remove_rule('translation', config_index.FieldKey(model_name, deck_name, previous_setting['from_field']), field_name)
+        index.add_rule('translation', config_index.FieldKey(model_name, deck_name, source_field), (field_name, translation_option))
+        self.save_config()
 
     def remove_translation_setting(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name        
-        del self.config[constants.CONFIG_BATCH_TRANSLATION][model_name][deck_name][field_name]
-        aqt.mw.addonManager.writeConfig(__name__, self.config)
+        index = self.get_config_index()
+        previous_setting = self.config[constants.CONFIG_BATCH_TRANSLATION][model_name][deck_name].pop(field_name)
+        index.remove_rule('translation', config_index.FieldKey(model_name, deck_name, previous_setting['from_field']), field_name)
+        self.save_config()
 
     def store_batch_transliteration_setting(self, deck_note_type_field: deck_utils.DeckNoteTypeField, source_field: str, transliteration_option):
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name
+        index = self.get_config_index()
+        previous_setting = self.get_batch_transliteration_settings(deck_note_type_field.deck_note_type).get(field_name, None)
 
         if constants.CONFIG_BATCH_TRANSLITERATION not in self.config:
             self.config[constants.CONFIG_BATCH_TRANSLITERATION] = {}
@@ -358,7 +583,10 @@ class LanguageTools():
             'from_field': source_field,
             'transliteration_option': transliteration_option
         }
-        self.anki_utils.write_config(self.config)
+        if previous_setting != None:
+            index.remove_rule('transliteration', config_index.FieldKey(model_name, deck_name, previous_setting['from_field']), field_name)
+        index.add_rule('transliteration', config_index.FieldKey(model_name, deck_name, source_field), (field_name, transliteration_option))
+        self.save_config()
 
         # the language for the target field should be set to transliteration
         self.store_language_detection_result(deck_note_type_field, constants.SpecialLanguage.transliteration.name)
@@ -367,8 +595,24 @@ class LanguageTools():
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name        
-        del self.config[constants.CONFIG_BATCH_TRANSLITERATION][model_name][deck_name][field_name]
-        aqt.mw.addonManager.writeConfig(__name__, self.config)
+        index = self.get_config_index()
+        previous_setting = self.config[constants.CONFIG_BATCH_TRANSLITERATION][model_name][deck_name].pop(field_name)
+        index.remove_rule('transliteration', config_index.FieldKey(model_name, deck_name, previous_setting['from_field']), field_name)
+        self.save_config()
+
+    def get_config_index(self) -> config_index.ConfigIndex:
+        # built once, the store / remove methods keep it up to date. the config object may get replaced wholesale, rebuild in that case
+        index = self.config_index
+        if index == None or index.config is not self.config:
+            index = config_index.ConfigIndex(self.config)
+            self.config_index = index
+        return index
+
+    def get_field_key(self, deck_note_type_field: deck_utils.DeckNoteTypeField) -> config_index.FieldKey:
+        return config_index.FieldKey(deck_note_type_field.get_model_name(), deck_note_type_field.get_deck_name(), deck_note_type_field.field_name)
+
+    def get_field_rules(self, from_deck_note_type_field: deck_utils.DeckNoteTypeField) -> config_index.FieldRules:
+        return self.get_config_index().get_field_rules(self.get_field_key(from_deck_note_type_field))
 
     def get_batch_translation_settings(self, deck_note_type: deck_utils.DeckNoteType):
         model_name = deck_note_type.model_name
@@ -389,6 +633,8 @@ class LanguageTools():
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name
+        index = self.get_config_index()
+        previous_source_field = self.get_batch_audio_settings(deck_note_type_field.deck_note_type).get(field_name, None)
 
         if constants.CONFIG_BATCH_AUDIO not in self.config:
             self.config[constants.CONFIG_BATCH_AUDIO] = {}
@@ -397,7 +643,10 @@ class LanguageTools():
         if deck_name not in self.config[constants.CONFIG_BATCH_AUDIO][model_name]:
             self.config[constants.CONFIG_BATCH_AUDIO][model_name][deck_name] = {}
         self.config[constants.CONFIG_BATCH_AUDIO][model_name][deck_name][field_name] = source_field
-        aqt.mw.addonManager.writeConfig(__name__, self.config)
+        if previous_source_field != None:
+            index.remove_rule('audio', config_index.FieldKey(model_name, deck_name, previous_source_field), field_name)
+        index.add_rule('audio', config_index.FieldKey(model_name, deck_name, source_field), field_name)
+        self.save_config()
 
         # the language for the target field should be set to sound
         self.store_language_detection_result(deck_note_type_field, constants.SpecialLanguage.sound.name)
@@ -406,8 +655,10 @@ class LanguageTools():
         model_name = deck_note_type_field.get_model_name()
         deck_name = deck_note_type_field.get_deck_name()
         field_name = deck_note_type_field.field_name        
-        del self.config[constants.CONFIG_BATCH_AUDIO][model_name][deck_name][field_name]
-        aqt.mw.addonManager.writeConfig(__name__, self.config)
+        index = self.get_config_index()
+        previous_source_field = self.config[constants.CONFIG_BATCH_AUDIO][model_name][deck_name].pop(field_name)
+        index.remove_rule('audio', config_index.FieldKey(model_name, deck_name, previous_source_field), field_name)
+        self.save_config()
 
     def get_batch_audio_settings(self, deck_note_type: deck_utils.DeckNoteType):
         model_name = deck_note_type.model_name
@@ -421,13 +672,16 @@ class LanguageTools():
         return self.config.get(constants.CONFIG_TEXT_PROCESSING, {})
 
     def store_text_processing_settings(self, settings):
+        # reject invalid regular expressions before they get saved
+        new_text_utils = text_utils.TextUtils(self.anki_utils, settings)
+        new_text_utils.validate()
         self.config[constants.CONFIG_TEXT_PROCESSING] = settings
-        self.anki_utils.write_config(self.config)
-        self.text_utils = text_utils.TextUtils(self.anki_utils, settings)
+        self.save_config()
+        self.text_utils = new_text_utils
 
     def store_voice_selection(self, language_code, voice_mapping):
         self.config[constants.CONFIG_VOICE_SELECTION][language_code] = voice_mapping
-        self.anki_utils.write_config(self.config)
+        self.save_config()
 
     def get_voice_selection_settings(self):
         return self.config.get(constants.CONFIG_VOICE_SELECTION, {})
@@ -449,21 +703,30 @@ class LanguageTools():
 
     def set_apply_updates_automatically(self, value):
         self.config[constants.CONFIG_APPLY_UPDATES_AUTOMATICALLY] = value
-        self.anki_utils.write_config(self.config)
+        self.save_config()
 
     def get_live_update_delay(self):
         return self.config.get(constants.CONFIG_LIVE_UPDATE_DELAY, 1250)
 
     def set_live_update_delay(self, value):
         self.config[constants.CONFIG_LIVE_UPDATE_DELAY] = value
-        self.anki_utils.write_config(self.config)
+        self.save_config()
+
+    def get_batch_max_workers(self):
+        return self.config.get(constants.CONFIG_BATCH_MAX_WORKERS, constants.DEFAULT_BATCH_MAX_WORKERS)
+
+    def get_translation_cache_enabled(self):
+        return self.config.get(constants.CONFIG_TRANSLATION_CACHE_ENABLED, True)
+
+    def get_translation_batch_size(self):
+        return self.config.get(constants.CONFIG_TRANSLATION_BATCH_SIZE, constants.DEFAULT_TRANSLATION_BATCH_SIZE)
+
+    def get_translation_batch_max_bytes(self):
+        return self.config.get(constants.CONFIG_TRANSLATION_BATCH_MAX_BYTES, constants.DEFAULT_TRANSLATION_BATCH_MAX_BYTES)
 
     def get_language(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
         """will return None if no language is associated with this field"""
-        model_name = deck_note_type_field.get_model_name()
-        deck_name = deck_note_type_field.get_deck_name()
-        field_name = deck_note_type_field.field_name
-        return self.config.get(constants.CONFIG_DECK_LANGUAGES, {}).get(model_name, {}).get(deck_name, {}).get(field_name, None)
+        return self.get_config_index().get_language(self.get_field_key(deck_note_type_field))
 
     def get_language_validate(self, deck_note_type_field: deck_utils.DeckNoteTypeField):
         language_code = self.get_language(deck_note_type_field)
@@ -476,11 +739,34 @@ class LanguageTools():
     def get_wanted_languages(self):
         return self.config[constants.CONFIG_WANTED_LANGUAGES].keys()
 
-    def get_translation_async(self, source_text, translation_option):
-        processed_text = self.text_utils.process(source_text, constants.TransformationType.Translation)
+    def get_processed_text(self, source_text, transformation_type):
+        # source_text may be a field value or a text_utils.PreprocessedText
+        processed_text = self.text_utils.process(source_text, transformation_type)
         logging.info(f'before text processing: [{source_text}], after text processing: [{processed_text}]')
-        if self.text_utils.is_empty(processed_text):
+        if self.text_utils.is_processed_text_empty(processed_text):
             raise errors.LanguageToolsValidationFieldEmpty()
+        return processed_text
+
+    def lookup_cached_result(self, url_path, processed_text, option):
+        if not self.get_translation_cache_enabled():
+            return None
+        return self.translation_cache.get(self.get_hash_for_request(url_path, {'text': processed_text, 'option': option}))
+
+    def store_cached_result(self, url_path, processed_text, option, result):
+        if self.get_translation_cache_enabled():
+            self.translation_cache.put(self.get_hash_for_request(url_path, {'text': processed_text, 'option': option}), result)
+
+    def get_cached_result(self, url_path, processed_text, option, request_fn):
+        """look up the result in the translation cache, otherwise call request_fn and store its result"""
+        result = self.lookup_cached_result(url_path, processed_text, option)
+        if result != None:
+            return result
+        result = request_fn()
+        self.store_cached_result(url_path, processed_text, option, result)
+        return result
+
+    def get_translation_async(self, source_text, translation_option):
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Translation)
         return self.cloud_language_tools.get_translation(processed_text, translation_option)
 
     def interpret_translation_response_async(self, response):
@@ -499,23 +785,75 @@ class LanguageTools():
         raise errors.LanguageToolsRequestError(error_text)
 
     def get_translation(self, source_text, translation_option):
-        return self.interpret_translation_response_async(self.get_translation_async(source_text, translation_option))
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Translation)
+        return self.get_cached_result('translate', processed_text, translation_option,
+            lambda: self.interpret_translation_response_async(self.cloud_language_tools.get_translation(processed_text, translation_option)))
+
+    def interpret_translation_batch_response(self, response, expected_count):
+        if response.status_code == 200:
+            data = json.loads(response.content)
+            translated_text_list = data['translated_text_list']
+            if len(translated_text_list) != expected_count:
+                raise errors.LanguageToolsRequestError(f'Could not load translation: expected {expected_count} results, got {len(translated_text_list)}')
+            return translated_text_list
+        # same error format as single translations
+        return self.interpret_translation_response_async(response)
+
+    def get_translation_batch(self, source_text_list, translation_option):
+        """translate a list of texts, packing them into batch requests when the server supports it.
+        chunks which fail, and all texts if the batch endpoint isn't available, fall back to single requests.
+        yields (index, result, exception) tuples in completion order, like batch_utils.run_concurrently"""
+        pending = []
+        for index, source_text in enumerate(source_text_list):
+            try:
+                processed_text = self.get_processed_text(source_text, constants.TransformationType.Translation)
+            except errors.LanguageToolsError as e:
+                yield index, None, e
+                continue
+            result = self.lookup_cached_result('translate', processed_text, translation_option)
+            if result != None:
+                yield index, result, None
+                continue
+            pending.append((index, processed_text))
+
+        fallback = pending
+        if self.cloud_language_tools.translation_batch_supported and len(pending) > 1:
+            fallback = []
+            chunks = batch_utils.chunk_items(pending, self.get_translation_batch_size(), self.get_translation_batch_max_bytes(), 
+                lambda item: len(item[1].encode('utf-8')))
+            async def translate_chunk(chunk):
+                response = await self.async_cloud_language_tools.get_translation_batch([processed_text for index, processed_text in chunk], translation_option)
+                return self.interpret_translation_batch_response(response, len(chunk))
+            for chunk_index, translated_text_list, exception in batch_utils.run_concurrently_async(translate_chunk, chunks, self.async_cloud_language_tools):
+                chunk = chunks[chunk_index]
+                if exception != None:
+                    if not isinstance(exception, errors.BatchEndpointNotSupportedError):
+                        logging.warning(f'batch translation request failed, retrying texts one by one: {exception}')
+                    fallback.extend(chunk)
+                    continue
+                for (index, processed_text), translated_text in zip(chunk, translated_text_list):
+                    self.store_cached_result('translate', processed_text, translation_option, translated_text)
+                    yield index, translated_text, None
+
+        async def translate_single(item):
+            index, processed_text = item
+            response = await self.async_cloud_language_tools.get_translation(processed_text, translation_option)
+            return self.interpret_translation_response_async(response)
+        for fallback_index, translated_text, exception in batch_utils.run_concurrently_async(translate_single, fallback, self.async_cloud_language_tools):
+            index, processed_text = fallback[fallback_index]
+            if exception == None:
+                self.store_cached_result('translate', processed_text, translation_option, translated_text)
+            yield index, translated_text, exception
 
     def get_translation_all(self, source_text, from_language, to_language):
-        processed_text = self.text_utils.process(source_text, constants.TransformationType.Translation)
-        logging.info(f'before text processing: [{source_text}], after text processing: [{processed_text}]')
-        if self.text_utils.is_empty(processed_text):
-            raise errors.LanguageToolsValidationFieldEmpty()        
-        return self.cloud_language_tools.get_translation_all(source_text, from_language, to_language)
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Translation)
+        return self.cloud_language_tools.get_translation_all(processed_text, from_language, to_language)
     
     # transliteration
     # ===============
 
     def get_transliteration_async(self, source_text, transliteration_option):
-        processed_text = self.text_utils.process(source_text, constants.TransformationType.Transliteration)
-        logging.info(f'before text processing: [{source_text}], after text processing: [{processed_text}]')
-        if self.text_utils.is_empty(processed_text):
-            raise errors.LanguageToolsValidationFieldEmpty()        
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Transliteration)
         return self.cloud_language_tools.get_transliteration(processed_text, transliteration_option)
 
     def interpret_transliteration_response_async(self, response):
@@ -534,7 +872,9 @@ class LanguageTools():
         raise errors.LanguageToolsRequestError(error_text)
 
     def get_transliteration(self, source_text, transliteration_option):
-        return self.interpret_transliteration_response_async(self.get_transliteration_async(source_text, transliteration_option))
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Transliteration)
+        return self.get_cached_result('transliterate', processed_text, transliteration_option,
+            lambda: self.interpret_transliteration_response_async(self.cloud_language_tools.get_transliteration(processed_text, transliteration_option)))
 
     # breakdown
     # =========
@@ -572,8 +912,8 @@ class LanguageTools():
 
     def generate_audio_for_field(self, note_id, from_field, to_field, voice):
         note = self.anki_utils.get_note_by_id(note_id)
-        source_text = note[from_field]
-        if self.text_utils.is_empty(source_text):
+        source_text = self.text_utils.preprocess(note[from_field])
+        if source_text.empty:
             return False
         
         response = self.generate_audio_tag_collection(source_text, voice)
@@ -591,19 +931,27 @@ class LanguageTools():
                   'full_filename': None}
         generated_filename = self.get_tts_audio(source_text, voice['service'], voice['language_code'], voice['voice_key'], {})
         if generated_filename != None:
-            full_filename = self.anki_utils.media_add_file(generated_filename)
-            collection_filename = os.path.basename(full_filename)
-            sound_tag = f'[sound:{collection_filename}]'
-            result['sound_tag'] = sound_tag
-            result['full_filename'] = full_filename
+            result = self.add_audio_file_to_collection(generated_filename)
         return result
 
+    def add_audio_file_to_collection(self, generated_filename):
+        # file names are content-addressed, if the collection already has this file, don't add it again
+        full_filename = self.anki_utils.get_media_file_path(os.path.basename(generated_filename))
+        if full_filename == None:
+            full_filename = self.anki_utils.media_add_file(generated_filename)
+        collection_filename = os.path.basename(full_filename)
+        return {
+            'sound_tag': f'[sound:{collection_filename}]',
+            'full_filename': full_filename
+        }
+
     def get_hash_for_request(self, url_path, data):
         combined_data = {
             'url': url_path,
             'data': data
         }
-        return hashlib.sha224(str(combined_data).encode('utf-8')).hexdigest()
+        # canonical json, so that dict ordering doesn't affect the hash
+        return hashlib.sha224(json.dumps(combined_data, sort_keys=True).encode('utf-8')).hexdigest()
 
     def get_hash_for_audio_request(self, source_text, service, voice_key, options):
         combined_data = {
@@ -612,7 +960,8 @@ class LanguageTools():
             'voice_key': voice_key,
             'options': options
         }
-        return hashlib.sha224(str(combined_data).encode('utf-8')).hexdigest()
+        # canonical json, so that key order in options doesn't affect the hash
+        return hashlib.sha224(json.dumps(combined_data, sort_keys=True).encode('utf-8')).hexdigest()
 
     def get_user_files_dir(self):
         addon_dir = os.path.dirname(os.path.realpath(__file__))
@@ -620,29 +969,33 @@ class LanguageTools():
         return user_files_dir        
 
     def clean_user_files_audio(self):
-        user_files_dir = self.get_user_files_dir()
-        files = glob.glob(f'{user_files_dir}/*.mp3')
-        for f in files:
-            os.remove(f)
+        self.audio_store.clear()
+
+    def flush_user_files(self):
+        self.flush_config()
+        # audio access times are kept in memory until the next write
+        self.audio_store.flush()
+        self.detection_ledger.flush()
+        self.translation_cache.flush()
 
-    def get_audio_filename(self, source_text, service, voice_key, options):
-        user_files_dir = self.get_user_files_dir()
-        hash_str = self.get_hash_for_audio_request(source_text, service, voice_key, options)
-        filename = f'languagetools-{hash_str}.mp3'
-        return os.path.join(user_files_dir, filename)
+    def close_user_files(self):
+        self.flush_user_files()
+        # reopened if needed, when another profile gets loaded
+        self.translation_cache.close()
 
     def get_tts_audio(self, source_text, service, language_code, voice_key, options):
-        processed_text = self.text_utils.process(source_text, constants.TransformationType.Audio)
-        logging.info(f'before text processing: [{source_text}], after text processing: [{processed_text}]')
-        if self.text_utils.is_empty(processed_text):
-            raise errors.LanguageToolsValidationFieldEmpty()
-        filename = self.get_audio_filename(processed_text, service, voice_key, options)
-        if os.path.isfile(filename):
+        processed_text = self.get_processed_text(source_text, constants.TransformationType.Audio)
+        hash_str = self.get_hash_for_audio_request(processed_text, service, voice_key, options)
+        filename = self.audio_store.get(hash_str)
+        if filename != None:
+            return filename
+        # the same audio may already have been added to the collection
+        filename = self.anki_utils.get_media_file_path(self.audio_store.get_filename(hash_str))
+        if filename != None:
+            logging.info(f'audio already present in collection: {filename}')
             return filename
         audio_content = self.cloud_language_tools.get_tts_audio(processed_text, service, language_code, voice_key, options)
-        with open(filename, 'wb') as f:
-            f.write(audio_content)
-        f.close()
+        filename = self.audio_store.put(hash_str, audio_content)
         logging.info(f'wrote audio filename {filename}')
         return filename
 
@@ -651,8 +1004,7 @@ class LanguageTools():
         self.anki_utils.play_sound(audio_filename)
 
     def get_transliteration_options(self, language):
-        candidates = [x for x in self.transliteration_language_list if x['language_code'] == language]
-        return candidates
+        return list(self.transliteration_options_by_language.get(language, []))
 
     def build_translation_option(self, service, source_language_id, target_language_id):
         return {
@@ -663,22 +1015,22 @@ class LanguageTools():
         
 
     def get_translation_options(self, source_language: str, target_language: str):
-        # get list of services which support source_language
-        translation_options = []
-        source_language_options = [x for x in self.translation_language_list if x['language_code'] == source_language]
-        for source_language_option in source_language_options:
-            service = source_language_option['service']
-            # find out whether target language is supported
-            target_language_options = [x for x in self.translation_language_list if x['language_code'] == target_language and x['service'] == service]
-            if len(target_language_options) == 1:
-                # found an option
-                target_language_option = target_language_options[0]
-                translation_option = self.build_translation_option(service, source_language_option['language_id'], target_language_option['language_id'])
-                translation_options.append(translation_option)
-        return translation_options
+        language_pair = (source_language, target_language)
+        if language_pair not in self.translation_options_by_language_pair:
+            # get list of services which support source_language
+            translation_options = []
+            for source_language_option in self.translation_options_by_language.get(source_language, []):
+                service = source_language_option['service']
+                # find out whether target language is supported
+                target_language_options = self.translation_options_by_service_language.get((service, target_language), [])
+                if len(target_language_options) == 1:
+                    # found an option
+                    target_language_option = target_language_options[0]
+                    translation_option = self.build_translation_option(service, source_language_option['language_id'], target_language_option['language_id'])
+                    translation_options.append(translation_option)
+            self.translation_options_by_language_pair[language_pair] = translation_options
+        return list(self.translation_options_by_language_pair[language_pair])
 
 
     def get_tokenization_options(self, source_language):
-        tokenization_options = []
-        source_language_options = [x for x in self.tokenization_options if x['language_code'] == source_language]
-        return source_language_options
+        return list(self.tokenization_options_by_language.get(source_language, []))
@@ -16,10 +16,12 @@ git push origin ${GIT_TAG}
 # remove meta.json, which contains private key
 rm meta.json
 rm -rf __pycache__
-rm user_files/*.mp3
+# remove the developer's own audio files and caches, only README.txt ships in user_files
+# (audio, audio_index.json, translation_cache.sqlite3, language_data.json, language_detection_ledger.json)
+find user_files -type f ! -name README.txt -delete
 rm -rvf htmlcov/
 ADDON_FILENAME=${HOME}/anki-addons-releases/anki-language-tools-${VERSION_NUMBER}.ankiaddon
-zip --exclude "*node_modules*" "*__pycache__*" "test_*.py" "*test_services*" "*.ini" "*.workspace" "*.md" "*.sh" requirements.txt "*.code-workspace" "web" -r ${ADDON_FILENAME} *
+zip --exclude "*node_modules*" "*__pycache__*" "test_*.py" "*test_services*" "*.ini" "*.workspace" "*.md" "*.sh" requirements.txt "*.code-workspace" "web" "user_files/*.mp3" "user_files/*.json" "user_files/*.sqlite3*" "user_files/*.tmp" -r ${ADDON_FILENAME} *
 
 # sync 
 rclone sync ~/anki-addons-releases/ dropbox:Anki/anki-addons-releases/
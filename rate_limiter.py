@@ -0,0 +1,99 @@
+import time
+import random
+import threading
+import email.utils
+import logging
+
+
+class ServiceLimiter():
+    """limits requests to one service: a token bucket caps the request rate,
+    and the number of requests in flight adapts AIMD-style: it grows by about one per round of successful requests,
+    and gets halved whenever the service tells us to slow down."""
+
+    def __init__(self, requests_per_second, max_concurrency):
+        self.condition = threading.Condition()
+        self.rate = requests_per_second
+        self.burst = requests_per_second
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0
+
+    def refill_locked(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.refill_locked(now)
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                elif self.in_flight >= int(self.concurrency_limit):
+                    # wait for a request to finish
+                    wait_time = None
+                elif self.tokens < 1:
+                    wait_time = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                self.condition.wait(wait_time)
+
+    def release(self, throttled, retry_after=None):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                # multiplicative decrease
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                if retry_after != None:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            else:
+                # additive increase
+                self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1 / self.concurrency_limit)
+            self.condition.notify_all()
+
+
+class RateLimiter():
+    """one ServiceLimiter per service, shared by everything which talks to the API"""
+
+    def __init__(self, requests_per_second, max_concurrency):
+        self.requests_per_second = requests_per_second
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.service_limiters = {}
+
+    def get_service_limiter(self, service) -> ServiceLimiter:
+        with self.lock:
+            if service not in self.service_limiters:
+                self.service_limiters[service] = ServiceLimiter(self.requests_per_second, self.max_concurrency)
+            return self.service_limiters[service]
+
+    def set_max_concurrency(self, max_concurrency):
+        with self.lock:
+            self.max_concurrency = max_concurrency
+            self.service_limiters = {}
+
+
+def get_backoff_delay(attempt, base_delay, max_delay):
+    """exponential backoff with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """Retry-After header, either delay in seconds or an http date. returns seconds, or None"""
+    if value == None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_date.timestamp() - time.time())
+    except (TypeError, ValueError):
+        logging.warning(f'could not parse Retry-After header: {value}')
+        return None
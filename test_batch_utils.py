@@ -0,0 +1,81 @@
+import threading
+import time
+import batch_utils
+import async_client
+
+def test_run_concurrently_results():
+    def task(value):
+        if value == 3:
+            raise ValueError('bad value')
+        return value * 2
+
+    results = {}
+    errors = {}
+    for index, result, exception in batch_utils.run_concurrently(task, [0, 1, 2, 3, 4], 4):
+        if exception != None:
+            errors[index] = exception
+        else:
+            results[index] = result
+
+    assert results == {0: 0, 1: 2, 2: 4, 4: 8}
+    assert list(errors.keys()) == [3]
+    assert str(errors[3]) == 'bad value'
+
+def test_run_concurrently_bounded():
+    lock = threading.Lock()
+    state = {'running': 0, 'max_running': 0}
+
+    def task(value):
+        with lock:
+            state['running'] += 1
+            state['max_running'] = max(state['max_running'], state['running'])
+        time.sleep(0.01)
+        with lock:
+            state['running'] -= 1
+        return value
+
+    results = [result for index, result, exception in batch_utils.run_concurrently(task, range(20), 3)]
+    assert sorted(results) == list(range(20))
+    assert state['max_running'] <= 3
+
+def test_chunk_items():
+    items = ['a', 'bb', 'ccc', 'dddd', 'e']
+    # limited by count
+    assert batch_utils.chunk_items(items, 2, 100, len) == [['a', 'bb'], ['ccc', 'dddd'], ['e']]
+    # limited by size
+    assert batch_utils.chunk_items(items, 10, 5, len) == [['a', 'bb'], ['ccc'], ['dddd', 'e']]
+    # oversized items get their own chunk
+    assert batch_utils.chunk_items(['aaaaaa', 'b'], 10, 3, len) == [['aaaaaa'], ['b']]
+    assert batch_utils.chunk_items([], 10, 3, len) == []
+
+def test_run_concurrently_async():
+    lock = threading.Lock()
+    state = {'running': 0, 'max_running': 0}
+
+    class SlowClient():
+        def language_detection(self, field_sample):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            if field_sample == 'bad':
+                raise ValueError('bad sample')
+            return f'detected {field_sample}'
+
+    client = async_client.AsyncCloudLanguageTools(SlowClient(), 3)
+    samples = [f'sample {i}' for i in range(10)] + ['bad']
+    results = {}
+    errors = {}
+    for index, result, exception in batch_utils.run_concurrently_async(client.language_detection, samples, client):
+        if exception != None:
+            errors[index] = str(exception)
+        else:
+            results[index] = result
+    assert results == {i: f'detected sample {i}' for i in range(10)}
+    assert errors == {10: 'bad sample'}
+    assert state['max_running'] <= 3
+
+    # sync adapter
+    assert client.run(client.language_detection('sample')) == 'detected sample'
@@ -2,6 +2,8 @@ import json
 import os
 import unittest
 import pprint
+import threading
+import http.server
 
 # add external search path
 import sys
@@ -9,6 +11,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'external'))
 
 import cloudlanguagetools
 import constants
+import errors
+import rate_limiter
 
 
 # create unit test class for CLT API tests
@@ -100,5 +104,198 @@ class CloudLanguageToolsVocabTests(unittest.TestCase):
     def test_get_base_url(self):
         self.assertEquals(self.clt.get_base_url(), constants.VOCABAI_API_BASE_URL)
 
+# these don't require network access
+class CloudLanguageToolsSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.clt = cloudlanguagetools.CloudLanguageTools()
+
+    def test_session_reused(self):
+        session_1 = self.clt.get_session()
+        session_2 = self.clt.get_session()
+        self.assertIs(session_1, session_2)
+
+    def test_pool_sized_to_workers(self):
+        adapter = self.clt.get_session().get_adapter(constants.CLT_API_BASE_URL)
+        self.assertEqual(adapter._pool_maxsize, constants.DEFAULT_BATCH_MAX_WORKERS)
+
+        self.clt.set_max_connections(3)
+        adapter = self.clt.get_session().get_adapter(constants.CLT_API_BASE_URL)
+        self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_session_reset_on_api_key_change(self):
+        self.clt.set_api_key('key1')
+        session_1 = self.clt.get_session()
+        # same key, keep the session
+        self.clt.set_api_key('key1')
+        self.assertIs(self.clt.get_session(), session_1)
+        # different key, new session
+        self.clt.set_api_key('key2')
+        self.assertIsNot(self.clt.get_session(), session_1)
+        self.assertEqual(self.clt.api_key, 'key2')
+
+# local http server standing in for the CLT API
+class StubRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append({'path': self.path, 'headers': dict(self.headers), 'data': None})
+        if self.path == '/language_data_v1':
+            if self.headers.get('If-None-Match') == 'etag-1':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_json(200, {'language_list': {'en': 'English'}}, {'ETag': 'etag-1'})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        content_length = int(self.headers['Content-Length'])
+        request_data = json.loads(self.rfile.read(content_length))
+        self.server.requests.append({'path': self.path, 'headers': dict(self.headers), 'data': request_data})
+        if len(self.server.error_responses) > 0:
+            status_code, extra_headers = self.server.error_responses.pop(0)
+            self.send_json(status_code, {'error': 'try again later'}, extra_headers)
+        elif self.path == '/translate' :
+            self.send_json(200, {'translated_text': f'translated {request_data["text"]}'})
+        elif self.path == '/translate_batch' and self.server.batch_supported:
+            self.send_json(200, {'translated_text_list': [f'translated {text}' for text in request_data['text_list']]})
+        elif self.path == '/detect_batch' and self.server.batch_supported:
+            self.send_json(200, {'detected_language_list': [f'lang {text_list[0]}' for text_list in request_data['text_list_list']]})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def send_json(self, status_code, content_obj, extra_headers={}):
+        content = json.dumps(content_obj).encode('utf-8')
+        self.send_response(status_code)
+        for key, value in extra_headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+class CloudLanguageToolsStubServerTests(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubRequestHandler)
+        self.server.requests = []
+        self.server.batch_supported = True
+        # (status_code, headers) returned before any regular response
+        self.server.error_responses = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+        self.clt = cloudlanguagetools.CloudLanguageTools()
+        self.clt.clt_api_base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.clt.use_vocabai_api = False
+        self.clt.set_api_key('test_key')
+        self.sleep_calls = []
+        self.clt.sleep_fn = lambda delay: self.sleep_calls.append(delay)
+
+        self.translation_option = {'service': 'Azure', 'source_language_id': 'de', 'target_language_id': 'en'}
+
+    def tearDown(self):
+        self.clt.reset_session()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_translation_batch(self):
+        response = self.clt.get_translation_batch(['unter', 'über'], self.translation_option)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'translated_text_list': ['translated unter', 'translated über']})
+
+        self.assertEqual(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/translate_batch')
+        self.assertEqual(request['headers']['api_key'], 'test_key')
+        self.assertEqual(request['data'], {
+            'text_list': ['unter', 'über'],
+            'service': 'Azure',
+            'from_language_key': 'de',
+            'to_language_key': 'en'
+        })
+        self.assertTrue(self.clt.translation_batch_supported)
+
+    def test_language_detection_batch(self):
+        language_list = self.clt.language_detection_batch([['unter', 'über'], ['hello']])
+        self.assertEqual(language_list, ['lang unter', 'lang hello'])
+        self.assertEqual(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/detect_batch')
+        self.assertEqual(request['data'], {'text_list_list': [['unter', 'über'], ['hello']]})
+        self.assertTrue(self.clt.language_detection_batch_supported)
+
+    def test_language_detection_batch_not_supported(self):
+        self.server.batch_supported = False
+        with self.assertRaises(errors.BatchEndpointNotSupportedError):
+            self.clt.language_detection_batch([['unter']])
+        self.assertFalse(self.clt.language_detection_batch_supported)
+
+    def test_translation_batch_not_supported(self):
+        self.server.batch_supported = False
+        with self.assertRaises(errors.BatchEndpointNotSupportedError):
+            self.clt.get_translation_batch(['unter'], self.translation_option)
+        self.assertFalse(self.clt.translation_batch_supported)
+
+    def test_language_data_conditional(self):
+        language_data, etag = self.clt.get_language_data_conditional(None)
+        self.assertEqual(language_data, {'language_list': {'en': 'English'}})
+        self.assertEqual(etag, 'etag-1')
+        self.assertNotIn('If-None-Match', self.server.requests[0]['headers'])
+
+        self.assertEqual(self.clt.get_language_data_conditional('etag-1'), None)
+        self.assertEqual(self.server.requests[1]['headers']['If-None-Match'], 'etag-1')
+
+    def test_retry_throttled(self):
+        self.server.error_responses = [(429, {'Retry-After': '1'}), (503, {})]
+        response = self.clt.get_translation('unter', self.translation_option)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'translated_text': 'translated unter'})
+        self.assertEqual(len(self.server.requests), 3)
+        # Retry-After is honored
+        self.assertGreaterEqual(self.sleep_calls[0], 1)
+        self.assertEqual(len(self.sleep_calls), 2)
+        # concurrency got halved twice
+        service_limiter = self.clt.rate_limiter.get_service_limiter('Azure')
+        self.assertLess(service_limiter.concurrency_limit, constants.DEFAULT_BATCH_MAX_WORKERS / 2)
+        self.assertEqual(service_limiter.in_flight, 0)
+
+    def test_retry_gives_up(self):
+        self.clt.max_retries = 2
+        self.server.error_responses = [(500, {})] * 3
+        response = self.clt.get_translation('unter', self.translation_option)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retry_connection_error(self):
+        self.clt.max_retries = 1
+        self.clt.clt_api_base_url = 'http://127.0.0.1:1'
+        with self.assertRaises(Exception):
+            self.clt.get_translation('unter', self.translation_option)
+        self.assertEqual(len(self.sleep_calls), 1)
+
+class RateLimiterTests(unittest.TestCase):
+    def test_aimd(self):
+        service_limiter = rate_limiter.ServiceLimiter(1000, 8)
+        service_limiter.acquire()
+        service_limiter.release(True)
+        self.assertEqual(service_limiter.concurrency_limit, 4)
+        for i in range(50):
+            service_limiter.acquire()
+            service_limiter.release(False)
+        self.assertEqual(service_limiter.concurrency_limit, 8)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(rate_limiter.parse_retry_after('3'), 3)
+        self.assertEqual(rate_limiter.parse_retry_after(None), None)
+        self.assertEqual(rate_limiter.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertEqual(rate_limiter.parse_retry_after('garbage'), None)
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            delay = rate_limiter.get_backoff_delay(attempt, 0.5, 30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 0.5 * 2 ** attempt))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -78,6 +78,30 @@ def test_add_audio(qtbot):
     # only uncomment if you want to see the dialog come up
     # add_audio_dialog.exec()
 
+def test_add_audio_task(qtbot):
+    # pytest test_dialogs.py -rPP -k test_add_audio_task
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('batch_audio')
+
+    deck_note_type = mock_language_tools.deck_utils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2]
+    add_audio_dialog = dialogs.AddAudioDialog(mock_language_tools, deck_note_type, note_id_list)
+    add_audio_dialog.setupUi()
+    add_audio_dialog.success_count = 0
+
+    add_audio_dialog.add_audio_task()
+
+    assert add_audio_dialog.success_count == 2
+    assert add_audio_dialog.generate_audio_errors == []
+    assert add_audio_dialog.progress_bar.value() == 2
+    for note_id in note_id_list:
+        note = config_gen.notes_by_id[note_id]
+        assert 'sound:languagetools-' in note.set_values[config_gen.field_sound]
+        assert note.flush_called == True
+    assert mock_language_tools.anki_utils.undo_finished == True
+
 def test_add_translation_transliteration_no_language_mapping(qtbot):
     # pytest test_dialogs.py -rPP -k test_add_translation_transliteration_no_language_mapping
 
@@ -108,38 +132,53 @@ def test_language_mapping(qtbot):
     mock_language_tools = config_gen.build_languagetools_instance('no_language_mapping')
 
     mapping_dialog = dialog_languagemapping.prepare_language_mapping_dialogue(mock_language_tools)
-    
+    tree_view = mapping_dialog.findChild(aqt.qt.QTreeView, 'language_mapping_tree')
+    model = tree_view.model()
+
+    def get_dntf(field_name):
+        return mock_language_tools.deck_utils.build_deck_note_type_field(config_gen.deck_id, config_gen.model_id, field_name)
+
+    def get_language_index(field_name):
+        return model.get_dntf_index(get_dntf(field_name), dialog_languagemapping.COL_INDEX_LANGUAGE)
+
+    def set_language_with_editor(field_name, language_name):
+        index = get_language_index(field_name)
+        delegate = tree_view.itemDelegateForColumn(dialog_languagemapping.COL_INDEX_LANGUAGE)
+        editor = delegate.createEditor(tree_view.viewport(), aqt.qt.QStyleOptionViewItem(), index)
+        # all editors share the same language list
+        assert editor.model() is mapping_dialog.ui.language_list_model
+        delegate.setEditorData(editor, index)
+        qtbot.keyClicks(editor, language_name)
+        delegate.setModelData(editor, model, index)
+        editor.deleteLater()
+
     # assert deck name, note type, and 3 fields
-    deck_frame = mapping_dialog.findChild(aqt.qt.QFrame, f'frame_{config_gen.deck_name}')
-    assert deck_frame != None
-    deck_name_label = mapping_dialog.findChild(aqt.qt.QLabel, f'deck_name_{config_gen.deck_name}')
-    assert deck_name_label.text() == config_gen.deck_name
-    note_type_label = mapping_dialog.findChild(aqt.qt.QLabel, f'note_type_name_{config_gen.deck_name}_{config_gen.model_name}')
-    assert note_type_label.text() == config_gen.model_name
+    assert model.rowCount() == 1
+    deck_index = model.index(0, dialog_languagemapping.COL_INDEX_NAME)
+    assert deck_index.data() == f'Deck: {config_gen.deck_name}'
+    assert model.rowCount(deck_index) == 1
+    note_type_index = model.index(0, dialog_languagemapping.COL_INDEX_NAME, deck_index)
+    assert note_type_index.data() == f'Note Type: {config_gen.model_name}'
 
     # look for labels on all 3 fields
-    for field_name in config_gen.all_fields:
-        field_label_obj_name = f'field_label_{config_gen.model_name} / {config_gen.deck_name} / {field_name}'
-        field_label = mapping_dialog.findChild(aqt.qt.QLabel, field_label_obj_name)
-        assert field_label.text() == field_name
+    assert model.rowCount(note_type_index) == len(config_gen.all_fields)
+    for row, field_name in enumerate(config_gen.all_fields):
+        assert model.index(row, dialog_languagemapping.COL_INDEX_NAME, note_type_index).data() == field_name
 
     # none of the languages should be set
     for field_name in config_gen.all_fields:
-        field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {field_name}'
-        field_language = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-        assert field_language != None
-        # ensure the "not set" option is selected
-        assert field_language.currentText() == 'Not Set'
+        assert get_language_index(field_name).data() == 'Not Set'
+
+    # no editor widgets until a row gets edited
+    assert mapping_dialog.findChildren(aqt.qt.QComboBox) == []
 
     # now, set languages manually
     # ---------------------------
 
-    field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_chinese}'
-    field_language_combobox = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-    qtbot.keyClicks(field_language_combobox, 'Chinese')
-    field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_english}'
-    field_language_combobox = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-    qtbot.keyClicks(field_language_combobox, 'English')
+    set_language_with_editor(config_gen.field_chinese, 'Chinese')
+    set_language_with_editor(config_gen.field_english, 'English')
+    assert get_language_index(config_gen.field_chinese).data() == 'Chinese'
+    assert get_language_index(config_gen.field_chinese).data(aqt.qt.Qt.ItemDataRole.BackgroundRole) != None
 
     apply_button = mapping_dialog.findChild(aqt.qt.QPushButton, 'apply')
     qtbot.mouseClick(apply_button, aqt.qt.Qt.MouseButton.LeftButton)
@@ -154,6 +193,8 @@ def test_language_mapping(qtbot):
     # -----------------------
     
     mapping_dialog = dialog_languagemapping.prepare_language_mapping_dialogue(mock_language_tools)
+    tree_view = mapping_dialog.findChild(aqt.qt.QTreeView, 'language_mapping_tree')
+    model = tree_view.model()
     # apply button should be disabled
     apply_button = mapping_dialog.findChild(aqt.qt.QPushButton, 'apply')
     assert apply_button.isEnabled() == False
@@ -162,13 +203,8 @@ def test_language_mapping(qtbot):
     qtbot.mouseClick(autodetect_button, aqt.qt.Qt.MouseButton.LeftButton)
     
     # assert languages detected
-    field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_chinese}'
-    field_language = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-    assert field_language.currentText() == 'Chinese'
-
-    field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_english}'
-    field_language = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-    assert field_language.currentText() == 'English'
+    assert get_language_index(config_gen.field_chinese).data() == 'Chinese'
+    assert get_language_index(config_gen.field_english).data() == 'English'
 
     # apply button should be enabled
     assert apply_button.isEnabled() == True
@@ -190,24 +226,29 @@ def test_language_mapping(qtbot):
     # reset this
     mock_language_tools.anki_utils.written_config = None
     mapping_dialog = dialog_languagemapping.prepare_language_mapping_dialogue(mock_language_tools)
+    tree_view = mapping_dialog.findChild(aqt.qt.QTreeView, 'language_mapping_tree')
+    model = tree_view.model()
 
-    field_samples_button_obj_name = f'field_samples_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_english}'
-    autodetect_button = mapping_dialog.findChild(aqt.qt.QPushButton, field_samples_button_obj_name)
-    qtbot.mouseClick(autodetect_button, aqt.qt.Qt.MouseButton.LeftButton)
+    tree_view.clicked.emit(model.get_dntf_index(get_dntf(config_gen.field_english), dialog_languagemapping.COL_INDEX_SAMPLES))
 
     assert 'old people' in mock_language_tools.anki_utils.info_message_received
     assert 'hello' in mock_language_tools.anki_utils.info_message_received
 
-    field_samples_button_obj_name = f'field_samples_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_sound}'
-    autodetect_button = mapping_dialog.findChild(aqt.qt.QPushButton, field_samples_button_obj_name)
-    qtbot.mouseClick(autodetect_button, aqt.qt.Qt.MouseButton.LeftButton)    
+    tree_view.clicked.emit(model.get_dntf_index(get_dntf(config_gen.field_sound), dialog_languagemapping.COL_INDEX_SAMPLES))
 
     assert 'No usable field data found' in mock_language_tools.anki_utils.info_message_received
 
+    # filter decks
+    filter_text_input = mapping_dialog.findChild(aqt.qt.QLineEdit)
+    qtbot.keyClicks(filter_text_input, 'no such deck')
+    assert model.rowCount() == 0
+    assert model.get_visible_dntf_list() == []
+    assert get_language_index(config_gen.field_chinese).isValid() == False
+    filter_text_input.clear()
+    assert model.rowCount() == 1
+
     # set one language manually
-    field_language_obj_name = f'field_language_{config_gen.model_name} / {config_gen.deck_name} / {config_gen.field_chinese}'
-    field_language_combobox = mapping_dialog.findChild(aqt.qt.QComboBox, field_language_obj_name)
-    qtbot.keyClicks(field_language_combobox, 'Sound')
+    set_language_with_editor(config_gen.field_chinese, 'Sound')
 
     # hit cancel
     cancel_button = mapping_dialog.findChild(aqt.qt.QPushButton, 'cancel')
@@ -788,6 +829,31 @@ def test_dialog_textprocessing_simple(qtbot):
     # verify preview
     assert dialog.sample_text_transformed_label.text() == '<b>abdc1234rep</b>'
 
+def test_dialog_textprocessing_cancel(qtbot):
+    # pytest test_dialogs.py -rPP -k test_dialog_textprocessing_cancel
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('text_replacement')
+
+    dialog = dialog_textprocessing.prepare_text_processing_dialog(mock_language_tools)
+    assert dialog.textReplacementTableModel.rowCount(None) == 1
+
+    # edit the existing rule and add another one
+    index_replacement = dialog.textReplacementTableModel.createIndex(0, dialog_textprocessing.COL_INDEX_REPLACEMENT)
+    dialog.textReplacementTableModel.setData(index_replacement, 'nichts', aqt.qt.Qt.ItemDataRole.EditRole)
+    qtbot.mouseClick(dialog.add_replace_simple_button, aqt.qt.Qt.MouseButton.LeftButton)
+    index_pattern = dialog.textReplacementTableModel.createIndex(1, dialog_textprocessing.COL_INDEX_PATTERN)
+    dialog.textReplacementTableModel.setData(index_pattern, 'unter', aqt.qt.Qt.ItemDataRole.EditRole)
+    assert dialog.textReplacementTableModel.rowCount(None) == 2
+
+    # cancel, the live rules and the stored ones are unchanged
+    dialog.reject()
+
+    assert len(mock_language_tools.text_utils.replacements) == 1
+    assert mock_language_tools.text_utils.replacements[0].replace == 'etwas'
+    assert mock_language_tools.text_utils.process('unter etw', constants.TransformationType.Audio) == 'unter etwas'
+    assert mock_language_tools.anki_utils.written_config == None
+
 def test_dialog_breakdown_chinese(qtbot):
     # pytest test_dialogs.py -rPP -k test_dialog_breakdown_chinese
 
@@ -909,6 +975,39 @@ def test_dialog_runrules(qtbot):
     assert expected_action_stats == actual_action_stats    
     
 
+def test_dialog_runrules_batch_missing_result(qtbot):
+    # pytest test_dialogs.py -rPP -k test_dialog_runrules_batch_missing_result
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('batch_audio_translation_transliteration')
+
+    deck_note_type = deck_utils.DeckNoteType(config_gen.deck_id, config_gen.deck_name, config_gen.model_id, config_gen.model_name)
+    note_id_list = config_gen.get_note_id_list()
+
+    mock_language_tools.cloud_language_tools.translation_map = {
+        '老人家': 'translation 1',
+        '你好': 'translation 2'
+    }
+    mock_language_tools.cloud_language_tools.transliteration_map = {
+        '老人家': 'transliteration 1',
+        '你好': 'transliteration 2'
+    }
 
+    # the batch skips the second note
+    get_translation_batch = mock_language_tools.get_translation_batch
+    def get_translation_batch_skipping(source_text_list, translation_option):
+        for index, result, exception in get_translation_batch(source_text_list, translation_option):
+            if index != 1:
+                yield index, result, exception
+    mock_language_tools.get_translation_batch = get_translation_batch_skipping
 
+    dialog = dialog_notesettings.RunRulesDialog(mock_language_tools, deck_note_type, note_id_list)
+    dialog.setupUi()
+    qtbot.mouseClick(dialog.applyButton, aqt.qt.Qt.MouseButton.LeftButton)
 
+    # the second note gets translated on its own
+    assert config_gen.notes_by_id[config_gen.note_id_1].set_values['English'] == 'translation 1'
+    assert config_gen.notes_by_id[config_gen.note_id_2].set_values['English'] == 'translation 2'
+    assert dialog.batch_error_manager.action_stats['adding translation to field English'] == {
+        'success': 2, 'error': {'Field is empty': 1}
+    }
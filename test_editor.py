@@ -203,6 +203,82 @@ def test_editor_translation(qtbot):
 
 
 
+def test_editor_superseded_requests(qtbot):
+    # pytest test_editor.py -rPP -k test_editor_superseded_requests
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('batch_translation')
+
+    mock_language_tools.cloud_language_tools.translation_map = {
+        '老人': 'old people (short)',
+        '老人家': 'old people (long)'
+    }
+    translation_requests = []
+    get_translation = mock_language_tools.cloud_language_tools.get_translation
+    def get_translation_recorded(source_text, translation_option):
+        translation_requests.append(source_text)
+        return get_translation(source_text, translation_option)
+    mock_language_tools.cloud_language_tools.get_translation = get_translation_recorded
+
+    editor = config_gen.get_mock_editor_with_note(config_gen.note_id_1)
+    editor_manager = editor_processing.EditorManager(mock_language_tools)
+
+    dnt = mock_language_tools.deck_utils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    english_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_english)
+    pinyin_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_pinyin)
+    translation_option = mock_language_tools.get_batch_translation_setting_field(english_dntf)['translation_option']
+
+    mock_language_tools.anki_utils.defer_background_tasks = True
+    # user keeps typing before the first request is sent
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人', english_dntf, translation_option)
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人家', english_dntf, translation_option)
+    # identical request for another field shares the pending one
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人家', pinyin_dntf, translation_option)
+    assert len(mock_language_tools.anki_utils.deferred_background_tasks) == 2
+
+    mock_language_tools.anki_utils.run_deferred_background_tasks()
+
+    # the superseded request never got sent
+    assert translation_requests == ['老人家']
+    set_field_values = [(x['field_name'], x['text']) for x in mock_language_tools.anki_utils.editor_set_field_value_calls]
+    assert set_field_values == [
+        (config_gen.field_english, 'old people (long)'),
+        (config_gen.field_pinyin, 'old people (long)')
+    ]
+    assert editor_manager.pending_requests == {}
+
+    # a request which is already in flight gets dropped when it comes back stale
+    mock_language_tools.anki_utils.hide_loading_indicator_called = None
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人', english_dntf, translation_option)
+    task_fn, task_done_fn = mock_language_tools.anki_utils.deferred_background_tasks.pop()
+    result = task_fn()
+    editor_manager.load_translation(editor, config_gen.note_id_1, '', english_dntf, translation_option)
+    task_done_fn(testing_utils.MockFuture(result))
+    assert translation_requests == ['老人家', '老人']
+    assert mock_language_tools.anki_utils.editor_set_field_value_calls[-1]['text'] == ''
+    assert len(mock_language_tools.anki_utils.editor_set_field_value_calls) == 3
+    # clearing the source field hides the loading indicator of the stale request
+    assert mock_language_tools.anki_utils.hide_loading_indicator_called == True
+
+    # the request gets dropped as superseded, but the same request was asked for again before it came back
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人', english_dntf, translation_option)
+    task_fn, task_done_fn = mock_language_tools.anki_utils.deferred_background_tasks.pop()
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人家', english_dntf, translation_option)
+    result = task_fn()
+    assert result is editor_processing.REQUEST_SUPERSEDED
+    editor_manager.load_translation(editor, config_gen.note_id_1, '老人', pinyin_dntf, translation_option)
+    task_done_fn(testing_utils.MockFuture(result))
+    # the request for the pinyin field got sent after all
+    mock_language_tools.anki_utils.run_deferred_background_tasks()
+    assert translation_requests == ['老人家', '老人', '老人家', '老人']
+    set_field_values = [(x['field_name'], x['text']) for x in mock_language_tools.anki_utils.editor_set_field_value_calls[3:]]
+    assert sorted(set_field_values) == sorted([
+        (config_gen.field_english, 'old people (long)'),
+        (config_gen.field_pinyin, 'old people (short)')
+    ])
+    assert editor_manager.pending_requests == {}
+
+
 def test_editor_transliteration(qtbot):
     # pytest test_editor.py -rPP -k test_editor_transliteration
 
@@ -0,0 +1,57 @@
+import language_classifier
+
+def test_get_script(qtbot):
+    assert language_classifier.get_script('a') == 'latin'
+    assert language_classifier.get_script('é') == 'latin'
+    assert language_classifier.get_script('я') == 'cyrillic'
+    assert language_classifier.get_script('한') == 'hangul'
+    assert language_classifier.get_script('の') == 'hiragana'
+    assert language_classifier.get_script('カ') == 'katakana'
+    assert language_classifier.get_script('老') == 'han'
+    assert language_classifier.get_script('ก') == 'thai'
+    assert language_classifier.get_script('5') == None
+    assert language_classifier.get_script(' ') == None
+    assert language_classifier.get_script('!') == None
+
+def test_classify_single_language_scripts(qtbot):
+    assert language_classifier.classify(['안녕하세요', '감사합니다', '사랑해요', '학교에 갑니다']) == (True, 'ko')
+    assert language_classifier.classify(['สวัสดีครับ', 'ขอบคุณมากครับ', 'ไม่เป็นไร']) == (True, 'th')
+    assert language_classifier.classify(['καλημέρα', 'ευχαριστώ πολύ', 'τι κάνεις']) == (True, 'el')
+
+def test_classify_japanese(qtbot):
+    assert language_classifier.classify(['日本語を勉強しています', '東京に行きました', 'カタカナ']) == (True, 'ja')
+    # han only could be chinese or japanese
+    assert language_classifier.classify(['老人家', '你好', '电扇', '我们学习中文', '谢谢你的帮助', '图书馆']) == (False, None)
+
+def test_classify_cyrillic(qtbot):
+    assert language_classifier.classify(['мы были в этом городе', 'вы её видели', 'это был сын']) == (True, 'ru')
+    assert language_classifier.classify(['її батьківщина', 'я їду до Києва', 'моє ім\'я', 'дякую']) == (True, 'uk')
+    # not enough evidence either way
+    assert language_classifier.classify(['привет', 'как дела', 'хорошо', 'спасибо']) == (False, None)
+    assert language_classifier.classify(['Ђорђе је у кући', 'ћерка и син', 'хвала вам пуно', 'лепо јутро']) == (True, 'sr')
+    # languages outside the model which share its markers
+    # kyrgyz
+    assert language_classifier.classify(['Кыргызстан өлкөсү', 'мен сени сүйөм', 'жакшы күн', 'ырахмат сизге', 'эртең көрүшөбүз']) == (False, None)
+    # mongolian
+    assert language_classifier.classify(['сайн байна уу', 'баярлалаа', 'өнөөдөр цаг агаар сайхан', 'ээж аав', 'ыс ыс']) == (False, None)
+    # macedonian
+    assert language_classifier.classify(['Ќе одам во Скопје', 'љубов и пријателство', 'благодарам многу', 'џеб', 'ѓаволот', 'њива']) == (False, None)
+
+def test_classify_arabic(qtbot):
+    assert language_classifier.classify(['پدر و مادر', 'چطوری', 'خیلی ممنون', 'گربه کوچک', 'ژاله']) == (True, 'fa')
+    # pashto
+    assert language_classifier.classify(['زه په پښتو خبرې کوم', 'ستاسو نوم څه دی', 'ډېره مننه', 'ښه راغلاست', 'پلار او مور']) == (False, None)
+
+def test_classify_no_letters(qtbot):
+    assert language_classifier.classify(['123', '45.6', '7 / 8']) == (True, None)
+
+def test_classify_ambiguous(qtbot):
+    assert language_classifier.classify(['old people', 'hello', 'electric fan', 'the weather is nice today']) == (False, None)
+    # too short to say anything
+    assert language_classifier.classify(['한']) == (False, None)
+    # mixed scripts
+    assert language_classifier.classify(['안녕하세요 hello world', 'good morning 감사']) == (False, None)
+
+def test_classify_deterministic(qtbot):
+    field_sample = ['мы были в этом городе', 'вы её видели', 'это был сын']
+    assert len(set([language_classifier.classify(field_sample) for i in range(10)])) == 1
@@ -1,7 +1,15 @@
 import json
+import sqlite3
 import unittest
+import pytest
 import errors
+import constants
 import testing_utils
+import translation_cache
+import audio_store
+import detection_ledger
+import config_index
+import deck_utils
 
 class EmptyFieldConfigGenerator(testing_utils.TestConfigGenerator):
     def __init__(self):
@@ -134,6 +142,21 @@ def test_get_translation(qtbot):
     translated_text = mock_language_tools.get_translation(source_text, {'translation_key': 'de to en'})
     assert translated_text == 'under something'
 
+def test_get_translation_all(qtbot):
+    # pytest test_languagetools.py -k test_get_translation_all
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('text_replacement')
+
+    # the text gets processed once, and the processed text is what gets translated
+    mock_language_tools.cloud_language_tools.translate_all_result = {
+        'unter etwas': {'Azure': 'under something'}
+    }
+    assert mock_language_tools.get_translation_all('<b>unter etw</b>', 'de', 'en') == {'Azure': 'under something'}
+
+    with pytest.raises(errors.LanguageToolsValidationFieldEmpty):
+        mock_language_tools.get_translation_all('<br>', 'de', 'en')
+
 def test_get_transliteration(qtbot):
     # pytest test_languagetools.py -k test_get_transliteration
 
@@ -148,6 +171,664 @@ def test_get_transliteration(qtbot):
     transliterated_text = mock_language_tools.get_transliteration(source_text, {'transliteration_key': 'de to en'})
     assert transliterated_text == 'ˈʊntɐ ˈɛtvas'
 
+def test_translation_cache(qtbot):
+    # pytest test_languagetools.py -k test_translation_cache
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    translation_option = {'service': 'Azure', 'source_language_id': 'de', 'target_language_id': 'en'}
+    mock_language_tools.cloud_language_tools.translation_map = {
+        'unter': 'under'
+    }
+    assert mock_language_tools.get_translation('unter', translation_option) == 'under'
+    assert mock_language_tools.translation_cache.get_stats() == {'hits': 0, 'misses': 1}
+
+    # the second request is served from the cache, the cloud service is not called
+    mock_language_tools.cloud_language_tools.translation_map = {}
+    assert mock_language_tools.get_translation('unter', translation_option) == 'under'
+    assert mock_language_tools.translation_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    # key order of the option doesn't matter
+    reordered_option = {'target_language_id': 'en', 'source_language_id': 'de', 'service': 'Azure'}
+    assert mock_language_tools.get_translation('unter', reordered_option) == 'under'
+
+    # a different service is a different entry
+    mock_language_tools.cloud_language_tools.translation_map = {
+        'unter': 'beneath'
+    }
+    assert mock_language_tools.get_translation('unter', {'service': 'DeepL', 'source_language_id': 'de', 'target_language_id': 'en'}) == 'beneath'
+
+    # errors are not cached
+    mock_language_tools.cloud_language_tools.translation_error_map = {'fehler': 'service error'}
+    with pytest.raises(errors.LanguageToolsRequestError):
+        mock_language_tools.get_translation('fehler', translation_option)
+    mock_language_tools.cloud_language_tools.translation_error_map = {}
+    mock_language_tools.cloud_language_tools.translation_map = {'fehler': 'error'}
+    assert mock_language_tools.get_translation('fehler', translation_option) == 'error'
+
+    # bypass the cache
+    mock_language_tools.config[constants.CONFIG_TRANSLATION_CACHE_ENABLED] = False
+    mock_language_tools.cloud_language_tools.translation_map = {'unter': 'below'}
+    assert mock_language_tools.get_translation('unter', translation_option) == 'below'
+
+def test_get_translation_batch(qtbot):
+    # pytest test_languagetools.py -k test_get_translation_batch
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+    mock_language_tools.config[constants.CONFIG_TRANSLATION_BATCH_SIZE] = 2
+    cloud_language_tools = mock_language_tools.cloud_language_tools
+
+    translation_option = {'service': 'Azure', 'source_language_id': 'de', 'target_language_id': 'en'}
+    cloud_language_tools.translation_map = {
+        'eins': 'one',
+        'zwei': 'two',
+        'drei': 'three',
+        'vier': 'four',
+        'fünf': 'five'
+    }
+    cloud_language_tools.translation_error_map = {'drei': 'service error'}
+
+    def get_results(source_text_list):
+        results = {}
+        for index, result, exception in mock_language_tools.get_translation_batch(source_text_list, translation_option):
+            results[index] = str(exception) if exception != None else result
+        return results
+
+    # the chunk containing 'drei' fails and gets retried one text at a time
+    assert get_results(['eins', 'zwei', 'drei', '', 'vier']) == {
+        0: 'one',
+        1: 'two',
+        2: 'Could not load translation: service error',
+        3: 'Field is empty',
+        4: 'four'
+    }
+    assert sorted(cloud_language_tools.translation_batch_requests) == [['drei', 'vier'], ['eins', 'zwei']]
+
+    # server doesn't have the batch endpoint, cached results are not requested again
+    cloud_language_tools.translation_batch_requests = []
+    cloud_language_tools.translation_batch_supported = False
+    assert get_results(['fünf', 'eins']) == {0: 'five', 1: 'one'}
+    assert cloud_language_tools.translation_batch_requests == []
+    assert mock_language_tools.translation_cache.get_stats()['hits'] == 1
+
+def test_translation_cache_eviction(qtbot, tmp_path):
+    # pytest test_languagetools.py -k test_translation_cache_eviction
+
+    cache = translation_cache.TranslationCache(str(tmp_path / 'cache.sqlite3'), 3, 30)
+    # record every access
+    cache.ACCESS_UPDATE_INTERVAL_SECONDS = 0
+    for i in range(5):
+        cache.put(f'key{i}', f'value{i}')
+    cache.get('key0')
+    cache.evict_locked()
+    # least recently used entries are removed first
+    assert cache.entry_count() == 3
+    assert cache.get('key0') == 'value0'
+    assert cache.get('key1') == None
+
+    # expired entries are removed
+    cache.max_age_seconds = -1
+    assert cache.get('key0') == None
+    cache.evict_locked()
+    assert cache.entry_count() == 0
+    cache.close()
+
+def test_translation_cache_access_times(qtbot, tmp_path):
+    # pytest test_languagetools.py -k test_translation_cache_access_times
+
+    cache = translation_cache.TranslationCache(str(tmp_path / 'cache.sqlite3'), 10, 30)
+    cache.put('key0', 'value0')
+    # accessed recently, nothing to record
+    assert cache.get('key0') == 'value0'
+    assert cache.pending_accesses == {}
+
+    # accessed a while ago, the access time gets written in a batch, not on every lookup
+    def get_last_access():
+        connection = sqlite3.connect(str(tmp_path / 'cache.sqlite3'))
+        last_access = connection.execute('SELECT last_access FROM results WHERE key = ?', ('key0',)).fetchone()[0]
+        connection.close()
+        return last_access
+    cache.get_connection().execute('UPDATE results SET last_access = 0')
+    cache.get_connection().commit()
+    assert cache.get('key0') == 'value0'
+    assert list(cache.pending_accesses.keys()) == ['key0']
+    assert get_last_access() == 0
+    cache.flush()
+    assert cache.pending_accesses == {}
+    assert get_last_access() > 0
+    cache.close()
+    assert cache.connection == None
+
+def test_audio_store(qtbot, tmp_path):
+    # pytest test_languagetools.py -k test_audio_store
+
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    path_1 = store.put('hash1', b'12345')
+    store.put('hash2', b'12345')
+    assert store.get('hash1') == path_1
+    # over budget, the least recently used file goes
+    store.put('hash3', b'12345')
+    assert store.get('hash2') == None
+    assert store.get('hash1') == path_1
+    assert store.total_bytes() == 10
+    # the index only gets written out on flush
+    assert not (tmp_path / audio_store.AudioStore.INDEX_FILENAME).exists()
+    store.flush()
+
+    # a new instance picks up the index
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    assert store.get('hash3') != None
+    assert store.get('hash2') == None
+
+    # without an index, existing files are picked up
+    (tmp_path / audio_store.AudioStore.INDEX_FILENAME).unlink()
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    assert store.get('hash1') == path_1
+
+    # files written after the last flush are picked up, and count towards the limit
+    store.flush()
+    store.put('hash4', b'12345')
+    store.put('hash5', b'1')
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    assert store.get('hash4') != None
+    assert store.total_bytes() <= 10
+    assert len(list(tmp_path.glob('languagetools-*.mp3'))) == 2
+    # files removed behind our back get dropped from the index
+    store.flush()
+    (tmp_path / store.get_filename('hash4')).unlink()
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    assert store.total_bytes() == 1
+
+    # an unreadable index gets rebuilt from the directory
+    (tmp_path / audio_store.AudioStore.INDEX_FILENAME).write_text('{')
+    store = audio_store.AudioStore(str(tmp_path), 10)
+    assert store.get('hash5') != None
+    assert store.total_bytes() == 1
+
+    store.clear()
+    assert store.get('hash1') == None
+    assert list(tmp_path.glob('languagetools-*.mp3')) == []
+
+def test_get_tts_audio_dedupe(qtbot):
+    # pytest test_languagetools.py -k test_get_tts_audio_dedupe
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    # key order in options doesn't matter
+    hash_1 = mock_language_tools.get_hash_for_audio_request('老人家', 'Azure', 'voice1', {'rate': 1, 'pitch': 2})
+    hash_2 = mock_language_tools.get_hash_for_audio_request('老人家', 'Azure', 'voice1', {'pitch': 2, 'rate': 1})
+    assert hash_1 == hash_2
+
+    # the file is already in the collection, don't download or add it again
+    collection_filename = mock_language_tools.audio_store.get_filename(hash_1)
+    mock_language_tools.anki_utils.media_folder_files = {collection_filename: '/collection.media/' + collection_filename}
+    filename = mock_language_tools.get_tts_audio('老人家', 'Azure', 'zh_cn', 'voice1', {'pitch': 2, 'rate': 1})
+    assert filename == '/collection.media/' + collection_filename
+    assert not hasattr(mock_language_tools.cloud_language_tools, 'requested_audio')
+
+    result = mock_language_tools.add_audio_file_to_collection(filename)
+    assert result['sound_tag'] == f'[sound:{collection_filename}]'
+    assert mock_language_tools.anki_utils.added_media_file == None
+
+def test_language_data_cache(qtbot, tmp_path, monkeypatch):
+    # pytest test_languagetools.py -k test_language_data_cache
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+    monkeypatch.setattr(mock_language_tools, 'get_user_files_dir', lambda: str(tmp_path))
+    cloud_language_tools = mock_language_tools.cloud_language_tools
+
+    # nothing on disk, full request
+    cloud_language_tools.language_data_request_etags = []
+    mock_language_tools.language_data = None
+    mock_language_tools.load_language_data()
+    assert cloud_language_tools.language_data_request_etags == [None]
+    assert (tmp_path / constants.LANGUAGE_DATA_CACHE_FILENAME).exists()
+
+    # cached copy is used, revalidation finds it's up to date
+    mock_language_tools.language_data = None
+    mock_language_tools.load_language_data()
+    assert cloud_language_tools.language_data_request_etags == [None, 'etag-1']
+    assert mock_language_tools.language_list == cloud_language_tools.language_data['language_list']
+
+    # server has a newer version
+    cloud_language_tools.language_data = dict(cloud_language_tools.language_data)
+    cloud_language_tools.language_data['language_list'] = {'en': 'English'}
+    cloud_language_tools.language_data_etag = 'etag-2'
+    mock_language_tools.language_data = None
+    mock_language_tools.load_language_data()
+    assert mock_language_tools.language_list == {'en': 'English'}
+    with open(tmp_path / constants.LANGUAGE_DATA_CACHE_FILENAME) as f:
+        assert json.load(f)['etag'] == 'etag-2'
+
+def test_get_translation_options(qtbot):
+    # pytest test_languagetools.py -k test_get_translation_options
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    def scan_translation_options(source_language, target_language):
+        # reference implementation, scanning the full list
+        translation_options = []
+        translation_language_list = mock_language_tools.translation_language_list
+        for source_option in [x for x in translation_language_list if x['language_code'] == source_language]:
+            target_options = [x for x in translation_language_list if x['language_code'] == target_language and x['service'] == source_option['service']]
+            if len(target_options) == 1:
+                translation_options.append(mock_language_tools.build_translation_option(source_option['service'], source_option['language_id'], target_options[0]['language_id']))
+        return translation_options
+
+    language_codes = set([x['language_code'] for x in mock_language_tools.translation_language_list]) | set(['xx'])
+    for source_language in language_codes:
+        for target_language in language_codes:
+            expected = scan_translation_options(source_language, target_language)
+            assert mock_language_tools.get_translation_options(source_language, target_language) == expected
+            # second lookup is memoized
+            assert mock_language_tools.get_translation_options(source_language, target_language) == expected
+
+    assert mock_language_tools.get_translation_options('zh_cn', 'en') != []
+    assert mock_language_tools.get_transliteration_options('xx') == []
+    assert mock_language_tools.get_tokenization_options('xx') == []
+
+def test_perform_language_detection_batch(qtbot):
+    # pytest test_languagetools.py -k test_perform_language_detection_batch
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    dntf_list = mock_language_tools.get_populated_dntf()
+    results = {}
+    for index, language, exception in mock_language_tools.perform_language_detection_batch(dntf_list, lambda: False):
+        results[dntf_list[index].field_name] = (language, exception)
+
+    assert len(results) == len(dntf_list)
+    assert results[config_gen.field_chinese] == ('zh_cn', None)
+    assert results[config_gen.field_english] == ('en', None)
+    # no data in the sound field
+    assert results[config_gen.field_sound] == (None, None)
+    # same results as the one field at a time version
+    for dntf in dntf_list:
+        if results[dntf.field_name][1] == None:
+            assert results[dntf.field_name][0] == mock_language_tools.perform_language_detection_deck_note_type_field(dntf)
+
+    # interrupted before starting
+    assert list(mock_language_tools.perform_language_detection_batch(dntf_list, lambda: True)) == []
+
+    # all the fields with data went out in a single batch request
+    clt = mock_language_tools.cloud_language_tools
+    assert len(clt.language_detection_batch_requests) == 1
+    assert len(clt.language_detection_batch_requests[0]) == len([x for x in results.values() if x[0] != None])
+
+    # server without the batch endpoint, one request per field
+    clt.language_detection_batch_supported = False
+    clt.language_detection_requests = []
+    fallback_results = {}
+    for index, language, exception in mock_language_tools.perform_language_detection_batch(dntf_list, lambda: False):
+        fallback_results[dntf_list[index].field_name] = (language, exception)
+    assert fallback_results == results
+    assert len(clt.language_detection_requests) == len(clt.language_detection_batch_requests[0])
+
+def test_language_detection_local(qtbot):
+    # pytest test_languagetools.py -k test_language_detection_local
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    korean_sample = ['안녕하세요', '감사합니다', '사랑해요', '학교에 갑니다']
+    # the server doesn't know about this language
+    assert mock_language_tools.classify_field_sample_locally(korean_sample) == (False, None)
+    mock_language_tools.language_list['ko'] = 'Korean'
+    assert mock_language_tools.classify_field_sample_locally(korean_sample) == (True, 'ko')
+    # language data not loaded yet, leave it to the API
+    language_data = mock_language_tools.language_data
+    mock_language_tools.language_data = None
+    assert mock_language_tools.classify_field_sample_locally(korean_sample) == (False, None)
+    mock_language_tools.language_data = language_data
+
+    dntf_list = mock_language_tools.get_populated_dntf()
+    field_samples = {
+        config_gen.field_chinese: korean_sample,
+        config_gen.field_english: ['hello', 'old people'],
+        config_gen.field_sound: ['123', '456'],
+        config_gen.field_pinyin: []
+    }
+    mock_language_tools.get_field_samples = lambda dntf, sample_size: field_samples[dntf.field_name]
+    results = {}
+    for index, language, exception in mock_language_tools.perform_language_detection_batch(dntf_list, lambda: False):
+        results[dntf_list[index].field_name] = language
+    assert results == {
+        config_gen.field_chinese: 'ko',
+        config_gen.field_english: 'en',
+        config_gen.field_sound: None,
+        config_gen.field_pinyin: None
+    }
+    # only the english field needed the API
+    clt = mock_language_tools.cloud_language_tools
+    assert clt.language_detection_batch_requests == []
+    assert clt.language_detection_requests == [['hello', 'old people']]
+
+def test_language_detection_incremental(qtbot, tmp_path):
+    # pytest test_languagetools.py -k test_language_detection_incremental
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('no_language_mapping')
+    mock_language_tools.detection_ledger = detection_ledger.DetectionLedger(str(tmp_path), constants.LANGUAGE_DETECTION_MAX_DRIFT, constants.LANGUAGE_DETECTION_MAX_NGRAM_DRIFT)
+    clt = mock_language_tools.cloud_language_tools
+    note_count = 100
+    mock_language_tools.anki_utils.get_deckid_modelid_note_counts = lambda: {(config_gen.deck_id, config_gen.model_id): note_count}
+
+    sampled_fields = []
+    field_sample_overrides = {}
+    get_field_samples = mock_language_tools.get_field_samples
+    def get_field_samples_logged(dntf, sample_size):
+        sampled_fields.append(dntf.field_name)
+        if dntf.field_name in field_sample_overrides:
+            return field_sample_overrides[dntf.field_name]
+        return get_field_samples(dntf, sample_size)
+    mock_language_tools.get_field_samples = get_field_samples_logged
+
+    def run_detection():
+        sampled_fields.clear()
+        clt.language_detection_batch_requests = []
+        results = {}
+        for index, language, exception in mock_language_tools.perform_language_detection_batch(dntf_list, lambda: False, incremental=True):
+            assert exception == None
+            results[dntf_list[index]] = language
+        return results
+
+    dntf_list = mock_language_tools.get_populated_dntf()
+    dntf_chinese = config_gen.get_dntf_chinese()
+    expected_results = run_detection()
+    assert expected_results[dntf_chinese] == 'zh_cn'
+    assert len(clt.language_detection_batch_requests) == 1
+    # detection results which didn't get saved get detected again
+    run_detection()
+    assert len(clt.language_detection_batch_requests) == 1
+
+    for dntf, language in expected_results.items():
+        mock_language_tools.store_language_detection_result(dntf, language)
+
+    # nothing changed, fields get sampled but not detected again
+    assert run_detection() == expected_results
+    assert len(sampled_fields) == len(dntf_list)
+    assert clt.language_detection_batch_requests == []
+
+    # a few notes were added, the content looks the same
+    note_count = 105
+    results = run_detection()
+    assert results == expected_results
+    assert len(sampled_fields) == len(dntf_list)
+    assert clt.language_detection_batch_requests == []
+
+    # the note type gained many notes
+    note_count = 300
+    run_detection()
+    assert len(clt.language_detection_batch_requests) == 1
+
+    # the language was changed by hand
+    mock_language_tools.store_language_detection_result(dntf_chinese, 'zh_tw')
+    request_count = len(clt.language_detection_requests)
+    assert run_detection()[dntf_chinese] == 'zh_cn'
+    assert clt.language_detection_requests[request_count:] == [get_field_samples(dntf_chinese, constants.LANGUAGE_DETECTION_SAMPLE_SIZE)]
+
+    mock_language_tools.store_language_detection_result(dntf_chinese, 'zh_cn')
+
+    # the content of a field changes language, within the same script
+    french_sample = ['le vieil homme', 'le marché du matin', 'acheter du pain', 'les enfants jouaient dans le jardin',
+        'la maison des voisins', 'pendant de nombreuses années', 'sans aucun problème', 'toujours aimables']
+    german_sample = ['der alte mann', 'der markt am morgen', 'brot kaufen', 'die kinder spielten im garten',
+        'das haus der nachbarn', 'seit vielen jahren', 'ohne ärger', 'immer freundlich']
+    clt.language_detection_result[french_sample[0]] = 'fr'
+    clt.language_detection_result[french_sample[1]] = 'fr'
+    clt.language_detection_result[german_sample[0]] = 'de'
+    dntf_english = [dntf for dntf in dntf_list if dntf.field_name == config_gen.field_english][0]
+    field_sample_overrides[config_gen.field_english] = french_sample
+    note_count = 310
+    assert run_detection()[dntf_english] == 'fr'
+    mock_language_tools.store_language_detection_result(dntf_english, 'fr')
+    # another random sample of the same field
+    field_sample_overrides[config_gen.field_english] = french_sample[1:] + ['le pain et le lait']
+    note_count = 320
+    request_count = len(clt.language_detection_requests)
+    assert run_detection()[dntf_english] == 'fr'
+    assert len(clt.language_detection_requests) == request_count
+    assert clt.language_detection_batch_requests == []
+    field_sample_overrides[config_gen.field_english] = german_sample
+    note_count = 330
+    assert run_detection()[dntf_english] == 'de'
+    mock_language_tools.store_language_detection_result(dntf_english, 'de')
+    # notes edited in place, the note count doesn't change
+    field_sample_overrides[config_gen.field_english] = french_sample
+    assert run_detection()[dntf_english] == 'fr'
+    mock_language_tools.store_language_detection_result(dntf_english, 'fr')
+    # a field which was empty gets filled in, by a translation rule for example
+    dntf_sound = [dntf for dntf in dntf_list if dntf.field_name == config_gen.field_sound][0]
+    field_sample_overrides[config_gen.field_sound] = []
+    assert run_detection()[dntf_sound] == None
+    mock_language_tools.store_language_detection_result(dntf_sound, None)
+    assert run_detection()[dntf_sound] == None
+    field_sample_overrides[config_gen.field_sound] = german_sample
+    assert run_detection()[dntf_sound] == 'de'
+
+    # the ledger is kept on disk
+    mock_language_tools.detection_ledger.flush()
+    reloaded_ledger = detection_ledger.DetectionLedger(str(tmp_path), constants.LANGUAGE_DETECTION_MAX_DRIFT, constants.LANGUAGE_DETECTION_MAX_NGRAM_DRIFT)
+    assert reloaded_ledger.get_entry(mock_language_tools.get_field_key(dntf_chinese))['language'] == 'zh_cn'
+
+def test_deck_utils_cache(qtbot):
+    # pytest test_languagetools.py -k test_deck_utils_cache
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+    deckutils = mock_language_tools.deck_utils
+
+    dnt = deckutils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    assert deckutils.build_deck_note_type(config_gen.deck_id, config_gen.model_id) is dnt
+    dntf = deckutils.build_deck_note_type_field(config_gen.deck_id, config_gen.model_id, config_gen.field_english)
+    assert dntf.deck_note_type is dnt
+    assert deckutils.get_dntf_from_fieldindex(dnt, 1) is dntf
+    assert deckutils.get_field_id(dntf) == 1
+    assert deckutils.get_field_names(dnt) == config_gen.all_fields
+
+    # objects built outside of DeckUtils still compare equal
+    assert deckutils.build_dntf_from_dnt(deck_utils.DeckNoteType(config_gen.deck_id, config_gen.deck_name, config_gen.model_id, config_gen.model_name), config_gen.field_english) == dntf
+
+    # rename the note type, cache still has the old name until invalidated
+    mock_language_tools.anki_utils.models[config_gen.model_id]['name'] = 'renamed'
+    assert deckutils.build_deck_note_type(config_gen.deck_id, config_gen.model_id).model_name == config_gen.model_name
+    deckutils.invalidate_cache()
+    renamed_dnt = deckutils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    assert renamed_dnt.model_name == 'renamed'
+    assert renamed_dnt is not dnt
+
+def test_populated_index(qtbot):
+    # pytest test_languagetools.py -k test_populated_index
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+    anki_utils = mock_language_tools.anki_utils
+    deckutils = mock_language_tools.deck_utils
+
+    scan_count = 0
+    get_deckid_modelid_pairs = anki_utils.get_deckid_modelid_pairs
+    def get_deckid_modelid_pairs_counted():
+        nonlocal scan_count
+        scan_count += 1
+        return get_deckid_modelid_pairs()
+    anki_utils.get_deckid_modelid_pairs = get_deckid_modelid_pairs_counted
+
+    dntf_list = mock_language_tools.get_populated_dntf()
+    assert [dntf.field_name for dntf in dntf_list] == config_gen.all_fields
+    assert mock_language_tools.get_populated_dntf() == dntf_list
+    assert list(mock_language_tools.get_populated_decks().keys()) == [config_gen.deck_name]
+    assert scan_count == 1
+
+    # a note got added to another deck
+    other_deck_id = config_gen.deck_id + 1
+    anki_utils.decks[other_deck_id] = {'name': 'other deck'}
+    deckutils.note_added(other_deck_id, config_gen.model_id)
+    assert list(mock_language_tools.get_populated_decks().keys()) == [config_gen.deck_name, 'other deck']
+    assert scan_count == 1
+
+    # the note got deleted again
+    deckutils.notes_removed()
+    assert list(mock_language_tools.get_populated_decks().keys()) == [config_gen.deck_name]
+    assert scan_count == 2
+
+    # a template with a deck override sends cards somewhere else, the index gets rebuilt
+    anki_utils.models[config_gen.model_id]['tmpls'] = [{'name': 'Card 1', 'did': other_deck_id}]
+    deckutils.note_added(config_gen.deck_id, config_gen.model_id)
+    mock_language_tools.get_populated_dntf()
+    assert scan_count == 3
+    del anki_utils.models[config_gen.model_id]['tmpls']
+
+    # cards were moved around, the collection gets scanned again
+    deckutils.invalidate_populated_index()
+    mock_language_tools.get_populated_dntf()
+    assert scan_count == 4
+    deckutils.invalidate_cache()
+    mock_language_tools.get_populated_dntf()
+    assert scan_count == 5
+
+    # a note gets added while the collection is being scanned, the scan doesn't see it yet
+    during_scan = []
+    def get_deckid_modelid_pairs_concurrent():
+        pairs = get_deckid_modelid_pairs_counted()
+        while len(during_scan) > 0:
+            during_scan.pop(0)()
+        return pairs
+    anki_utils.get_deckid_modelid_pairs = get_deckid_modelid_pairs_concurrent
+    deckutils.invalidate_populated_index()
+    during_scan.append(lambda: deckutils.note_added(other_deck_id, config_gen.model_id))
+    assert list(mock_language_tools.get_populated_decks().keys()) == [config_gen.deck_name, 'other deck']
+    assert scan_count == 6
+    # the index gets invalidated while the collection is being scanned, the scan result is stale
+    deckutils.invalidate_populated_index()
+    during_scan.append(lambda: deckutils.invalidate_populated_index())
+    assert list(mock_language_tools.get_populated_decks().keys()) == [config_gen.deck_name]
+    assert scan_count == 8
+
+def test_get_field_rules(qtbot):
+    # pytest test_languagetools.py -k test_get_field_rules
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('batch_audio_translation_transliteration')
+
+    dnt = mock_language_tools.deck_utils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    chinese_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_chinese)
+    english_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_english)
+
+    field_rules = mock_language_tools.get_field_rules(chinese_dntf)
+    translation_option = mock_language_tools.get_batch_translation_setting_field(english_dntf)['translation_option']
+    assert field_rules.translation == [(config_gen.field_english, translation_option)]
+    assert [x[0] for x in field_rules.transliteration] == [config_gen.field_pinyin]
+    assert field_rules.audio == [config_gen.field_sound]
+    assert mock_language_tools.get_field_rules(english_dntf).is_empty()
+    # index is reused
+    assert mock_language_tools.get_field_rules(chinese_dntf) is field_rules
+
+    # storing a rule updates the index in place
+    index = mock_language_tools.get_config_index()
+    sound_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_sound)
+    mock_language_tools.store_batch_translation_setting(sound_dntf, config_gen.field_english, translation_option)
+    assert mock_language_tools.get_field_rules(english_dntf).translation == [(config_gen.field_sound, translation_option)]
+    # the target field of a rule gets a new source field
+    pinyin_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_pinyin)
+    transliteration_option = mock_language_tools.get_batch_transliteration_settings(dnt)[config_gen.field_pinyin]['transliteration_option']
+    mock_language_tools.store_batch_transliteration_setting(pinyin_dntf, config_gen.field_english, transliteration_option)
+    mock_language_tools.store_batch_audio_setting(sound_dntf, config_gen.field_english)
+    mock_language_tools.remove_translation_setting(english_dntf)
+    mock_language_tools.store_language_detection_result(english_dntf, 'fr')
+    assert mock_language_tools.get_config_index() is index
+    assert mock_language_tools.get_field_rules(chinese_dntf).is_empty()
+    assert mock_language_tools.get_field_rules(english_dntf).audio == [config_gen.field_sound]
+    # same as an index built from scratch
+    rebuilt_index = config_index.ConfigIndex(mock_language_tools.config)
+    assert {key: vars(rules) for key, rules in index.field_rules.items()} == {key: vars(rules) for key, rules in rebuilt_index.field_rules.items()}
+    assert index.field_languages == rebuilt_index.field_languages
+    assert {language: sorted(keys) for language, keys in index.fields_by_language.items() if len(keys) > 0} == {language: sorted(keys) for language, keys in rebuilt_index.fields_by_language.items()}
+    mock_language_tools.remove_transliteration_setting(pinyin_dntf)
+    mock_language_tools.remove_audio_setting(sound_dntf)
+    mock_language_tools.remove_translation_setting(sound_dntf)
+    assert mock_language_tools.get_field_rules(english_dntf).is_empty()
+    assert index.field_rules == {}
+
+    # so does replacing the config
+    mock_language_tools.config = config_gen.get_default_config()
+    assert mock_language_tools.get_field_rules(chinese_dntf).is_empty()
+
+def test_store_text_processing_settings_invalid(qtbot):
+    # pytest test_languagetools.py -k test_store_text_processing_settings_invalid
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+    text_utils_before = mock_language_tools.text_utils
+
+    with pytest.raises(errors.TextReplacementValidationError):
+        mock_language_tools.store_text_processing_settings({'replacements': [{'pattern': 'yoyo)', 'replace': 'rep'}]})
+    assert mock_language_tools.anki_utils.written_config == None
+    assert mock_language_tools.text_utils is text_utils_before
+
+def test_save_config_deferred(qtbot):
+    # pytest test_languagetools.py -k test_save_config_deferred
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    # the timer doesn't fire until we say so
+    pending_timer_tasks = []
+    mock_language_tools.anki_utils.call_on_timer_expire = lambda timer, task: pending_timer_tasks.append(task)
+    config_writes = []
+    mock_language_tools.anki_utils.write_config = lambda config: config_writes.append(json.dumps(config))
+
+    dnt = mock_language_tools.deck_utils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    for field_name in config_gen.all_fields:
+        dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, field_name)
+        mock_language_tools.store_language_detection_result(dntf, 'fr')
+    assert config_writes == []
+    assert mock_language_tools.config_dirty == True
+
+    # timer expires, single write with all the changes
+    pending_timer_tasks[-1]()
+    assert len(config_writes) == 1
+    assert json.loads(config_writes[0])[constants.CONFIG_DECK_LANGUAGES][config_gen.model_name][config_gen.deck_name][config_gen.field_pinyin] == 'fr'
+
+    # nothing left to write
+    mock_language_tools.flush_user_files()
+    assert len(config_writes) == 1
+
+    # explicit flush, on profile close
+    mock_language_tools.set_live_update_delay(1500)
+    mock_language_tools.flush_user_files()
+    assert len(config_writes) == 2
+    assert json.loads(config_writes[1])[constants.CONFIG_LIVE_UPDATE_DELAY] == 1500
+
+def test_config_index_languages(qtbot):
+    # pytest test_languagetools.py -k test_config_index_languages
+
+    config_gen = testing_utils.TestConfigGenerator()
+    mock_language_tools = config_gen.build_languagetools_instance('default')
+
+    dnt = mock_language_tools.deck_utils.build_deck_note_type(config_gen.deck_id, config_gen.model_id)
+    english_dntf = mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_english)
+    assert mock_language_tools.get_language(english_dntf) == 'en'
+    assert mock_language_tools.get_language(mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, 'unknown field')) == None
+
+    index = mock_language_tools.get_config_index()
+    assert index.get_fields_for_language('zh_cn') == [mock_language_tools.get_field_key(mock_language_tools.deck_utils.build_dntf_from_dnt(dnt, config_gen.field_chinese))]
+    assert index.get_fields_for_language('xx') == []
+
+    mock_language_tools.store_language_detection_result(english_dntf, 'fr')
+    assert mock_language_tools.get_language(english_dntf) == 'fr'
+    assert mock_language_tools.get_config_index().get_fields_for_language('en') == []
+    assert mock_language_tools.get_config_index().get_fields_for_language('fr') == [mock_language_tools.get_field_key(english_dntf)]
+    # serialized layout is unchanged
+    assert mock_language_tools.config[constants.CONFIG_DECK_LANGUAGES][config_gen.model_name][config_gen.deck_name][config_gen.field_english] == 'fr'
+
+    assert sorted(mock_language_tools.get_field_samples_for_language('fr', 10)) == sorted([x.field_dict[config_gen.field_english] for x in config_gen.notes_by_id.values() if len(x.field_dict[config_gen.field_english]) > 0])
+
 def test_get_voice_for_field(qtbot):
     # pytest test_languagetools.py -k test_get_voice_for_field
 
@@ -1,4 +1,7 @@
+import random
+import pytest
 import text_utils
+import errors
 import constants
 import testing_utils
 
@@ -119,4 +122,85 @@ def test_replacement_simple(qtbot):
     assert text_replacement.to_dict() == expected_dict
 
     text_replacement2 = text_utils.TextReplacement(expected_dict)
-    assert text_replacement2.process('yoyo)', constants.TransformationType.Audio) == 'rep'
\ No newline at end of file
+    assert text_replacement2.process('yoyo)', constants.TransformationType.Audio) == 'rep'
+
+def test_replace_fused(qtbot):
+    # consecutive simple replacements get fused, the result must be the same as applying them one after the other
+    random.seed(42)
+    alphabet = 'abc /'
+    for iteration in range(500):
+        replacements = []
+        for i in range(random.randint(1, 5)):
+            replacements.append({
+                'pattern': ''.join(random.choices(alphabet, k=random.randint(1, 3))),
+                'replace': ''.join(random.choices(alphabet, k=random.randint(0, 3))),
+                'replace_type': 'simple'
+            })
+        utils = text_utils.TextUtils(testing_utils.MockAnkiUtils({}), {'replacements': replacements})
+        for j in range(5):
+            text = 'x' + ''.join(random.choices(alphabet, k=random.randint(0, 12))) + 'x'
+            expected = text
+            for replacement in replacements:
+                expected = expected.replace(replacement['pattern'], replacement['replace'])
+            assert utils.process(text, constants.TransformationType.Audio) == expected, f'{replacements} {text}'
+
+    # single character replacements turn into a single translate pass
+    utils = text_utils.TextUtils(testing_utils.MockAnkiUtils({}), {'replacements': [
+        {'pattern': '/', 'replace': ' ', 'replace_type': 'simple'},
+        {'pattern': ';', 'replace': ',', 'replace_type': 'simple'},
+        {'pattern': '[0-9]+', 'replace': 'N'},
+        {'pattern': '(', 'replace': '', 'replace_type': 'simple'},
+    ]})
+    assert len(utils.pipelines[constants.TransformationType.Audio]) == 3
+    assert utils.process('a/b;c 12 (d', constants.TransformationType.Audio) == 'a b,c N d'
+
+def test_replacement_validate(qtbot):
+    text_utils.TextReplacement({'pattern': '[0-9]+', 'replace': r'\g<0>!'}).validate()
+    text_utils.TextReplacement({'pattern': 'yoyo)', 'replace': 'rep', 'replace_type': 'simple'}).validate()
+    with pytest.raises(errors.TextReplacementValidationError):
+        text_utils.TextReplacement({'pattern': 'yoyo)', 'replace': 'rep'}).validate()
+    with pytest.raises(errors.TextReplacementValidationError):
+        text_utils.TextReplacement({'pattern': 'yoyo', 'replace': r'\9'}).validate()
+
+    # pattern edited in place gets recompiled
+    text_replacement = text_utils.TextReplacement({'pattern': 'yoyo)', 'replace': 'rep'})
+    assert text_replacement.process('yoyo', constants.TransformationType.Audio) == 'yoyo'
+    text_replacement.pattern = 'yo+'
+    assert text_replacement.process('yoyo', constants.TransformationType.Audio) == 'reprep'
+
+def test_process_cache(qtbot):
+    anki_utils = testing_utils.MockAnkiUtils({})
+    calls = []
+    html_to_text_line = anki_utils.html_to_text_line
+    def html_to_text_line_recorded(html):
+        calls.append(html)
+        return html_to_text_line(html)
+    anki_utils.html_to_text_line = html_to_text_line_recorded
+    utils = text_utils.TextUtils(anki_utils, {'replacements': [{'pattern': ' / ', 'replace': ' '}]})
+
+    assert utils.is_empty('<b>word1</b> / word2') == False
+    assert utils.process('<b>word1</b> / word2', constants.TransformationType.Audio) == 'word1 word2'
+    assert utils.process('<b>word1</b> / word2', constants.TransformationType.Audio) == 'word1 word2'
+    assert utils.process('<b>word1</b> / word2', constants.TransformationType.Translation) == 'word1 word2'
+    assert calls == ['<b>word1</b> / word2']
+
+def test_preprocess(qtbot):
+    utils = text_utils.TextUtils(testing_utils.MockAnkiUtils({}), {'replacements': [{'pattern': 'word2', 'replace': ''}]})
+
+    preprocessed_text = utils.preprocess('<b>word1</b> / word2')
+    assert preprocessed_text.text == 'word1 / word2'
+    assert preprocessed_text.empty == False
+    assert utils.preprocess(preprocessed_text) is preprocessed_text
+    assert utils.preprocess('<b>word1</b> / word2') is preprocessed_text
+    assert preprocessed_text.get_hash() == utils.preprocess('word1 / word2').get_hash()
+
+    assert utils.process(preprocessed_text, constants.TransformationType.Audio) == 'word1 / '
+    assert preprocessed_text.processed[constants.TransformationType.Audio] == 'word1 / '
+
+    assert utils.preprocess('<br>').empty == True
+    assert utils.is_empty(utils.preprocess('&nbsp;')) == True
+    assert utils.is_processed_text_empty(utils.process('word2', constants.TransformationType.Audio)) == True
+    # html left after the replacements isn't text
+    assert utils.is_processed_text_empty('<br>') == True
+    assert utils.is_processed_text_empty(' &nbsp;') == True
+    assert utils.is_processed_text_empty('<b>word1</b>') == False
@@ -1,9 +1,11 @@
 import logging
 import json
 import re
+import tempfile
 
 import constants
 import deck_utils
+import errors
 import languagetools
 
 class MockFuture():
@@ -20,8 +22,13 @@ class MockAnkiUtils():
         self.written_config = None
         self.editor_set_field_value_calls = []
         self.added_media_file = None
+        # files already present in the collection media folder
+        self.media_folder_files = {}
         self.show_loading_indicator_called = None
         self.hide_loading_indicator_called = None
+        # when set, run_in_background queues tasks until run_deferred_background_tasks is called
+        self.defer_background_tasks = False
+        self.deferred_background_tasks = []
 
         # exception handling
         self.last_exception = None
@@ -36,6 +43,9 @@ class MockAnkiUtils():
     def get_green_stylesheet(self):
         return constants.GREEN_STYLESHEET
 
+    def get_green_color(self):
+        return constants.GREEN_COLOR
+
     def get_red_stylesheet(self):
         return constants.RED_STYLESHEET
 
@@ -52,15 +62,22 @@ class MockAnkiUtils():
     def get_deckid_modelid_pairs(self):
         return self.deckid_modelid_pairs
 
-    def get_noteids_for_deck_note_type(self, deck_id, model_id, sample_size):
-
-        note_id_list = self.notes[deck_id][model_id].keys()
+    def get_deckid_modelid_note_counts(self):
+        return {(deck_id, model_id): len(self.notes[deck_id][model_id]) for deck_id, model_id in self.deckid_modelid_pairs}
 
-        return note_id_list
+    def get_field_sample_values(self, deck_id, model_id, field_name, sample_size):
+        field_names = [field['name'] for field in self.models[model_id]['flds']]
+        if field_name not in field_names:
+            raise errors.AnkiItemNotFoundError(f'field {field_name} not found')
+        note_id_list = list(self.notes[deck_id][model_id].keys())[:sample_size]
+        return [self.notes_by_id[note_id].field_dict.get(field_name, '') for note_id in note_id_list]
 
     def get_note_by_id(self, note_id):
         return self.notes_by_id[note_id]
 
+    def get_notes_field_values(self, model_id, note_ids):
+        return {note_id: dict(self.notes_by_id[note_id].field_dict) for note_id in note_ids}
+
 
     def get_model(self, model_id):
         # should return a dict which has flds
@@ -79,11 +96,25 @@ class MockAnkiUtils():
         self.added_media_file = filename
         return filename
 
+    def get_media_file_path(self, filename):
+        return self.media_folder_files.get(filename, None)
+
     def run_in_background(self, task_fn, task_done_fn):
+        if self.defer_background_tasks:
+            self.deferred_background_tasks.append((task_fn, task_done_fn))
+            return
         # just run the two tasks immediately
         result = task_fn()
         task_done_fn(MockFuture(result))
 
+    def run_deferred_background_tasks(self):
+        # run the tasks in the order they were started, like the background thread pool would
+        tasks = self.deferred_background_tasks
+        self.deferred_background_tasks = []
+        for task_fn, task_done_fn in tasks:
+            result = task_fn()
+            task_done_fn(MockFuture(result))
+
     def run_on_main(self, task_fn):
         # just run the task immediately
         task_fn()
@@ -153,6 +184,13 @@ class MockAnkiUtils():
         # even though we don't call note.flush anymore, some of the tests expect this
         note.flush()
 
+    def update_notes_fields(self, note_field_updates):
+        for note_id, field_updates in note_field_updates.items():
+            note = self.notes_by_id[note_id]
+            for field_name, value in field_updates.items():
+                note[field_name] = value
+            note.flush()
+
     def reset_exceptions(self):
         self.last_exception = None
         self.last_action = None
@@ -187,12 +225,27 @@ class MockCloudLanguageTools():
 
         self.account_info_called = False
 
+        self.max_connections = None
+
         # used to simulate translation errors
         self.translation_error_map = {}
 
         # unhandled exceptions
         self.translation_unhandled_exception_map = {}
 
+        # conditional language data requests
+        self.language_data_etag = 'etag-1'
+        self.language_data_request_etags = []
+
+        # batch translation requests
+        self.translation_batch_supported = True
+        self.translation_batch_requests = []
+
+        # batch language detection requests
+        self.language_detection_batch_supported = True
+        self.language_detection_batch_requests = []
+        self.language_detection_requests = []
+
         self.language_data = {
             'language_list': {
                 'en': 'English',
@@ -357,6 +410,15 @@ class MockCloudLanguageTools():
     def get_language_data(self):
         return self.language_data
 
+    def get_language_data_conditional(self, etag):
+        self.language_data_request_etags.append(etag)
+        if etag == self.language_data_etag:
+            return None
+        return self.language_data, self.language_data_etag
+
+    def get_base_url(self):
+        return 'https://mock-api'
+
     def get_language_list(self):
         return self.language_list
 
@@ -369,6 +431,9 @@ class MockCloudLanguageTools():
     def api_key_set(self):
         return self.verify_api_key_called and self.verify_api_key_is_valid
 
+    def set_max_connections(self, max_connections):
+        self.max_connections = max_connections
+
     def api_key_validate_query(self, api_key):
 
         self.verify_api_key_called = True
@@ -390,8 +455,15 @@ class MockCloudLanguageTools():
 
 
     def language_detection(self, field_sample):
+        self.language_detection_requests.append(field_sample)
         return self.language_detection_result[field_sample[0]]
 
+    def language_detection_batch(self, field_sample_list):
+        if not self.language_detection_batch_supported:
+            raise errors.BatchEndpointNotSupportedError('detect_batch')
+        self.language_detection_batch_requests.append(field_sample_list)
+        return [self.language_detection_result[field_sample[0]] for field_sample in field_sample_list]
+
     def get_tts_audio(self, source_text, service, language_code, voice_key, options):
         self.requested_audio = {
             'text': source_text,
@@ -414,6 +486,16 @@ class MockCloudLanguageTools():
         translated_text = self.translation_map[source_text]
         return MockTranslationResponse(200, {'translated_text': translated_text})
 
+    def get_translation_batch(self, source_text_list, translation_option):
+        if not self.translation_batch_supported:
+            raise errors.BatchEndpointNotSupportedError('translate_batch')
+        self.translation_batch_requests.append(source_text_list)
+        for source_text in source_text_list:
+            if source_text in self.translation_error_map:
+                # the whole batch fails
+                return MockTranslationResponse(400, {'error': self.translation_error_map[source_text]})
+        return MockTranslationResponse(200, {'translated_text_list': [self.translation_map[source_text] for source_text in source_text_list]})
+
     def get_transliteration(self, source_text, transliteration_option):
         # if needed, error simulation can be added here
         transliterated_text = self.transliteration_map[source_text]
@@ -456,6 +538,17 @@ class MockEditor():
     def __init__(self):
         self.addMode = False
 
+class MockLanguageTools(languagetools.LanguageTools):
+    # user files (caches, audio, ledger) go to a temporary directory of each instance, removed along with it,
+    # so that tests don't see each other's files or leave them in the addon directory
+    def __init__(self, anki_utils, deck_utils, cloud_language_tools):
+        self.user_files_temp_dir = tempfile.TemporaryDirectory(prefix='languagetools-user-files-')
+        languagetools.LanguageTools.__init__(self, anki_utils, deck_utils, cloud_language_tools)
+
+    def get_user_files_dir(self):
+        return self.user_files_temp_dir.name
+
+
 class TestConfigGenerator():
     def __init__(self):
         self.deck_id = 42001
@@ -720,9 +813,8 @@ class TestConfigGenerator():
 
         anki_utils = MockAnkiUtils(languagetools_config)
         deckutils = deck_utils.DeckUtils(anki_utils)
-        mock_language_tools = languagetools.LanguageTools(anki_utils, deckutils, mock_cloudlanguagetools)
+        mock_language_tools = MockLanguageTools(anki_utils, deckutils, mock_cloudlanguagetools)
         mock_language_tools.initialize()
-        mock_language_tools.clean_user_files_audio()
 
         anki_utils.models = self.get_model_map()
         anki_utils.decks = self.get_deck_map()
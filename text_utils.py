@@ -2,11 +2,16 @@ import sys
 import logging
 import anki.utils
 import re
+import threading
+import collections
+import hashlib
 
 if hasattr(sys, '_pytest_mode'):
     import constants
+    import errors
 else:
     from . import constants
+    from . import errors
 
 
 def create_text_replacement():
@@ -17,6 +22,8 @@ def create_text_replacement():
     })
 
 
+NOT_COMPILED = object()
+
 class TextReplacement():
     def __init__(self, options):
         self.pattern = options.get('pattern', None)
@@ -26,6 +33,10 @@ class TextReplacement():
         self.transformation_type_map = {}
         for transformation_type in constants.TransformationType:
             self.transformation_type_map[transformation_type] = options.get(transformation_type.name, True)
+        self.compiled_pattern_source = NOT_COMPILED
+        self.compiled_pattern = None
+        self.compile_error = None
+        self.get_compiled_pattern()
 
     def to_dict(self):
         transformation_type_map = {key.name:value for (key, value) in self.transformation_type_map.items()}
@@ -37,13 +48,41 @@ class TextReplacement():
         data.update(transformation_type_map)
         return data
 
+    def get_compiled_pattern(self):
+        # the text processing dialog edits the pattern in place, recompile whenever it changed
+        if self.compiled_pattern_source != self.pattern:
+            self.compiled_pattern_source = self.pattern
+            self.compiled_pattern = None
+            self.compile_error = None
+            if self.pattern != None and self.replace_type == constants.ReplaceType.regex:
+                try:
+                    self.compiled_pattern = re.compile(self.pattern)
+                except re.error as e:
+                    self.compile_error = e
+        return self.compiled_pattern
+
+    def validate(self):
+        if self.replace_type != constants.ReplaceType.regex or self.pattern == None or self.replace == None:
+            return
+        compiled_pattern = self.get_compiled_pattern()
+        if compiled_pattern == None:
+            raise errors.TextReplacementValidationError(self.pattern, self.compile_error)
+        try:
+            # checks the group references in the replacement
+            compiled_pattern.sub(self.replace, '')
+        except re.error as e:
+            raise errors.TextReplacementValidationError(self.pattern, e)
+
     def process(self, text, transformation_type):
         result = text
         if self.transformation_type_map[transformation_type]:
             if self.pattern != None and self.replace != None:
                 try:
                     if self.replace_type == constants.ReplaceType.regex:
-                        result = re.sub(self.pattern, self.replace, text)
+                        compiled_pattern = self.get_compiled_pattern()
+                        if compiled_pattern == None:
+                            raise self.compile_error
+                        result = compiled_pattern.sub(self.replace, text)
                     elif self.replace_type == constants.ReplaceType.simple:
                         result = result.replace(self.pattern,  self.replace)
                     else:
@@ -52,22 +91,133 @@ class TextReplacement():
                     logging.error(f'error while processing regular expression {self.pattern} / {self.replace}: {e}')
         return result
 
+
+def strings_overlap(a, b):
+    # one contains the other, or the end of one is the start of the other
+    if a in b or b in a:
+        return True
+    for length in range(1, min(len(a), len(b))):
+        if a[-length:] == b[:length] or b[-length:] == a[:length]:
+            return True
+    return False
+
+def can_fuse_simple_replacement(earlier, later):
+    """whether two simple replacements, applied one after the other, give the same result as a single pass replacing both"""
+    earlier_pattern, earlier_replace = earlier
+    later_pattern, later_replace = later
+    # patterns which overlap would compete for the same text
+    if strings_overlap(earlier_pattern, later_pattern):
+        return False
+    # the first replacement must not create new matches for the second one
+    if len(later_pattern) == 1:
+        return later_pattern not in earlier_replace
+    return not strings_overlap(earlier_replace, later_pattern)
+
+def build_simple_replacement_step(pairs):
+    if len(pairs) == 1:
+        pattern, replace = pairs[0]
+        return lambda text: text.replace(pattern, replace)
+    mapping = dict(pairs)
+    if all([len(pattern) == 1 for pattern, replace in pairs]):
+        table = str.maketrans(mapping)
+        return lambda text: text.translate(table)
+    alternation = re.compile('|'.join([re.escape(pattern) for pattern, replace in pairs]))
+    return lambda text: alternation.sub(lambda match: mapping[match.group(0)], text)
+
+
+class PreprocessedText():
+    """a field value parsed once: html stripped down to a single line of text.
+    carries its emptiness, a hash of the text, and the processed text for each transformation type"""
+    def __init__(self, source_text, text):
+        self.source_text = source_text
+        self.text = text
+        self.empty = len(text) == 0
+        self.processed = {}
+        self.hash = None
+
+    def get_hash(self):
+        if self.hash == None:
+            self.hash = hashlib.sha224(self.text.encode('utf-8')).hexdigest()
+        return self.hash
+
+    def __str__(self):
+        return self.source_text
+
+
 class TextUtils():
     def __init__(self, anki_utils, options):
         self.anki_utils = anki_utils
         self.options = options
         replacements_array = self.options.get('replacements', [])
         self.replacements = [TextReplacement(replacement) for replacement in replacements_array]
+        self.pipelines = {transformation_type: self.build_pipeline(transformation_type) for transformation_type in constants.TransformationType}
+        # batch operations process the same text several times, field value -> PreprocessedText
+        self.cache_lock = threading.Lock()
+        self.cache = collections.OrderedDict()
 
-    def is_empty(self, text):
-        stripped_field_value = self.anki_utils.html_to_text_line(text)
-        return len(stripped_field_value) == 0
-
-    def process(self, text, transformation_type: constants.TransformationType):
-        result = self.anki_utils.html_to_text_line(text)
+    def build_pipeline(self, transformation_type):
+        """list of functions to apply to the text in order.
+        runs of simple replacements which don't interfere with each other get fused into a single pass."""
+        steps = []
+        simple_run = []
+        for replacement in self.replacements:
+            if not replacement.transformation_type_map[transformation_type]:
+                continue
+            if replacement.pattern == None or replacement.replace == None:
+                continue
+            if replacement.replace_type == constants.ReplaceType.simple and len(replacement.pattern) > 0:
+                pair = (replacement.pattern, replacement.replace)
+                if all([can_fuse_simple_replacement(earlier, pair) for earlier in simple_run]):
+                    simple_run.append(pair)
+                    continue
+            if len(simple_run) > 0:
+                steps.append(build_simple_replacement_step(simple_run))
+                simple_run = []
+            if replacement.replace_type == constants.ReplaceType.simple and len(replacement.pattern) > 0:
+                simple_run.append((replacement.pattern, replacement.replace))
+            else:
+                steps.append(lambda text, replacement=replacement: replacement.process(text, transformation_type))
+        if len(simple_run) > 0:
+            steps.append(build_simple_replacement_step(simple_run))
+        return steps
 
-        # apply replacements
+    def validate(self):
         for replacement in self.replacements:
-            result = replacement.process(result, transformation_type)
+            replacement.validate()
+
+    def get_cached(self, key, compute_fn):
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        result = compute_fn()
+        with self.cache_lock:
+            self.cache[key] = result
+            if len(self.cache) > constants.TEXT_PROCESSING_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return result
 
-        return result
\ No newline at end of file
+    def preprocess(self, text) -> PreprocessedText:
+        """accepts a field value, or a PreprocessedText which is returned as is"""
+        if isinstance(text, PreprocessedText):
+            return text
+        return self.get_cached(text, lambda: PreprocessedText(text, self.anki_utils.html_to_text_line(text)))
+
+    def is_empty(self, text):
+        return self.preprocess(text).empty
+
+    def is_processed_text_empty(self, processed_text):
+        # replacements may have introduced html (<br>, &nbsp;) which doesn't count as text.
+        # not cached, processed text isn't a field value
+        return len(self.anki_utils.html_to_text_line(processed_text)) == 0
+
+    def process(self, text, transformation_type: constants.TransformationType):
+        preprocessed_text = self.preprocess(text)
+        result = preprocessed_text.processed.get(transformation_type, None)
+        if result == None:
+            result = preprocessed_text.text
+            # apply replacements
+            for step in self.pipelines[transformation_type]:
+                result = step(result)
+            preprocessed_text.processed[transformation_type] = result
+        return result
@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import time
+
+
+class TranslationCache():
+    """persistent cache for translation / transliteration results, stored in an sqlite database.
+    entries are keyed on a request hash, see LanguageTools.get_hash_for_request.
+    only successful results get stored."""
+
+    # evict every so many insertions, so that we don't run a DELETE on every put
+    EVICTION_INTERVAL = 500
+    # access times only matter for eviction: an entry's access time gets updated at most once per interval,
+    # and updates are kept in memory and written out in batches
+    ACCESS_UPDATE_INTERVAL_SECONDS = 3600
+    ACCESS_WRITE_BATCH_SIZE = 500
+
+    def __init__(self, db_path, max_entries, max_age_days):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.lock = threading.Lock()
+        self.connection = None
+        self.puts_since_eviction = 0
+        # key -> access time not yet written to the database
+        self.pending_accesses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_connection(self):
+        # must be called while holding self.lock
+        if self.connection == None:
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+            self.evict_locked()
+        return self.connection
+
+    def get(self, key):
+        """returns the cached result, or None"""
+        with self.lock:
+            connection = self.get_connection()
+            now = time.time()
+            row = connection.execute('SELECT result, created, last_access FROM results WHERE key = ?', (key,)).fetchone()
+            if row == None or row[1] < now - self.max_age_seconds:
+                self.misses += 1
+                return None
+            if row[2] < now - self.ACCESS_UPDATE_INTERVAL_SECONDS:
+                self.pending_accesses[key] = now
+                if len(self.pending_accesses) >= self.ACCESS_WRITE_BATCH_SIZE:
+                    self.write_accesses_locked()
+                    connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def write_accesses_locked(self):
+        if len(self.pending_accesses) == 0:
+            return
+        self.connection.executemany('UPDATE results SET last_access = ? WHERE key = ?', [(access_time, key) for key, access_time in self.pending_accesses.items()])
+        self.pending_accesses = {}
+
+    def put(self, key, result):
+        with self.lock:
+            connection = self.get_connection()
+            now = time.time()
+            connection.execute('INSERT OR REPLACE INTO results (key, result, created, last_access) VALUES (?, ?, ?, ?)', (key, result, now, now))
+            connection.commit()
+            self.puts_since_eviction += 1
+            if self.puts_since_eviction >= self.EVICTION_INTERVAL:
+                self.evict_locked()
+
+    def evict_locked(self):
+        # remove expired entries, then the least recently used ones beyond max_entries
+        connection = self.connection
+        self.write_accesses_locked()
+        connection.execute('DELETE FROM results WHERE created < ?', (time.time() - self.max_age_seconds,))
+        connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+        connection.commit()
+        self.puts_since_eviction = 0
+
+    def clear(self):
+        with self.lock:
+            connection = self.get_connection()
+            connection.execute('DELETE FROM results')
+            connection.commit()
+            self.pending_accesses = {}
+            self.hits = 0
+            self.misses = 0
+
+    def entry_count(self):
+        with self.lock:
+            return self.get_connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def flush(self):
+        with self.lock:
+            if self.connection != None:
+                self.write_accesses_locked()
+                self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection != None:
+                self.write_accesses_locked()
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None